@@ -14,7 +14,7 @@ from baselines.a2c.utils import discount_with_dones, Scheduler, make_path, find_
 class Model(object):
     def __init__(self, policy, ob_space, ac_space, n_envs, n_steps,
                  ent_coef=0.01, vf_coef=0.25, max_grad_norm=0.5, learning_rate=7e-4,
-                 alpha=0.99, epsilon=1e-5, total_timesteps=int(80e6), lr_schedule='linear'):
+                 alpha=0.99, epsilon=1e-5, total_timesteps=int(80e6), lr_schedule='linear', n_batch_act=None):
         """
         The A2C (Advantage Actor Critic) model class, https://arxiv.org/abs/1602.01783
 
@@ -32,6 +32,7 @@ class Model(object):
         :param total_timesteps: (int) The total number of samples
         :param lr_schedule: (str) The type of scheduler for the learning rate update ('linear', 'constant',
                                  'double_linear_con', 'middle_drop' or 'double_middle_drop')
+        :param n_batch_act: (int) The number of environments the policy acts on at once, n_envs if None
         """
 
         sess = tf_util.make_session()
@@ -42,7 +43,10 @@ class Model(object):
         rewards_ph = tf.placeholder(tf.float32, [n_batch])
         learning_rate_ph = tf.placeholder(tf.float32, [])
 
-        step_model = policy(sess, ob_space, ac_space, n_envs, 1, reuse=False)
+        if n_batch_act is None:
+            n_batch_act = n_envs
+
+        step_model = policy(sess, ob_space, ac_space, n_batch_act, 1, reuse=False)
         train_model = policy(sess, ob_space, ac_space, n_envs * n_steps, n_steps, reuse=True)
 
         neglogpac = tf.nn.sparse_softmax_cross_entropy_with_logits(logits=train_model.policy, labels=actions_ph)
@@ -100,16 +104,17 @@ class Model(object):
 
 
 class Runner(AbstractEnvRunner):
-    def __init__(self, env, model, n_steps=5, gamma=0.99):
+    def __init__(self, env, model, n_steps=5, gamma=0.99, pipelined=False):
         """
         A runner to learn the policy of an environment for a model
 
-        :param env: (Gym environment) The environment to learn from
+        :param env: (VecEnv or BatchedEnv) The environment to learn from
         :param model: (Model) The model to learn
         :param n_steps: (int) The number of steps to run for each environment
         :param gamma: (float) Discount factor
+        :param pipelined: (bool) step the parts of the environment in turn, see AbstractEnvRunner.__init__
         """
-        super(Runner, self).__init__(env=env, model=model, n_steps=n_steps)
+        super(Runner, self).__init__(env=env, model=model, n_steps=n_steps, pipelined=pipelined)
         self.gamma = gamma
 
     def run(self):
@@ -119,32 +124,38 @@ class Runner(AbstractEnvRunner):
         :return: ([float], [float], [float], [bool], [float], [float])
                  observations, states, rewards, masks, actions, values
         """
-        mb_obs, mb_rewards, mb_actions, mb_values, mb_dones = [], [], [], [], []
+        mb_obs, mb_rewards, mb_actions, mb_values, mb_dones = ([[] for _ in self.venvs] for _ in range(5))
         mb_states = self.states
-        for _ in range(self.n_steps):
-            actions, values, states, _ = self.model.step(self.obs, self.states, self.dones)
-            mb_obs.append(np.copy(self.obs))
-            mb_actions.append(actions)
-            mb_values.append(values)
-            mb_dones.append(self.dones)
-            obs, rewards, dones, _ = self.env.step(actions)
-            self.states = states
-            self.dones = dones
-            for n, done in enumerate(dones):
-                if done:
-                    self.obs[n] = self.obs[n] * 0
-            self.obs = obs
-            mb_rewards.append(rewards)
-        mb_dones.append(self.dones)
+
+        def _act(part):
+            env_slice = self.env_slices[part]
+            actions, values, self.part_states[part], _ = self.model.step(self.obs[env_slice], self.part_states[part],
+                                                                         self.dones[env_slice])
+            mb_obs[part].append(np.copy(self.obs[env_slice]))
+            mb_actions[part].append(actions)
+            mb_values[part].append(values)
+            mb_dones[part].append(np.copy(self.dones[env_slice]))
+            return actions
+
+        def _observe(part, obs, rewards, dones, _infos):
+            env_slice = self.env_slices[part]
+            self.obs[env_slice] = obs
+            self.dones[env_slice] = dones
+            mb_rewards[part].append(rewards)
+
+        self._rollout(_act, _observe)
+        for part, env_slice in enumerate(self.env_slices):
+            mb_dones[part].append(np.copy(self.dones[env_slice]))
         # batch of steps to batch of rollouts
-        mb_obs = np.asarray(mb_obs, dtype=np.uint8).swapaxes(1, 0).reshape(self.batch_ob_shape)
-        mb_rewards = np.asarray(mb_rewards, dtype=np.float32).swapaxes(1, 0)
-        mb_actions = np.asarray(mb_actions, dtype=np.int32).swapaxes(1, 0)
-        mb_values = np.asarray(mb_values, dtype=np.float32).swapaxes(1, 0)
-        mb_dones = np.asarray(mb_dones, dtype=np.bool).swapaxes(1, 0)
+        mb_obs = self._stack_parts(mb_obs, dtype=np.uint8).swapaxes(1, 0).reshape(self.batch_ob_shape)
+        mb_rewards = self._stack_parts(mb_rewards, dtype=np.float32).swapaxes(1, 0)
+        mb_actions = self._stack_parts(mb_actions, dtype=np.int32).swapaxes(1, 0)
+        mb_values = self._stack_parts(mb_values, dtype=np.float32).swapaxes(1, 0)
+        mb_dones = self._stack_parts(mb_dones, dtype=np.bool_).swapaxes(1, 0)
         mb_masks = mb_dones[:, :-1]
         mb_dones = mb_dones[:, 1:]
-        last_values = self.model.value(self.obs, self.states, self.dones).tolist()
+        last_values = np.concatenate([self.model.value(self.obs[env_slice], states, self.dones[env_slice])
+                                      for env_slice, states in zip(self.env_slices, self.part_states)]).tolist()
         # discount/bootstrap off value fn
         for n, (rewards, dones, value) in enumerate(zip(mb_rewards, mb_dones, last_values)):
             rewards = rewards.tolist()
@@ -162,12 +173,13 @@ class Runner(AbstractEnvRunner):
 
 
 def learn(policy, env, seed, n_steps=5, total_timesteps=int(80e6), vf_coef=0.5, ent_coef=0.01, max_grad_norm=0.5,
-          learning_rate=7e-4, lr_schedule='linear', epsilon=1e-5, alpha=0.99, gamma=0.99, log_interval=100):
+          learning_rate=7e-4, lr_schedule='linear', epsilon=1e-5, alpha=0.99, gamma=0.99, log_interval=100,
+          pipelined=False):
     """
     Return a trained A2C model.
 
     :param policy: (A2CPolicy) The policy model to use (MLP, CNN, LSTM, ...)
-    :param env: (Gym environment) The environment to learn from
+    :param env: (VecEnv or BatchedEnv) The environment to learn from
     :param seed: (int) The initial seed for training
     :param n_steps: (int) The number of steps to run for each environment
     :param total_timesteps: (int) The total number of samples
@@ -181,6 +193,8 @@ def learn(policy, env, seed, n_steps=5, total_timesteps=int(80e6), vf_coef=0.5,
     :param alpha: (float) RMS prop optimizer decay
     :param gamma: (float) Discount factor
     :param log_interval: (int) The number of timesteps before logging.
+    :param pipelined: (bool) step the two halves (or more parts) of a ConcatVecEnv in turn, running the policy on
+        the observations of a part while the others simulate
     :return: (Model) A2C model
     """
     set_global_seeds(seed)
@@ -192,8 +206,8 @@ def learn(policy, env, seed, n_steps=5, total_timesteps=int(80e6), vf_coef=0.5,
                   n_steps=n_steps, ent_coef=ent_coef,
                   vf_coef=vf_coef, max_grad_norm=max_grad_norm, learning_rate=learning_rate,
                   alpha=alpha, epsilon=epsilon, total_timesteps=total_timesteps,
-                  lr_schedule=lr_schedule)
-    runner = Runner(env, model, n_steps=n_steps, gamma=gamma)
+                  lr_schedule=lr_schedule, n_batch_act=env.venvs[0].num_envs if pipelined else None)
+    runner = Runner(env, model, n_steps=n_steps, gamma=gamma, pipelined=pipelined)
 
     n_batch = n_envs * n_steps
     t_start = time.time()
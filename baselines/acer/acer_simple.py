@@ -1,5 +1,6 @@
 import time
 import joblib
+import multiprocessing
 import os
 
 import numpy as np
@@ -8,6 +9,7 @@ import tensorflow as tf
 from baselines import logger
 from baselines.common import set_global_seeds
 from baselines.common.runners import AbstractEnvRunner
+from baselines.common.vec_env.vec_frame_stack import StackedFrames
 from baselines.acer.buffer import Buffer
 from baselines.a2c.utils import batch_to_seq, seq_to_batch, Scheduler, make_path, find_trainable_variables, \
     calc_entropy_softmax, EpisodeStats, get_by_index, check_shape, avg_norm, gradient_add, q_explained_variance
@@ -62,7 +64,7 @@ def q_retrace(rewards, dones, q_i, values, rho_i, n_envs, n_steps, gamma):
 class Model(object):
     def __init__(self, policy, ob_space, ac_space, n_envs, n_steps, n_stack, num_procs, ent_coef, q_coef, gamma,
                  max_grad_norm, learning_rate, rprop_alpha, rprop_epsilon,
-                 total_timesteps, lr_schedule, correction_term, trust_region, alpha, delta):
+                 total_timesteps, lr_schedule, correction_term, trust_region, alpha, delta, n_batch_act=None):
         """
         The ACER (Actor-Critic with Experience Replay) model class, https://arxiv.org/abs/1611.01224
 
@@ -86,6 +88,7 @@ class Model(object):
         :param trust_region: (bool) Enable Trust region policy optimization loss
         :param alpha: (float) The decay rate for the Exponential moving average of the parameters
         :param delta: (float) trust region delta value
+        :param n_batch_act: (int) The number of environments the policy acts on at once, n_envs if None
         """
         config = tf.ConfigProto(allow_soft_placement=True,
                                 intra_op_parallelism_threads=num_procs,
@@ -101,7 +104,10 @@ class Model(object):
         learning_rate_ph = tf.placeholder(tf.float32, [])
         eps = 1e-6
 
-        step_model = policy(sess, ob_space, ac_space, n_envs, 1, n_stack, reuse=False)
+        if n_batch_act is None:
+            n_batch_act = n_envs
+
+        step_model = policy(sess, ob_space, ac_space, n_batch_act, 1, n_stack, reuse=False)
         train_model = policy(sess, ob_space, ac_space, n_envs, n_steps + 1, n_stack, reuse=True)
 
         params = find_trainable_variables("model")
@@ -259,16 +265,17 @@ class Model(object):
 
 
 class Runner(AbstractEnvRunner):
-    def __init__(self, env, model, n_steps, n_stack):
+    def __init__(self, env, model, n_steps, n_stack, pipelined=False):
         """
         A runner to learn the policy of an environment for a model
 
-        :param env: (Gym environment) The environment to learn from
+        :param env: (VecEnv or BatchedEnv) The environment to learn from
         :param model: (Model) The model to learn
         :param n_steps: (int) The number of steps to run for each environment
         :param n_stack: (int) The number of stacked frames
+        :param pipelined: (bool) step the parts of the environment in turn, see AbstractEnvRunner.__init__
         """
-        super().__init__(env=env, model=model, n_steps=n_steps)
+        super().__init__(env=env, model=model, n_steps=n_steps, pipelined=pipelined)
         self.n_stack = n_stack
         obs_height, obs_width, obs_num_channels = env.observation_space.shape
         self.num_channels = obs_num_channels  # obs_num_channels = 1 for atari, but just in case
@@ -276,21 +283,19 @@ class Runner(AbstractEnvRunner):
         self.n_act = env.action_space.n
         self.n_batch = n_env * n_steps
         self.batch_ob_shape = (n_env * (n_steps + 1), obs_height, obs_width, obs_num_channels * n_stack)
-        self.obs = np.zeros((n_env, obs_height, obs_width, obs_num_channels * n_stack), dtype=np.uint8)
-        obs = env.reset()
-        self.update_obs(obs)
+        self.stacked_frames = StackedFrames(n_env, env.observation_space.shape, n_stack, np.uint8)
+        obs = self.env.reset()
+        self.obs = self.stacked_frames.reset(obs)
 
-    def update_obs(self, obs, dones=None):
+    def update_obs(self, obs, dones=None, env_slice=slice(None)):
         """
         Update the observation for rolling observation with stacking
 
         :param obs: ([int] or [float]) The input observation
         :param dones: ([bool])
+        :param env_slice: (slice) the environments of the observation
         """
-        if dones is not None:
-            self.obs *= (1 - dones.astype(np.uint8))[:, None, None, None]
-        self.obs = np.roll(self.obs, shift=-self.num_channels, axis=3)
-        self.obs[:, :, :, -self.num_channels:] = obs[:, :, :, :]
+        self.obs = self.stacked_frames.push(obs, dones, env_slice)
 
     def run(self):
         """
@@ -299,31 +304,41 @@ class Runner(AbstractEnvRunner):
         :return: ([float], [float], [float], [float], [float], [bool], [float])
                  encoded observation, observations, actions, rewards, mus, dones, masks
         """
-        enc_obs = np.split(self.obs, self.n_stack, axis=3)  # so now list of obs steps
-        mb_obs, mb_actions, mb_mus, mb_dones, mb_rewards = [], [], [], [], []
-        for _ in range(self.n_steps):
-            actions, mus, states = self.model.step(self.obs, state=self.states, mask=self.dones)
-            mb_obs.append(np.copy(self.obs))
-            mb_actions.append(actions)
-            mb_mus.append(mus)
-            mb_dones.append(self.dones)
-            obs, rewards, dones, _ = self.env.step(actions)
+        enc_obs = [[np.copy(frames[env_slice]) for frames in np.split(self.obs, self.n_stack, axis=3)]
+                   for env_slice in self.env_slices]  # so now list of obs steps, for every part
+        mb_obs, mb_actions, mb_mus, mb_dones, mb_rewards = ([[] for _ in self.venvs] for _ in range(5))
+
+        def _act(part):
+            env_slice = self.env_slices[part]
+            actions, mus, states = self.model.step(self.obs[env_slice], state=self.part_states[part],
+                                                   mask=self.dones[env_slice])
+            mb_obs[part].append(np.copy(self.obs[env_slice]))
+            mb_actions[part].append(actions)
+            mb_mus[part].append(mus)
+            mb_dones[part].append(np.copy(self.dones[env_slice]))
             # states information for statefull models like LSTM
-            self.states = states
-            self.dones = dones
-            self.update_obs(obs, dones)
-            mb_rewards.append(rewards)
-            enc_obs.append(obs)
-        mb_obs.append(np.copy(self.obs))
-        mb_dones.append(self.dones)
-
-        enc_obs = np.asarray(enc_obs, dtype=np.uint8).swapaxes(1, 0)
-        mb_obs = np.asarray(mb_obs, dtype=np.uint8).swapaxes(1, 0)
-        mb_actions = np.asarray(mb_actions, dtype=np.int32).swapaxes(1, 0)
-        mb_rewards = np.asarray(mb_rewards, dtype=np.float32).swapaxes(1, 0)
-        mb_mus = np.asarray(mb_mus, dtype=np.float32).swapaxes(1, 0)
-
-        mb_dones = np.asarray(mb_dones, dtype=np.bool).swapaxes(1, 0)
+            self.part_states[part] = states
+            return actions
+
+        def _observe(part, obs, rewards, dones, _infos):
+            env_slice = self.env_slices[part]
+            self.dones[env_slice] = dones
+            self.update_obs(obs, dones, env_slice)
+            mb_rewards[part].append(rewards)
+            enc_obs[part].append(obs)
+
+        self._rollout(_act, _observe)
+        for part, env_slice in enumerate(self.env_slices):
+            mb_obs[part].append(np.copy(self.obs[env_slice]))
+            mb_dones[part].append(np.copy(self.dones[env_slice]))
+
+        enc_obs = self._stack_parts(enc_obs, dtype=np.uint8).swapaxes(1, 0)
+        mb_obs = self._stack_parts(mb_obs, dtype=np.uint8).swapaxes(1, 0)
+        mb_actions = self._stack_parts(mb_actions, dtype=np.int32).swapaxes(1, 0)
+        mb_rewards = self._stack_parts(mb_rewards, dtype=np.float32).swapaxes(1, 0)
+        mb_mus = self._stack_parts(mb_mus, dtype=np.float32).swapaxes(1, 0)
+
+        mb_dones = self._stack_parts(mb_dones, dtype=np.bool_).swapaxes(1, 0)
 
         mb_masks = mb_dones  # Used for statefull models like LSTM's to mask state when done
         mb_dones = mb_dones[:, 1:]  # Used for calculating returns. The dones array is now aligned with rewards
@@ -398,12 +413,12 @@ def learn(policy, env, seed, n_steps=20, n_stack=4, total_timesteps=int(80e6),
           rprop_epsilon=1e-5, rprop_alpha=0.99, gamma=0.99,
           log_interval=100, buffer_size=50000, replay_ratio=4,
           replay_start=10000, correction_term=10.0,
-          trust_region=True, alpha=0.99, delta=1):
+          trust_region=True, alpha=0.99, delta=1, pipelined=False):
     """
     Train an ACER model.
 
     :param policy: (ACERPolicy) The policy model to use (MLP, CNN, LSTM, ...)
-    :param env: (Gym environment) The environment to learn from
+    :param env: (VecEnv or BatchedEnv) The environment to learn from
     :param seed: (int) The initial seed for training
     :param n_steps: (int) The number of steps to run for each environment
     :param n_stack: (int) The number of stacked frames
@@ -426,6 +441,8 @@ def learn(policy, env, seed, n_steps=20, n_stack=4, total_timesteps=int(80e6),
     :param trust_region: (bool) Enable Trust region policy optimization loss
     :param alpha: (float) The decay rate for the Exponential moving average of the parameters
     :param delta: (float) trust region delta value
+    :param pipelined: (bool) step the two halves (or more parts) of a ConcatVecEnv of SubprocVecEnv in turn, running
+        the policy on the observations of a part while the others simulate
     """
     print("Running Acer Simple")
     print(locals())
@@ -434,15 +451,18 @@ def learn(policy, env, seed, n_steps=20, n_stack=4, total_timesteps=int(80e6),
     n_envs = env.num_envs
     ob_space = env.observation_space
     ac_space = env.action_space
-    num_procs = len(env.remotes)  # HACK
+    # HACK: one TensorFlow thread per subprocess, or per CPU for the environments run in the main process
+    num_procs = sum(len(venv.remotes) if hasattr(venv, 'remotes') else multiprocessing.cpu_count()
+                    for venv in (env.venvs if pipelined else [env]))
     model = Model(policy=policy, ob_space=ob_space, ac_space=ac_space, n_envs=n_envs, n_steps=n_steps, n_stack=n_stack,
                   num_procs=num_procs, ent_coef=ent_coef, q_coef=q_coef, gamma=gamma,
                   max_grad_norm=max_grad_norm, learning_rate=learning_rate, rprop_alpha=rprop_alpha,
                   rprop_epsilon=rprop_epsilon,
                   total_timesteps=total_timesteps, lr_schedule=lr_schedule, correction_term=correction_term,
-                  trust_region=trust_region, alpha=alpha, delta=delta)
+                  trust_region=trust_region, alpha=alpha, delta=delta,
+                  n_batch_act=env.venvs[0].num_envs if pipelined else None)
 
-    runner = Runner(env=env, model=model, n_steps=n_steps, n_stack=n_stack)
+    runner = Runner(env=env, model=model, n_steps=n_steps, n_stack=n_stack, pipelined=pipelined)
     if replay_ratio > 0:
         buffer = Buffer(env=env, n_steps=n_steps, n_stack=n_stack, size=buffer_size)
     else:
@@ -31,6 +31,9 @@ class Buffer(object):
         self.next_idx = 0
         self.num_in_buffer = 0
 
+        # the stacked observations returned by `get`, reused by every call
+        self.obs = None
+
     def has_atleast(self, frames):
         """
         Check to see if the buffer has at least the asked number of frames
@@ -50,33 +53,37 @@ class Buffer(object):
         """
         return self.num_in_buffer > 0
 
-    def decode(self, enc_obs, dones):
+    def decode(self, enc_obs, dones, out=None):
         """
         Get the stacked frames of an observation
         
         :param enc_obs: ([float]) the encoded observation
         :param dones: ([bool])
+        :param out: ([float]) the array to write the stacked frames to, a new one if None
         :return: ([float]) the decoded observation
         """
         # enc_obs has shape [n_envs, n_steps + n_stack, nh, nw, nc]
-        # dones has shape [n_envs, n_steps, nh, nw, nc]
+        # dones has shape [n_envs, n_steps]
         # returns stacked obs of shape [n_env, (n_steps + 1), nh, nw, n_stack*nc]
         n_stack, n_env, n_steps = self.n_stack, self.n_env, self.n_steps
-        height, width, n_channels = self.height, self.width, self.n_channels
-        y_var = np.empty([n_steps + n_stack - 1, n_env, 1, 1, 1], dtype=np.float32)
-        obs = np.zeros([n_stack, n_steps + n_stack, n_env, height, width, n_channels], dtype=np.uint8)
-        # [n_steps + n_stack, n_env, nh, nw, nc]
-        x_var = np.reshape(enc_obs, [n_env, n_steps + n_stack, height, width, n_channels]).swapaxes(1, 0)
-        y_var[3:] = np.reshape(1.0 - dones, [n_env, n_steps, 1, 1, 1]).swapaxes(1, 0)  # keep
-        y_var[:3] = 1.0
-        # y = np.reshape(1 - dones, [n_envs, n_steps, 1, 1, 1])
-        for i in range(n_stack):
-            obs[-(i + 1), i:] = x_var
-            # obs[:,i:,:,:,-(i+1),:] = x
-            x_var = x_var[:-1] * y_var
-            y_var = y_var[1:]
-        return np.reshape(obs[:, 3:].transpose((2, 1, 3, 4, 0, 5)),
-                          [n_env, (n_steps + 1), height, width, n_stack * n_channels])
+        n_channels = self.n_channels
+        enc_obs = np.reshape(enc_obs, [n_env, n_steps + n_stack, self.height, self.width, n_channels])
+        if out is None:
+            out = np.empty([n_env, n_steps + 1, self.height, self.width, n_stack * n_channels], dtype=enc_obs.dtype)
+
+        # frame n_stack + step starts an episode if the step was done: the first frame of the episode of each frame
+        frames = np.arange(n_steps + n_stack)
+        episode_starts = np.zeros([n_env, n_steps + n_stack], dtype=np.int64)
+        episode_starts[:, n_stack:] = np.where(dones, frames[n_stack:], 0)
+        episode_starts = np.maximum.accumulate(episode_starts, axis=1)[:, n_stack - 1:]
+
+        # the last n_steps + 1 frames are the newest frames of the stacks, the frames of earlier episodes are zeroed
+        for age in range(n_stack):
+            stack_idx = n_stack - 1 - age
+            stacked = out[..., stack_idx * n_channels:(stack_idx + 1) * n_channels]
+            stacked[...] = enc_obs[:, stack_idx:stack_idx + n_steps + 1]
+            stacked[frames[stack_idx:stack_idx + n_steps + 1] < episode_starts] = 0
+        return out
 
     def put(self, enc_obs, actions, rewards, mus, dones, masks):
         """
@@ -98,8 +105,8 @@ class Buffer(object):
             self.actions = np.empty([self.size] + list(actions.shape), dtype=np.int32)
             self.rewards = np.empty([self.size] + list(rewards.shape), dtype=np.float32)
             self.mus = np.empty([self.size] + list(mus.shape), dtype=np.float32)
-            self.dones = np.empty([self.size] + list(dones.shape), dtype=np.bool)
-            self.masks = np.empty([self.size] + list(masks.shape), dtype=np.bool)
+            self.dones = np.empty([self.size] + list(dones.shape), dtype=np.bool_)
+            self.masks = np.empty([self.size] + list(masks.shape), dtype=np.bool_)
 
         self.enc_obs[self.next_idx] = enc_obs
         self.actions[self.next_idx] = actions
@@ -120,15 +127,11 @@ class Buffer(object):
         :param envx: ([int]) the idx for the environments
         :return: ([float]) the askes frames from the list
         """
-        n_env = self.n_env
-        out = np.empty([n_env] + list(arr.shape[2:]), dtype=arr.dtype)
-        for i in range(n_env):
-            out[i] = arr[idx[i], envx[i]]
-        return out
+        return arr[idx, envx]
 
     def get(self):
         """
-        randomly read a frame from the buffer
+        randomly read a frame from the buffer, the returned observations are overwritten by the next call
         
         :return: ([float], [float], [float], [float], [bool], [float])
                  observations, actions, rewards, mus, dones, maskes
@@ -146,7 +149,10 @@ class Buffer(object):
 
         dones = self.take(self.dones, idx, envx)
         enc_obs = self.take(self.enc_obs, idx, envx)
-        obs = self.decode(enc_obs, dones)
+        if self.obs is None:
+            self.obs = np.empty([n_env, self.n_steps + 1, self.height, self.width, self.n_stack * self.n_channels],
+                                dtype=enc_obs.dtype)
+        obs = self.decode(enc_obs, dones, out=self.obs)
         actions = self.take(self.actions, idx, envx)
         rewards = self.take(self.rewards, idx, envx)
         mus = self.take(self.mus, idx, envx)
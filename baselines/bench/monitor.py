@@ -1,4 +1,4 @@
-__all__ = ['Monitor', 'get_monitor_files', 'load_results']
+__all__ = ['Monitor', 'get_monitor_files', 'load_results', 'monitor_file_name']
 
 import os
 import time
@@ -32,12 +32,7 @@ class Monitor(Wrapper):
             self.file_handler = None
             self.logger = None
         else:
-            if not filename.endswith(Monitor.EXT):
-                if os.path.isdir(filename):
-                    filename = os.path.join(filename, Monitor.EXT)
-                else:
-                    filename = filename + "." + Monitor.EXT
-            self.file_handler = open(filename, "wt")
+            self.file_handler = open(monitor_file_name(filename), "wt")
             self.file_handler.write('#%s\n' % json.dumps({"t_start": self.t_start, 'env_id': env.spec and env.spec.id}))
             self.logger = csv.DictWriter(self.file_handler,
                                          fieldnames=('r', 'l', 't') + reset_keywords + info_keywords)
@@ -143,6 +138,21 @@ class Monitor(Wrapper):
         return self.episode_times
 
 
+def monitor_file_name(filename):
+    """
+    Get the name of a monitor file, ending with Monitor.EXT
+
+    :param filename: (str) the monitor file, or the folder to save it in
+    :return: (str) the monitor file
+    """
+    if not filename.endswith(Monitor.EXT):
+        if os.path.isdir(filename):
+            filename = os.path.join(filename, Monitor.EXT)
+        else:
+            filename = filename + "." + Monitor.EXT
+    return filename
+
+
 class LoadMonitorResultsError(Exception):
     """
     Raised when loading the monitor log fails.
@@ -15,19 +15,31 @@ from baselines.common.atari_wrappers import make_atari, wrap_deepmind
 from baselines.common.vec_env.subproc_vec_env import SubprocVecEnv
 
 
-def make_atari_env(env_id, num_env, seed, wrapper_kwargs=None, start_index=0):
+# the observation and action spaces of the Atari environments already built, by environment ID and wrapper parameters
+_ATARI_SPACES = {}
+
+
+def make_atari_env(env_id, num_env, seed, wrapper_kwargs=None, start_index=0, start_method=None,
+                   shared_memory=False):
     """
     Create a wrapped, monitored SubprocVecEnv for Atari.
+
+    The spaces of the environments are cached, so that the next environments of the same kind with `shared_memory`
+    do not build one in the main process.
     
     :param env_id: (str) the environment ID
     :param num_env: (int) the number of environment you wish to have in subprocesses
     :param seed: (int) the inital seed for RNG
     :param wrapper_kwargs: (dict) the parameters for wrap_deepmind function
     :param start_index: (int) start rank index
+    :param start_method: (str) the method used to start the subprocesses: 'fork', 'forkserver' or 'spawn'
+        (default: the platform default)
+    :param shared_memory: (bool) transport the observations through shared memory, see SubprocVecEnv.__init__
     :return: (Gym Environment) The atari environment
     """
     if wrapper_kwargs is None:
         wrapper_kwargs = {}
+    spaces_key = (env_id, tuple(sorted(wrapper_kwargs.items())))
 
     def make_env(rank):
         def _thunk():
@@ -37,7 +49,11 @@ def make_atari_env(env_id, num_env, seed, wrapper_kwargs=None, start_index=0):
             return wrap_deepmind(env, **wrapper_kwargs)
         return _thunk
     set_global_seeds(seed)
-    return SubprocVecEnv([make_env(i + start_index) for i in range(num_env)])
+    observation_space, action_space = _ATARI_SPACES.get(spaces_key, (None, None))
+    env = SubprocVecEnv([make_env(i + start_index) for i in range(num_env)], shared_memory=shared_memory,
+                        start_method=start_method, observation_space=observation_space, action_space=action_space)
+    _ATARI_SPACES[spaces_key] = (env.observation_space, env.action_space)
+    return env
 
 
 def make_mujoco_env(env_id, seed):
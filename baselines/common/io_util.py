@@ -0,0 +1,98 @@
+"""Chunked binary serialization of numpy arrays, used to snapshot large buffers.
+
+File layout:
+    - the magic bytes `MAGIC`
+    - the length of the JSON header (uint64, little-endian), then the header: the user metadata, and the name, dtype,
+      shape, number of rows per chunk and compression of every array
+    - for every array in the header order, its chunks: the length of the (possibly compressed) chunk (uint64,
+      little-endian), then the chunk bytes
+"""
+import json
+import os
+import struct
+import zlib
+
+import numpy as np
+
+MAGIC = b'BLARRAY1'
+_LENGTH = struct.Struct('<Q')
+
+
+def save_arrays(path, metadata, arrays, compress=False, chunk_bytes=64 * 1024 ** 2):
+    """
+    Write arrays and their metadata to a chunked binary file. The file is written next to `path` and then moved
+    in place, so that an interrupted write never leaves a truncated file.
+
+    :param path: (str) the path of the file
+    :param metadata: (dict) JSON-serializable metadata saved with the arrays
+    :param arrays: ({str: numpy Any}) the arrays to save
+    :param compress: (bool or int) compress the chunks with zlib, an int sets the compression level (default 1)
+    :param chunk_bytes: (int) the approximate size of a chunk before compression
+    """
+    level = 1 if compress is True else int(compress)
+    headers = []
+    for name, array in arrays.items():
+        row_bytes = max(_as_rows(np.asarray(array)).shape[1] * array.dtype.itemsize, 1)
+        headers.append({
+            'name': name,
+            'dtype': array.dtype.str,
+            'shape': array.shape,
+            'chunk_rows': max(1, chunk_bytes // row_bytes),
+            'compression': 'zlib' if level > 0 else None,
+        })
+    header = json.dumps({'metadata': metadata, 'arrays': headers}).encode('utf-8')
+
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as file_handler:
+            file_handler.write(MAGIC)
+            file_handler.write(_LENGTH.pack(len(header)))
+            file_handler.write(header)
+            for array_header in headers:
+                array = np.ascontiguousarray(arrays[array_header['name']])
+                flat = _as_rows(array)
+                for start in range(0, max(len(flat), 1), array_header['chunk_rows']):
+                    chunk = flat[start:start + array_header['chunk_rows']].tobytes()
+                    if level > 0:
+                        chunk = zlib.compress(chunk, level)
+                    file_handler.write(_LENGTH.pack(len(chunk)))
+                    file_handler.write(chunk)
+        os.replace(tmp_path, path)
+    except BaseException:
+        # a failed write, e.g. in a background save, must not leave a partial file behind
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _as_rows(array):
+    if array.ndim == 0:
+        return array.reshape((1, 1))
+    return array.reshape((len(array), int(np.prod(array.shape[1:]))))
+
+
+def load_arrays(path):
+    """
+    Read a file written by `save_arrays`
+
+    :param path: (str) the path of the file
+    :return: ((dict, {str: numpy Any})) the metadata and the arrays
+    """
+    arrays = {}
+    with open(path, 'rb') as file_handler:
+        if file_handler.read(len(MAGIC)) != MAGIC:
+            raise ValueError("{} is not a chunked array file".format(path))
+        header_length, = _LENGTH.unpack(file_handler.read(_LENGTH.size))
+        header = json.loads(file_handler.read(header_length).decode('utf-8'))
+        for array_header in header['arrays']:
+            array = np.empty(array_header['shape'], dtype=np.dtype(array_header['dtype']))
+            flat = _as_rows(array)
+            for start in range(0, max(len(flat), 1), array_header['chunk_rows']):
+                chunk_length, = _LENGTH.unpack(file_handler.read(_LENGTH.size))
+                chunk = file_handler.read(chunk_length)
+                if array_header['compression'] == 'zlib':
+                    chunk = zlib.decompress(chunk)
+                rows = flat[start:start + array_header['chunk_rows']]
+                rows[...] = np.frombuffer(chunk, dtype=array.dtype).reshape(rows.shape)
+            arrays[array_header['name']] = array
+    return header['metadata'], arrays
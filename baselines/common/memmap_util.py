@@ -0,0 +1,79 @@
+"""Helpers for file-backed buffers: `np.memmap` arrays plus a small metadata sidecar to reopen them."""
+import json
+import os
+
+import numpy as np
+
+METADATA_FILE = 'metadata.json'
+
+
+def open_memmap(path, shape=None, dtype=None):
+    """
+    Open a memory-mapped `.npy` file, creating it if it does not exist yet.
+
+    The file keeps its shape and dtype in its header, so an existing file is reopened as is; if `shape` and `dtype`
+    are given they must match it.
+
+    :param path: (str) the path of the file
+    :param shape: (tuple) the shape of the array, required when creating the file
+    :param dtype: (numpy dtype) the type of the array, required when creating the file
+    :return: (numpy memmap) the array backed by the file
+    """
+    if os.path.exists(path):
+        array = np.lib.format.open_memmap(path, mode='r+')
+        if shape is not None and tuple(shape) != array.shape:
+            raise ValueError("{} holds an array of shape {}, expected {}".format(path, array.shape, tuple(shape)))
+        if dtype is not None and np.dtype(dtype) != array.dtype:
+            raise ValueError("{} holds an array of dtype {}, expected {}".format(path, array.dtype, np.dtype(dtype)))
+        return array
+    assert shape is not None and dtype is not None, "shape and dtype are required to create {}".format(path)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return np.lib.format.open_memmap(path, mode='w+', shape=tuple(shape), dtype=dtype)
+
+
+def save_metadata(directory, metadata, arrays=None):
+    """
+    Write the metadata sidecar of a file-backed buffer, atomically so that a crash leaves the previous version.
+
+    :param directory: (str) the directory of the buffer
+    :param metadata: (dict) JSON-serializable metadata (write cursor, length, ...)
+    :param arrays: ({str: numpy Any}) small arrays to keep next to the metadata (e.g. priorities)
+    """
+    os.makedirs(directory, exist_ok=True)
+    arrays = arrays or {}
+    for name, array in arrays.items():
+        tmp_path = os.path.join(directory, name + '.tmp.npy')
+        np.save(tmp_path, array)
+        os.replace(tmp_path, os.path.join(directory, name + '.npy'))
+    # the arrays saved by earlier calls stay attached to the buffer
+    array_names = set(arrays) | set((_read_json(directory) or {}).get('arrays', []))
+    metadata = dict(metadata, arrays=sorted(array_names))
+    tmp_path = os.path.join(directory, METADATA_FILE + '.tmp')
+    with open(tmp_path, 'w') as file_handler:
+        json.dump(metadata, file_handler)
+    os.replace(tmp_path, os.path.join(directory, METADATA_FILE))
+
+
+def load_metadata(directory):
+    """
+    Read the metadata sidecar of a file-backed buffer
+
+    :param directory: (str) the directory of the buffer
+    :return: ((dict, {str: numpy Any}) or (None, None)) the metadata and the arrays saved with it, None if there is
+        no sidecar
+    """
+    metadata = _read_json(directory)
+    if metadata is None:
+        return None, None
+    arrays = {name: np.load(os.path.join(directory, name + '.npy')) for name in metadata.pop('arrays', [])}
+    return metadata, arrays
+
+
+def _read_json(directory):
+    path = os.path.join(directory, METADATA_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as file_handler:
+        return json.load(file_handler)
@@ -0,0 +1,85 @@
+"""Background sampling of training batches, so that replay sampling overlaps with the TensorFlow updates."""
+import queue
+import threading
+
+
+class BatchPrefetcher(object):
+    def __init__(self, sample_fn, process_fn=None, n_batches=2, lock=None):
+        """
+        Sample batches in a worker thread and keep up to `n_batches` of them ready in a bounded queue.
+
+        The buffer is shared with the thread that fills it, so every write to the buffer (adding transitions,
+        updating priorities) must hold `lock`, which is also held while sampling: wrap the writing methods with
+        `locked`. The worker is started by the first call to `get`, once the buffer holds enough data to sample from.
+
+        :param sample_fn: (function (): Any) samples a batch from the buffer, called with `lock` held
+        :param process_fn: (function (Any): Any) host-side preprocessing of a sampled batch (type conversions,
+            building the inputs of the model, ...), called without the lock
+        :param n_batches: (int) the number of ready batches kept in the queue. The batches are sampled from the
+            buffer as it was up to `n_batches` updates earlier.
+        :param lock: (threading.Lock) the lock protecting the buffer, a new one if None
+        """
+        assert n_batches > 0
+        self.sample_fn = sample_fn
+        self.process_fn = process_fn
+        self.lock = threading.Lock() if lock is None else lock
+        self._queue = queue.Queue(maxsize=n_batches)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def locked(self, func):
+        """
+        Wrap a function writing to the buffer so that it holds the lock of the prefetcher
+
+        :param func: (function) the function to wrap (e.g. `buffer.add` or `buffer.update_priorities`)
+        :return: (function) the wrapped function
+        """
+        def _locked(*args, **kwargs):
+            with self.lock:
+                return func(*args, **kwargs)
+        return _locked
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with self.lock:
+                    batch = self.sample_fn()
+                if self.process_fn is not None:
+                    batch = self.process_fn(batch)
+                item = (batch, None)
+            except Exception as error:  # pylint: disable=broad-except
+                item = (None, error)
+            while not self._stop.is_set():
+                try:
+                    self._queue.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+            if item[1] is not None:
+                return
+
+    def get(self):
+        """
+        Get the next ready batch, starting the worker on the first call
+
+        :return: (Any) the batch, as returned by `process_fn` (or `sample_fn`)
+        """
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        batch, error = self._queue.get()
+        if error is not None:
+            raise error
+        return batch
+
+    def close(self):
+        """
+        Stop the worker and drop the batches that were not used
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        while not self._queue.empty():
+            self._queue.get_nowait()
@@ -1,25 +1,80 @@
 import numpy as np
 from abc import ABC, abstractmethod
 
+from baselines.common.vec_env.batched_vec_env import as_vec_env
+from baselines.common.vec_env.concat_vec_env import ConcatVecEnv
+
 
 class AbstractEnvRunner(ABC):
-    def __init__(self, *, env, model, n_steps):
+    def __init__(self, *, env, model, n_steps, pipelined=False):
         """
         A runner to learn the policy of an environment for a model
 
-        :param env: (Gym environment) The environment to learn from
+        :param env: (VecEnv or BatchedEnv) The environment to learn from
         :param model: (Model) The model to learn
         :param n_steps: (int) The number of steps to run for each environment
+        :param pipelined: (bool) step the parts of a ConcatVecEnv in turn, running the model on the observations of
+            a part while the others simulate. The parts must have the same number of environments, which is the
+            batch size the model acts on.
         """
-        self.env = env
+        self.env = env = as_vec_env(env)
         self.model = model
         n_env = env.num_envs
         self.batch_ob_shape = (n_env*n_steps,) + env.observation_space.shape
         self.obs = np.zeros((n_env,) + env.observation_space.shape, dtype=env.observation_space.dtype.name)
         self.obs[:] = env.reset()
         self.n_steps = n_steps
-        self.states = model.initial_state
-        self.dones = [False for _ in range(n_env)]
+        if pipelined:
+            assert isinstance(env, ConcatVecEnv), "the pipelined mode steps the parts of a ConcatVecEnv"
+            assert len(set(venv.num_envs for venv in env.venvs)) == 1, "the parts must have the same size"
+            self.venvs, self.env_slices = env.venvs, env.env_slices
+        else:
+            self.venvs, self.env_slices = [env], [slice(0, n_env)]
+        # the internal states of the recurrent policies, for the environments of every part
+        self.part_states = [model.initial_state for _ in self.venvs]
+        self.dones = np.zeros((n_env,), dtype=np.bool_)
+
+    @property
+    def states(self):
+        """
+        The internal states of the recurrent policies for all the environments, None for the other policies
+        """
+        if self.part_states[0] is None:
+            return None
+        return np.concatenate(self.part_states)
+
+    def _rollout(self, act, observe):
+        """
+        Run `n_steps` steps of every part of the environment. With several parts, the model acts on the
+        observations of a part while the others are stepped.
+
+        :param act: (function (int): [int] or [float]) run the model on the current observations of a part, given its
+            index, and return the actions
+        :param observe: (function (int, [int] or [float], [float], [bool], [dict])) process the observations, rewards,
+            dones and infos of a step of a part, given its index
+        """
+        pending = [False for _ in self.venvs]
+        for _ in range(self.n_steps):
+            for part, venv in enumerate(self.venvs):
+                if pending[part]:
+                    observe(part, *venv.step_wait())
+                venv.step_async(act(part))
+                pending[part] = True
+        for part, venv in enumerate(self.venvs):
+            observe(part, *venv.step_wait())
+
+    @staticmethod
+    def _stack_parts(part_values, dtype=None):
+        """
+        Stack the values recorded at every step for every part
+
+        :param part_values: ([[numpy Any]]) the values of every step, for every part
+        :param dtype: (numpy dtype) the dtype of the array, inferred from the values if None
+        :return: (numpy Any) the values, of shape (n_steps, n_env, ...)
+        """
+        if len(part_values) == 1:
+            return np.asarray(part_values[0], dtype=dtype)
+        return np.concatenate([np.asarray(values, dtype=dtype) for values in part_values], axis=1)
 
     @abstractmethod
     def run(self):
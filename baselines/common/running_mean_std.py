@@ -14,10 +14,22 @@ class RunningMeanStd(object):
         self.var = np.ones(shape, 'float64')
         self.count = epsilon
 
-    def update(self, arr):
-        batch_mean = np.mean(arr, axis=0)
-        batch_var = np.var(arr, axis=0)
-        batch_count = arr.shape[0]
+    def update(self, arr, comm=None):
+        """
+        update the running mean and var with a batch of data
+
+        :param arr: (numpy Number) the data, batched along the first axis
+        :param comm: (MPI Communicators) the communicator of the ranks whose data to average, a collective call on
+            it, None for the data of this process only
+        """
+        if comm is None:
+            batch_mean = np.mean(arr, axis=0)
+            batch_var = np.var(arr, axis=0)
+            batch_count = arr.shape[0]
+        else:
+            from baselines.common.mpi_moments import mpi_moments
+            batch_mean, batch_std, batch_count = mpi_moments(np.asarray(arr, dtype=np.float64), axis=0, comm=comm)
+            batch_var = np.square(batch_std)
         self.update_from_moments(batch_mean, batch_var, batch_count)
 
     def update_from_moments(self, batch_mean, batch_var, batch_count):
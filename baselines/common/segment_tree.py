@@ -1,4 +1,4 @@
-import operator
+import numpy as np
 
 
 class SegmentTree(object):
@@ -17,30 +17,20 @@ class SegmentTree(object):
                `reduce` operation which reduces `operation` over
                a contiguous subsequence of items in the array.
 
+        The nodes are stored in a numpy array, node `i` having the children `2 * i` and `2 * i + 1`, so that
+        items can be read and written several at a time.
+
         :param capacity: (int) Total size of the array - must be a power of two.
-        :param operation: (lambda (Any, Any): Any) operation for combining elements (eg. sum, max) must form a
+        :param operation: (numpy ufunc) operation for combining elements (eg. np.add, np.maximum) must form a
             mathematical group together with the set of possible values for array elements (i.e. be associative)
-        :param neutral_element: (Any) neutral element for the operation above. eg. float('-inf') for max and 0 for sum.
+        :param neutral_element: (float) neutral element for the operation above. eg. float('-inf') for max and 0 for
+            sum.
         """
         assert capacity > 0 and capacity & (capacity - 1) == 0, "capacity must be positive and a power of 2."
         self._capacity = capacity
-        self._value = [neutral_element for _ in range(2 * capacity)]
+        self._value = np.full(2 * capacity, neutral_element, dtype=np.float64)
         self._operation = operation
-
-    def _reduce_helper(self, start, end, node, node_start, node_end):
-        if start == node_start and end == node_end:
-            return self._value[node]
-        mid = (node_start + node_end) // 2
-        if end <= mid:
-            return self._reduce_helper(start, end, 2 * node, node_start, mid)
-        else:
-            if mid + 1 <= start:
-                return self._reduce_helper(start, end, 2 * node + 1, mid + 1, node_end)
-            else:
-                return self._operation(
-                    self._reduce_helper(start, mid, 2 * node, node_start, mid),
-                    self._reduce_helper(mid + 1, end, 2 * node + 1, mid + 1, node_end)
-                )
+        self._neutral_element = neutral_element
 
     def reduce(self, start=0, end=None):
         """
@@ -57,31 +47,50 @@ class SegmentTree(object):
             end = self._capacity
         if end < 0:
             end += self._capacity
-        end -= 1
-        return self._reduce_helper(start, end, 1, 0, self._capacity - 1)
+        # iterative bottom-up reduction over the leaves [start, end)
+        start += self._capacity
+        end += self._capacity
+        result_left = result_right = self._neutral_element
+        while start < end:
+            if start & 1:
+                result_left = self._operation(result_left, self._value[start])
+                start += 1
+            if end & 1:
+                end -= 1
+                result_right = self._operation(self._value[end], result_right)
+            start //= 2
+            end //= 2
+        return self._operation(result_left, result_right)
 
     def __setitem__(self, idx, val):
-        # index of the leaf
-        idx += self._capacity
-        self._value[idx] = val
-        idx //= 2
-        while idx >= 1:
-            self._value[idx] = self._operation(
-                self._value[2 * idx],
-                self._value[2 * idx + 1]
-            )
-            idx //= 2
+        """
+        Set the value of one or several items.
+
+        When several indexes are given, each internal node above them is recomputed only once.
+
+        :param idx: (int or [int]) the index or indexes of the items
+        :param val: (float or [float]) the value or values to set
+        """
+        # index of the leaves
+        idxes = np.asarray(idx) + self._capacity
+        self._value[idxes] = val
+        # all the leaves are at the same depth, so the parents are updated one level at a time
+        idxes = np.unique(idxes // 2)
+        while idxes.size > 0 and idxes[0] >= 1:
+            self._value[idxes] = self._operation(self._value[2 * idxes], self._value[2 * idxes + 1])
+            idxes = np.unique(idxes // 2) if idxes[0] > 1 else idxes[:0]
 
     def __getitem__(self, idx):
-        assert 0 <= idx < self._capacity
-        return self._value[self._capacity + idx]
+        idxes = np.asarray(idx)
+        assert np.all((0 <= idxes) & (idxes < self._capacity))
+        return self._value[self._capacity + idxes]
 
 
 class SumSegmentTree(SegmentTree):
     def __init__(self, capacity):
         super(SumSegmentTree, self).__init__(
             capacity=capacity,
-            operation=operator.add,
+            operation=np.add,
             neutral_element=0.0
         )
 
@@ -104,25 +113,31 @@ class SumSegmentTree(SegmentTree):
         allows to sample indexes according to the discrete
         probability efficiently.
 
-        :param prefixsum: (float) upperbound on the sum of array prefix
-        :return: (int) highest index satisfying the prefixsum constraint
+        When several prefix sums are given, they all descend the tree together, one level at a time.
+
+        :param prefixsum: (float or [float]) upperbound on the sum of array prefix
+        :return: (int or numpy int) highest index satisfying the prefixsum constraint, for each prefixsum given
         """
-        assert 0 <= prefixsum <= self.sum() + 1e-5
-        idx = 1
-        while idx < self._capacity:  # while non-leaf
-            if self._value[2 * idx] > prefixsum:
-                idx = 2 * idx
-            else:
-                prefixsum -= self._value[2 * idx]
-                idx = 2 * idx + 1
-        return idx - self._capacity
+        scalar = np.ndim(prefixsum) == 0
+        prefixsum = np.array(prefixsum, dtype=np.float64, ndmin=1)
+        assert np.all(0 <= prefixsum) and np.all(prefixsum <= self.sum() + 1e-5)
+        idx = np.ones(prefixsum.shape, dtype=np.int64)
+        for _ in range(self._capacity.bit_length() - 1):  # one iteration per non-leaf level
+            left = self._value[2 * idx]
+            go_right = left <= prefixsum
+            prefixsum -= np.where(go_right, left, 0.0)
+            idx = 2 * idx + go_right
+        idx -= self._capacity
+        if scalar:
+            return int(idx[0])
+        return idx
 
 
 class MinSegmentTree(SegmentTree):
     def __init__(self, capacity):
         super(MinSegmentTree, self).__init__(
             capacity=capacity,
-            operation=min,
+            operation=np.minimum,
             neutral_element=float('inf')
         )
 
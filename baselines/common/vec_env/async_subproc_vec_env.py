@@ -0,0 +1,112 @@
+from multiprocessing.connection import wait
+
+import numpy as np
+
+from baselines.common.vec_env.subproc_vec_env import SubprocVecEnv
+from baselines.common.vec_env.util import dict_to_obs, stack_obs
+
+
+class AsyncSubprocVecEnv(SubprocVecEnv):
+    def __init__(self, env_fns, min_ready=None, shared_memory=False, envs_per_worker=1, start_method=None,
+                 observation_space=None, action_space=None):
+        """
+        A multiprocess vectorized wrapper that does not wait for the slowest environments: `step_wait` returns as
+        soon as `min_ready` environments have results, and only those are stepped by the next `step_async`, while
+        the others keep running.
+
+        The results concern the environments of `ready_env_idxs`, set by `reset` (all of them) and by every
+        `step_wait`. With `min_ready` equal to the number of environments, it behaves like `SubprocVecEnv`.
+
+        :param env_fns: ([Gym Environment]) Environments to run in subprocesses
+        :param min_ready: (int) the number of environments to wait for, all of them if None
+        :param shared_memory: (bool) transport the observations through shared memory, see SubprocVecEnv.__init__
+        :param envs_per_worker: (int) the number of environments run by each subprocess, see SubprocVecEnv.__init__.
+            The environments of a worker become ready together.
+        :param start_method: (str) the method used to start the subprocesses, see SubprocVecEnv.__init__
+        :param observation_space: (Gym Space) the cached observation space, see SubprocVecEnv.__init__
+        :param action_space: (Gym Space) the cached action space, see SubprocVecEnv.__init__
+        """
+        SubprocVecEnv.__init__(self, env_fns, shared_memory=shared_memory, envs_per_worker=envs_per_worker,
+                               start_method=start_method, observation_space=observation_space,
+                               action_space=action_space)
+        self.min_ready = self.num_envs if min_ready is None else min_ready
+        assert 0 < self.min_ready <= self.num_envs
+        self.env_workers = np.repeat(np.arange(len(self.worker_slices)),
+                                     [env_slice.stop - env_slice.start for env_slice in self.worker_slices])
+        # the workers stepping, and the environments whose results were last returned
+        self.pending_workers = set()
+        self.ready_env_idxs = np.arange(self.num_envs)
+
+    def step_async(self, actions, env_idxs=None):
+        """
+        Tell the environments to start taking a step with the given actions
+
+        :param actions: ([int] or [float]) the actions, one per environment of `env_idxs`
+        :param env_idxs: ([int]) the environments to step, covering whole workers, `ready_env_idxs` if None
+        """
+        env_idxs = self.ready_env_idxs if env_idxs is None else np.asarray(env_idxs)
+        assert len(actions) == len(env_idxs)
+        env_actions = dict(zip(env_idxs.tolist(), actions))
+        for worker in np.unique(self.env_workers[env_idxs]).tolist():
+            assert worker not in self.pending_workers, "worker {} is already stepping".format(worker)
+            env_slice = self.worker_slices[worker]
+            assert all(env_idx in env_actions for env_idx in range(env_slice.start, env_slice.stop)), \
+                "the environments of a worker must be stepped together"
+            self.remotes[worker].send(('step', [env_actions[env_idx] for env_idx in range(env_slice.start,
+                                                                                          env_slice.stop)]))
+            self.pending_workers.add(worker)
+        self.waiting = True
+
+    def step_wait(self):
+        """
+        Wait until at least `min_ready` environments have stepped (or all the stepping ones, if fewer are), and
+        return the results of every environment that is done stepping, listed in `ready_env_idxs`
+
+        :return: ([int] or [float], [float], [bool], dict) observation, reward, done, information
+        """
+        assert self.pending_workers, "no environment is stepping"
+        results = {}
+
+        def _receive(timeout=None):
+            remotes = [self.remotes[worker] for worker in self.pending_workers]
+            for remote in wait(remotes, timeout=timeout):
+                worker = self.remotes.index(remote)
+                self.pending_workers.remove(worker)
+                results[worker] = remote.recv()
+
+        while self.pending_workers and sum(len(result) for result in results.values()) < self.min_ready:
+            _receive()
+        # the results that arrived meanwhile come for free
+        if self.pending_workers:
+            _receive(timeout=0)
+        self.waiting = bool(self.pending_workers)
+
+        workers = sorted(results)
+        self.ready_env_idxs = np.concatenate([np.arange(self.worker_slices[worker].start,
+                                                        self.worker_slices[worker].stop) for worker in workers])
+        obs, rews, dones, infos = zip(*[result for worker in workers for result in results[worker]])
+        return self._stack_obs(obs), np.stack(rews), np.stack(dones), infos
+
+    def _stack_obs(self, obs):
+        if self.shared_obs is None:
+            return stack_obs(obs, self.keys)
+        return dict_to_obs({key: view[self.ready_env_idxs] for key, view in self.obs_views.items()})
+
+    def _drain(self):
+        """
+        Receive the results of the environments still stepping, dropping them
+        """
+        for worker in self.pending_workers:
+            self.remotes[worker].recv()
+        self.pending_workers = set()
+        self.waiting = False
+
+    def reset(self):
+        self._drain()
+        self.ready_env_idxs = np.arange(self.num_envs)
+        return SubprocVecEnv.reset(self)
+
+    def close(self):
+        if not self.closed:
+            self._drain()
+        SubprocVecEnv.close(self)
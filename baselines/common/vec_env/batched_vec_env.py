@@ -0,0 +1,93 @@
+from abc import ABC, abstractmethod
+
+from baselines.common.vec_env import VecEnv
+
+
+class BatchedEnv(ABC):
+    def __init__(self, num_envs, observation_space, action_space):
+        """
+        A simulator stepping all its environments in one vectorized call, instead of one `gym.Env` per environment.
+        Wrap it with BatchedVecEnv to use it as a VecEnv, the algorithms taking a VecEnv do it themselves.
+
+        :param num_envs: (int) the number of environments
+        :param observation_space: (Gym Space) the observation space of an environment
+        :param action_space: (Gym Space) the action space of an environment
+        """
+        self.num_envs = num_envs
+        self.observation_space = observation_space
+        self.action_space = action_space
+
+    @abstractmethod
+    def reset_batch(self):
+        """
+        Reset all the environments
+
+        :return: (numpy Any) the observations, one per environment
+        """
+        pass
+
+    @abstractmethod
+    def step_batch(self, actions):
+        """
+        Step all the environments, resetting the ones done: their observations are then the first of the next
+        episode.
+
+        :param actions: (numpy Any) the actions, one per environment
+        :return: (numpy Any, numpy float, numpy bool, [dict]) the observations, rewards, dones and information of
+            every environment. The information can be a sequence of the same empty dict when there is nothing to
+            report.
+        """
+        pass
+
+    def close(self):
+        """
+        Clean up the simulator's resources
+        """
+        pass
+
+    def render(self, mode='human'):
+        """
+        Render the environments
+
+        :param mode: (str) the rendering type
+        """
+        pass
+
+
+class BatchedVecEnv(VecEnv):
+    def __init__(self, batched_env):
+        """
+        A vectorized environment passing through to a BatchedEnv, without any work per environment
+
+        :param batched_env: (BatchedEnv) the simulator of the environments
+        """
+        self.batched_env = batched_env
+        self.actions = None
+        VecEnv.__init__(self, batched_env.num_envs, batched_env.observation_space, batched_env.action_space)
+
+    def step_async(self, actions):
+        self.actions = actions
+
+    def step_wait(self):
+        return self.batched_env.step_batch(self.actions)
+
+    def reset(self):
+        return self.batched_env.reset_batch()
+
+    def close(self):
+        self.batched_env.close()
+
+    def render(self, mode='human'):
+        return self.batched_env.render(mode=mode)
+
+
+def as_vec_env(env):
+    """
+    Get a vectorized environment from a BatchedEnv, other environments being returned as they are
+
+    :param env: (VecEnv or BatchedEnv) the environment
+    :return: (VecEnv) the vectorized environment
+    """
+    if isinstance(env, BatchedEnv):
+        return BatchedVecEnv(env)
+    return env
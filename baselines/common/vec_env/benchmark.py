@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Compare the startup time and the stepping speed of the vectorized environments, e.g.
+
+    python -m baselines.common.vec_env.benchmark --env PongNoFrameskip-v4 --num-env 8
+
+The classic control tasks (e.g. CartPole-v1) are also compared with their numpy implementation, see
+classic_control_vec_env.py.
+"""
+import argparse
+import time
+
+import gym
+import numpy as np
+
+from baselines.common.vec_env.classic_control_vec_env import CLASSIC_CONTROL_VEC_ENVS, make_classic_control_vec_env
+from baselines.common.vec_env.dummy_vec_env import DummyVecEnv
+from baselines.common.vec_env.subproc_vec_env import SubprocVecEnv
+from baselines.common.vec_env.thread_vec_env import ThreadVecEnv
+
+VEC_ENV_CLASSES = {'dummy': DummyVecEnv, 'thread': ThreadVecEnv, 'subproc': SubprocVecEnv}
+
+
+def make_env_fns(env_id, num_env, seed=0):
+    """
+    Create the functions building the environments to benchmark
+
+    :param env_id: (str) the environment ID
+    :param num_env: (int) the number of environments
+    :param seed: (int) the seed of the first environment
+    :return: ([function]) the functions building the environments
+    """
+    def make_env(rank):
+        def _thunk():
+            env = gym.make(env_id)
+            env.seed(seed + rank)
+            return env
+        return _thunk
+    return [make_env(rank) for rank in range(num_env)]
+
+
+def benchmark(vec_env_class, env_fns, num_steps):
+    """
+    Time the creation of a vectorized environment and its steps with random actions
+
+    :param vec_env_class: (type or function) the class of the vectorized environment, or a function building it from
+        the functions building the environments
+    :param env_fns: ([function]) the functions building the environments
+    :param num_steps: (int) the number of steps of every environment
+    :return: (float, float) the startup time in seconds, and the number of environment steps per second
+    """
+    start = time.time()
+    vec_env = vec_env_class(env_fns)
+    vec_env.reset()
+    startup_time = time.time() - start
+
+    # the actions are sampled beforehand, so that sampling is not timed
+    actions = [np.stack([vec_env.action_space.sample() for _ in range(vec_env.num_envs)]) for _ in range(100)]
+    start = time.time()
+    for step in range(num_steps):
+        vec_env.step(actions[step % len(actions)])
+    fps = num_steps * vec_env.num_envs / (time.time() - start)
+    vec_env.close()
+    return startup_time, fps
+
+
+def main():
+    """
+    Run the benchmark
+    """
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--env', help='environment ID', type=str, default='PongNoFrameskip-v4')
+    parser.add_argument('--num-env', help='number of environments', type=int, default=8)
+    parser.add_argument('--num-steps', help='number of steps of every environment', type=int, default=2000)
+    parser.add_argument('--vec-envs', help="vectorized environments to compare, all of them by default ('numpy' only "
+                                           "for the classic control tasks)", nargs='+',
+                        choices=list(VEC_ENV_CLASSES) + ['numpy'], default=None)
+    args = parser.parse_args()
+
+    is_classic_control = args.env in CLASSIC_CONTROL_VEC_ENVS
+    if args.vec_envs is None:
+        args.vec_envs = list(VEC_ENV_CLASSES) + (['numpy'] if is_classic_control else [])
+    elif 'numpy' in args.vec_envs and not is_classic_control:
+        parser.error("'numpy' is only available for the classic control tasks: {}"
+                     .format(', '.join(sorted(CLASSIC_CONTROL_VEC_ENVS))))
+
+    env_fns = make_env_fns(args.env, args.num_env)
+    vec_env_classes = dict(VEC_ENV_CLASSES)
+    if is_classic_control:
+        vec_env_classes['numpy'] = lambda fns: make_classic_control_vec_env(args.env, len(fns))
+    print("{:>10} {:>12} {:>12}".format('vec env', 'startup (s)', 'steps/s'))
+    for name in args.vec_envs:
+        startup_time, fps = benchmark(vec_env_classes[name], env_fns, args.num_steps)
+        print("{:>10} {:>12.2f} {:>12.0f}".format(name, startup_time, fps))
+
+
+if __name__ == '__main__':
+    main()
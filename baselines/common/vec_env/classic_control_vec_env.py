@@ -0,0 +1,340 @@
+from abc import abstractmethod
+
+import numpy as np
+from gym import spaces
+
+from baselines.common.vec_env import VecEnv
+
+
+class ClassicControlVecEnv(VecEnv):
+    def __init__(self, num_envs, observation_space, action_space, state_size, max_episode_steps, seed=None):
+        """
+        A vectorized classic control task, whose dynamics, time limit and resets are computed with numpy over all the
+        environments at once, instead of one gym environment per environment.
+
+        The transitions are the ones of the gym environment (in float64, the observations being returned in float32 as
+        their space), the environments done (terminal or at the time limit) being reset, as with DummyVecEnv.
+
+        :param num_envs: (int) the number of environments
+        :param observation_space: (Gym Space) the observation space of an environment
+        :param action_space: (Gym Space) the action space of an environment
+        :param state_size: (int) the size of the state of an environment
+        :param max_episode_steps: (int) the number of steps after which an episode is done, as gym's TimeLimit
+        :param seed: (int) the seed of the random initial states
+        """
+        VecEnv.__init__(self, num_envs, observation_space, action_space)
+        self.max_episode_steps = max_episode_steps
+        self.state = np.zeros((num_envs, state_size), dtype=np.float64)
+        self.episode_steps = np.zeros((num_envs,), dtype=np.int64)
+        self.np_random = None
+        self.seed(seed)
+        self.actions = None
+
+    def seed(self, seed=None):
+        """
+        Seed the random initial states of the environments
+
+        :param seed: (int) the seed, None for a random one
+        """
+        self.np_random = np.random.RandomState(seed)
+
+    def step_async(self, actions):
+        self.actions = actions
+
+    def step_wait(self):
+        actions = np.asarray(self.actions).reshape((self.num_envs,) + self.action_space.shape)
+        rewards, terminals = self._step_state(actions)
+        self.episode_steps += 1
+        dones = terminals | (self.episode_steps >= self.max_episode_steps)
+        if dones.any():
+            self._reset_envs(dones)
+        return (self._get_obs().astype(np.float32), rewards.astype(np.float32), dones,
+                [{} for _ in range(self.num_envs)])
+
+    def reset(self):
+        self._reset_envs(np.ones((self.num_envs,), dtype=np.bool_))
+        return self._get_obs().astype(np.float32)
+
+    def _reset_envs(self, mask):
+        """
+        Draw the initial states of environments
+
+        :param mask: (numpy bool) whether each environment is reset
+        """
+        self.state[mask] = self._initial_state(int(mask.sum()))
+        self.episode_steps[mask] = 0
+
+    @abstractmethod
+    def _initial_state(self, n_envs):
+        """
+        Draw initial states
+
+        :param n_envs: (int) the number of states
+        :return: (numpy float) the states, of shape (n_envs, state_size)
+        """
+        pass
+
+    @abstractmethod
+    def _step_state(self, actions):
+        """
+        Update the states of all the environments with their actions
+
+        :param actions: (numpy Any) the actions, one per environment
+        :return: (numpy float, numpy bool) the rewards, and whether the new states are terminal
+        """
+        pass
+
+    @abstractmethod
+    def _get_obs(self):
+        """
+        :return: (numpy float) the observations of the current states
+        """
+        pass
+
+    def close(self):
+        return
+
+
+class CartPoleVecEnv(ClassicControlVecEnv):
+    gravity = 9.8
+    masscart = 1.0
+    masspole = 0.1
+    total_mass = masspole + masscart
+    length = 0.5
+    polemass_length = masspole * length
+    force_mag = 10.0
+    tau = 0.02
+    theta_threshold_radians = 12 * 2 * np.pi / 360
+    x_threshold = 2.4
+
+    def __init__(self, num_envs, max_episode_steps=500, seed=None):
+        """
+        A vectorized CartPole-v1 (CartPole-v0 with max_episode_steps=200)
+
+        :param num_envs: (int) the number of environments
+        :param max_episode_steps: (int) the number of steps after which an episode is done
+        :param seed: (int) the seed of the random initial states
+        """
+        high = np.array([self.x_threshold * 2, np.finfo(np.float32).max, self.theta_threshold_radians * 2,
+                         np.finfo(np.float32).max])
+        ClassicControlVecEnv.__init__(self, num_envs, spaces.Box(-high, high, dtype=np.float32), spaces.Discrete(2),
+                                      4, max_episode_steps, seed=seed)
+
+    def _initial_state(self, n_envs):
+        return self.np_random.uniform(low=-0.05, high=0.05, size=(n_envs, 4))
+
+    def _step_state(self, actions):
+        x, x_dot, theta, theta_dot = self.state.T
+        force = np.where(actions == 1, self.force_mag, -self.force_mag)
+        costheta = np.cos(theta)
+        sintheta = np.sin(theta)
+        temp = (force + self.polemass_length * theta_dot * theta_dot * sintheta) / self.total_mass
+        thetaacc = (self.gravity * sintheta - costheta * temp) / \
+            (self.length * (4.0 / 3.0 - self.masspole * costheta * costheta / self.total_mass))
+        xacc = temp - self.polemass_length * thetaacc * costheta / self.total_mass
+        x = x + self.tau * x_dot
+        x_dot = x_dot + self.tau * xacc
+        theta = theta + self.tau * theta_dot
+        theta_dot = theta_dot + self.tau * thetaacc
+        self.state = np.stack([x, x_dot, theta, theta_dot], axis=1)
+        terminals = (x < -self.x_threshold) | (x > self.x_threshold) | \
+            (theta < -self.theta_threshold_radians) | (theta > self.theta_threshold_radians)
+        return np.ones((self.num_envs,)), terminals
+
+    def _get_obs(self):
+        return self.state
+
+
+class MountainCarVecEnv(ClassicControlVecEnv):
+    min_position = -1.2
+    max_position = 0.6
+    max_speed = 0.07
+    goal_position = 0.5
+
+    def __init__(self, num_envs, max_episode_steps=200, seed=None):
+        """
+        A vectorized MountainCar-v0
+
+        :param num_envs: (int) the number of environments
+        :param max_episode_steps: (int) the number of steps after which an episode is done
+        :param seed: (int) the seed of the random initial states
+        """
+        low = np.array([self.min_position, -self.max_speed])
+        high = np.array([self.max_position, self.max_speed])
+        ClassicControlVecEnv.__init__(self, num_envs, spaces.Box(low, high, dtype=np.float32), spaces.Discrete(3), 2,
+                                      max_episode_steps, seed=seed)
+
+    def _initial_state(self, n_envs):
+        return np.stack([self.np_random.uniform(low=-0.6, high=-0.4, size=(n_envs,)), np.zeros((n_envs,))], axis=1)
+
+    def _step_state(self, actions):
+        position, velocity = self.state.T
+        velocity = velocity + (actions - 1) * 0.001 + np.cos(3 * position) * (-0.0025)
+        velocity = np.clip(velocity, -self.max_speed, self.max_speed)
+        position = np.clip(position + velocity, self.min_position, self.max_position)
+        velocity[(position == self.min_position) & (velocity < 0)] = 0
+        self.state = np.stack([position, velocity], axis=1)
+        return np.full((self.num_envs,), -1.0), position >= self.goal_position
+
+    def _get_obs(self):
+        return self.state
+
+
+class AcrobotVecEnv(ClassicControlVecEnv):
+    dt = .2
+    link_length_1 = 1.
+    link_mass_1 = 1.
+    link_mass_2 = 1.
+    link_com_pos_1 = 0.5
+    link_com_pos_2 = 0.5
+    link_moi = 1.
+    max_vel_1 = 4 * np.pi
+    max_vel_2 = 9 * np.pi
+    avail_torque = np.array([-1., 0., +1])
+
+    def __init__(self, num_envs, max_episode_steps=500, seed=None):
+        """
+        A vectorized Acrobot-v1, with the dynamics of the book
+
+        :param num_envs: (int) the number of environments
+        :param max_episode_steps: (int) the number of steps after which an episode is done
+        :param seed: (int) the seed of the random initial states
+        """
+        high = np.array([1.0, 1.0, 1.0, 1.0, self.max_vel_1, self.max_vel_2])
+        ClassicControlVecEnv.__init__(self, num_envs, spaces.Box(-high, high, dtype=np.float32), spaces.Discrete(3), 4,
+                                      max_episode_steps, seed=seed)
+
+    def _initial_state(self, n_envs):
+        return self.np_random.uniform(low=-0.1, high=0.1, size=(n_envs, 4))
+
+    def _dsdt(self, state, torque):
+        """
+        The derivative of the states
+
+        :param state: (numpy float) the states, of shape (n_envs, 4)
+        :param torque: (numpy float) the torques applied
+        :return: (numpy float) the derivatives of the states
+        """
+        m1, m2 = self.link_mass_1, self.link_mass_2
+        l1, lc1, lc2 = self.link_length_1, self.link_com_pos_1, self.link_com_pos_2
+        i1 = i2 = self.link_moi
+        g = 9.8
+        theta1, theta2, dtheta1, dtheta2 = state.T
+        d1 = m1 * lc1 ** 2 + m2 * (l1 ** 2 + lc2 ** 2 + 2 * l1 * lc2 * np.cos(theta2)) + i1 + i2
+        d2 = m2 * (lc2 ** 2 + l1 * lc2 * np.cos(theta2)) + i2
+        phi2 = m2 * lc2 * g * np.cos(theta1 + theta2 - np.pi / 2.)
+        phi1 = - m2 * l1 * lc2 * dtheta2 ** 2 * np.sin(theta2) \
+            - 2 * m2 * l1 * lc2 * dtheta2 * dtheta1 * np.sin(theta2) \
+            + (m1 * lc1 + m2 * l1) * g * np.cos(theta1 - np.pi / 2) + phi2
+        ddtheta2 = (torque + d2 / d1 * phi1 - m2 * l1 * lc2 * dtheta1 ** 2 * np.sin(theta2) - phi2) \
+            / (m2 * lc2 ** 2 + i2 - d2 ** 2 / d1)
+        ddtheta1 = -(d2 * ddtheta2 + phi1) / d1
+        return np.stack([dtheta1, dtheta2, ddtheta1, ddtheta2], axis=1)
+
+    def _step_state(self, actions):
+        torque = self.avail_torque[actions]
+        # one step of Runge-Kutta 4, as gym's rk4 over [0, dt]
+        state, half_dt = self.state, self.dt / 2.0
+        k_1 = self._dsdt(state, torque)
+        k_2 = self._dsdt(state + half_dt * k_1, torque)
+        k_3 = self._dsdt(state + half_dt * k_2, torque)
+        k_4 = self._dsdt(state + self.dt * k_3, torque)
+        state = state + self.dt / 6.0 * (k_1 + 2 * k_2 + 2 * k_3 + k_4)
+        state[:, :2] = _wrap(state[:, :2], -np.pi, np.pi)
+        state[:, 2] = np.clip(state[:, 2], -self.max_vel_1, self.max_vel_1)
+        state[:, 3] = np.clip(state[:, 3], -self.max_vel_2, self.max_vel_2)
+        self.state = state
+        terminals = -np.cos(state[:, 0]) - np.cos(state[:, 1] + state[:, 0]) > 1.
+        return np.where(terminals, 0., -1.), terminals
+
+    def _get_obs(self):
+        theta1, theta2, dtheta1, dtheta2 = self.state.T
+        return np.stack([np.cos(theta1), np.sin(theta1), np.cos(theta2), np.sin(theta2), dtheta1, dtheta2], axis=1)
+
+
+class PendulumVecEnv(ClassicControlVecEnv):
+    max_speed = 8
+    max_torque = 2.
+    dt = .05
+    gravity = 10.
+    mass = 1.
+    length = 1.
+
+    def __init__(self, num_envs, max_episode_steps=200, seed=None):
+        """
+        A vectorized Pendulum-v0
+
+        :param num_envs: (int) the number of environments
+        :param max_episode_steps: (int) the number of steps after which an episode is done
+        :param seed: (int) the seed of the random initial states
+        """
+        high = np.array([1., 1., self.max_speed])
+        ClassicControlVecEnv.__init__(self, num_envs, spaces.Box(-high, high, dtype=np.float32),
+                                      spaces.Box(low=-self.max_torque, high=self.max_torque, shape=(1,),
+                                                 dtype=np.float32),
+                                      2, max_episode_steps, seed=seed)
+
+    def _initial_state(self, n_envs):
+        high = np.array([np.pi, 1])
+        return self.np_random.uniform(low=-high, high=high, size=(n_envs, 2))
+
+    def _step_state(self, actions):
+        theta, theta_dot = self.state.T
+        torque = np.clip(actions[:, 0], -self.max_torque, self.max_torque)
+        costs = _angle_normalize(theta) ** 2 + .1 * theta_dot ** 2 + .001 * (torque ** 2)
+        theta_dot = theta_dot + (-3 * self.gravity / (2 * self.length) * np.sin(theta + np.pi) +
+                                 3. / (self.mass * self.length ** 2) * torque) * self.dt
+        theta = theta + theta_dot * self.dt
+        theta_dot = np.clip(theta_dot, -self.max_speed, self.max_speed)
+        self.state = np.stack([theta, theta_dot], axis=1)
+        return -costs, np.zeros((self.num_envs,), dtype=np.bool_)
+
+    def _get_obs(self):
+        theta, theta_dot = self.state.T
+        return np.stack([np.cos(theta), np.sin(theta), theta_dot], axis=1)
+
+
+def _wrap(values, low, high):
+    """
+    Wrap values around [low, high], as gym's acrobot.wrap
+
+    :param values: (numpy float) the values
+    :param low: (float) the lower bound
+    :param high: (float) the upper bound
+    :return: (numpy float) the wrapped values
+    """
+    diff = high - low
+    values = values - diff * np.ceil(np.maximum(values - high, 0) / diff)
+    return values + diff * np.ceil(np.maximum(low - values, 0) / diff)
+
+
+def _angle_normalize(angle):
+    """
+    Wrap angles around [-pi, pi), as gym's pendulum.angle_normalize
+
+    :param angle: (numpy float) the angles
+    :return: (numpy float) the wrapped angles
+    """
+    return ((angle + np.pi) % (2 * np.pi)) - np.pi
+
+
+CLASSIC_CONTROL_VEC_ENVS = {
+    'CartPole-v0': (CartPoleVecEnv, {'max_episode_steps': 200}),
+    'CartPole-v1': (CartPoleVecEnv, {'max_episode_steps': 500}),
+    'MountainCar-v0': (MountainCarVecEnv, {'max_episode_steps': 200}),
+    'Acrobot-v1': (AcrobotVecEnv, {'max_episode_steps': 500}),
+    'Pendulum-v0': (PendulumVecEnv, {'max_episode_steps': 200}),
+}
+
+
+def make_classic_control_vec_env(env_id, num_envs, seed=None):
+    """
+    Create the vectorized version of a gym classic control task
+
+    :param env_id: (str) the gym id of the task, a key of CLASSIC_CONTROL_VEC_ENVS
+    :param num_envs: (int) the number of environments
+    :param seed: (int) the seed of the random initial states
+    :return: (ClassicControlVecEnv) the vectorized environment
+    """
+    env_class, kwargs = CLASSIC_CONTROL_VEC_ENVS[env_id]
+    return env_class(num_envs, seed=seed, **kwargs)
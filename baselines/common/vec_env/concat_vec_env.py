@@ -0,0 +1,54 @@
+import numpy as np
+
+from baselines.common.vec_env import VecEnv
+from baselines.common.vec_env.batched_vec_env import as_vec_env
+from baselines.common.vec_env.util import obs_to_dict, dict_to_obs
+
+
+class ConcatVecEnv(VecEnv):
+    def __init__(self, venvs):
+        """
+        A vectorized environment made of several vectorized environments, whose environments are concatenated in
+        order. The parts can also be stepped independently, see the `pipelined` mode of the runners.
+
+        :param venvs: ([VecEnv or BatchedEnv]) the vectorized environments, with the same observation and action spaces
+        """
+        assert len(venvs) > 0
+        self.venvs = [as_vec_env(venv) for venv in venvs]
+        # the environments [start, stop) of each part
+        self.env_slices = []
+        n_envs = 0
+        for venv in self.venvs:
+            self.env_slices.append(slice(n_envs, n_envs + venv.num_envs))
+            n_envs += venv.num_envs
+        VecEnv.__init__(self, n_envs, self.venvs[0].observation_space, self.venvs[0].action_space)
+
+    def step_async(self, actions):
+        for venv, env_slice in zip(self.venvs, self.env_slices):
+            venv.step_async(actions[env_slice])
+
+    def step_wait(self):
+        obs, rews, dones, infos = zip(*[venv.step_wait() for venv in self.venvs])
+        return (self._concat_obs(obs), np.concatenate(rews), np.concatenate(dones),
+                [info for part_infos in infos for info in part_infos])
+
+    def reset(self):
+        return self._concat_obs([venv.reset() for venv in self.venvs])
+
+    @staticmethod
+    def _concat_obs(obs):
+        """
+        Concatenate the observations of the parts
+
+        :param obs: ([numpy Any or dict]) the observations of every part
+        :return: (numpy Any or dict) the observations of all the environments
+        """
+        obs = [obs_to_dict(part_obs) for part_obs in obs]
+        return dict_to_obs({key: np.concatenate([part_obs[key] for part_obs in obs]) for key in obs[0]})
+
+    def close(self):
+        for venv in self.venvs:
+            venv.close()
+
+    def render(self, mode='human'):
+        return [venv.render(mode=mode) for venv in self.venvs]
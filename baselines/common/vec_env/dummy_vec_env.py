@@ -1,9 +1,7 @@
-from collections import OrderedDict
-
 import numpy as np
-from gym import spaces
 
 from . import VecEnv
+from .util import obs_space_info, dict_to_obs
 
 
 class DummyVecEnv(VecEnv):
@@ -13,49 +11,61 @@ class DummyVecEnv(VecEnv):
         
         :param env_fns: ([Gym Environment]) the list of environments to vectorize
         """
-        self.envs = [fn() for fn in env_fns]
+        self.envs = self._make_envs(env_fns)
         env = self.envs[0]
         VecEnv.__init__(self, len(env_fns), env.observation_space, env.action_space)
-        shapes, dtypes = {}, {}
-        self.keys = []
-        obs_space = env.observation_space
-
-        if isinstance(obs_space, spaces.Dict):
-            assert isinstance(obs_space.spaces, OrderedDict)
-            subspaces = obs_space.spaces
-        else:
-            subspaces = {None: obs_space}
-
-        for key, box in subspaces.items():
-            shapes[key] = box.shape
-            dtypes[key] = box.dtype
-            self.keys.append(key)
-        
+        self.keys, shapes, dtypes = obs_space_info(env.observation_space)
         self.buf_obs = {k: np.zeros((self.num_envs,) + tuple(shapes[k]), dtype=dtypes[k]) for k in self.keys}
-        self.buf_dones = np.zeros((self.num_envs,), dtype=np.bool)
+        self.buf_dones = np.zeros((self.num_envs,), dtype=np.bool_)
         self.buf_rews = np.zeros((self.num_envs,), dtype=np.float32)
         self.buf_infos = [{} for _ in range(self.num_envs)]
         self.actions = None
 
+    @staticmethod
+    def _make_envs(env_fns):
+        """
+        Build the environments
+
+        :param env_fns: ([function]) the functions building the environments
+        :return: ([Gym Environment]) the environments
+        """
+        return [fn() for fn in env_fns]
+
     def step_async(self, actions):
         self.actions = actions
 
     def step_wait(self):
         for env_idx in range(self.num_envs):
-            obs, self.buf_rews[env_idx], self.buf_dones[env_idx], self.buf_infos[env_idx] =\
-                self.envs[env_idx].step(self.actions[env_idx])
-            if self.buf_dones[env_idx]:
-                obs = self.envs[env_idx].reset()
-            self._save_obs(env_idx, obs)
+            self._step_env(env_idx)
         return (self._obs_from_buf(), np.copy(self.buf_rews), np.copy(self.buf_dones),
                 self.buf_infos.copy())
 
     def reset(self):
         for env_idx in range(self.num_envs):
-            obs = self.envs[env_idx].reset()
-            self._save_obs(env_idx, obs)
+            self._reset_env(env_idx)
         return self._obs_from_buf()
 
+    def _step_env(self, env_idx):
+        """
+        Step an environment with its action, resetting it at the end of an episode, and write the results in the
+        buffers
+
+        :param env_idx: (int) the index of the environment
+        """
+        obs, self.buf_rews[env_idx], self.buf_dones[env_idx], self.buf_infos[env_idx] =\
+            self.envs[env_idx].step(self.actions[env_idx])
+        if self.buf_dones[env_idx]:
+            obs = self.envs[env_idx].reset()
+        self._save_obs(env_idx, obs)
+
+    def _reset_env(self, env_idx):
+        """
+        Reset an environment and write its observation in the buffers
+
+        :param env_idx: (int) the index of the environment
+        """
+        self._save_obs(env_idx, self.envs[env_idx].reset())
+
     def close(self):
         return
 
@@ -70,7 +80,5 @@ class DummyVecEnv(VecEnv):
                 self.buf_obs[key][env_idx] = obs[key]
 
     def _obs_from_buf(self):
-        if self.keys == [None]:
-            return self.buf_obs[None]
-        else:
-            return self.buf_obs
+        # copied, as the buffers are overwritten by the next step
+        return dict_to_obs({key: np.copy(value) for key, value in self.buf_obs.items()})
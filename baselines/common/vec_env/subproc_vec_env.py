@@ -1,32 +1,63 @@
-from multiprocessing import Process, Pipe
+import multiprocessing
+import time
 
 import numpy as np
 
+from baselines import logger
 from baselines.common.vec_env import VecEnv, CloudpickleWrapper
+from baselines.common.vec_env.util import obs_space_info, obs_to_dict, dict_to_obs, stack_obs
 from baselines.common.tile_images import tile_images
 
 
-def _worker(remote, parent_remote, env_fn_wrapper):
+def _shared_obs_views(shared_obs, n_envs):
+    """
+    Get numpy views of the shared observation arrays
+
+    :param shared_obs: ({str: (RawArray, tuple, numpy dtype)}) the shared array, shape and dtype of every key
+    :param n_envs: (int) the number of environments
+    :return: ({str: numpy Any}) the arrays of shape (n_envs,) + shape of every key
+    """
+    return {key: np.frombuffer(array, dtype=dtype).reshape((n_envs,) + tuple(shape))
+            for key, (array, shape, dtype) in shared_obs.items()}
+
+
+def _worker(remote, parent_remote, env_fn_wrappers, shared_obs=None, n_envs=None, first_env_idx=0):
     parent_remote.close()
-    env = env_fn_wrapper.var()
+    start = time.time()
+    envs = [env_fn() for env_fn in env_fn_wrappers.var]
+    # the first message tells that the environments are built
+    remote.send((envs[0].observation_space, envs[0].action_space, time.time() - start))
+    if shared_obs is not None:
+        obs_views = _shared_obs_views(shared_obs, n_envs)
+
+    def _send_obs(env_idx, observation):
+        # with shared memory, the observation is written in the slot of the env and only None goes through the pipe
+        if shared_obs is None:
+            return observation
+        for key, value in obs_to_dict(observation).items():
+            obs_views[key][first_env_idx + env_idx] = value
+        return None
+
     while True:
         try:
             cmd, data = remote.recv()
             if cmd == 'step':
-                observation, reward, done, info = env.step(data)
-                if done:
-                    observation = env.reset()
-                remote.send((observation, reward, done, info))
+                results = []
+                for env_idx, (env, action) in enumerate(zip(envs, data)):
+                    observation, reward, done, info = env.step(action)
+                    if done:
+                        observation = env.reset()
+                    results.append((_send_obs(env_idx, observation), reward, done, info))
+                remote.send(results)
             elif cmd == 'reset':
-                observation = env.reset()
-                remote.send(observation)
+                remote.send([_send_obs(env_idx, env.reset()) for env_idx, env in enumerate(envs)])
             elif cmd == 'render':
-                remote.send(env.render(mode='rgb_array'))
+                remote.send([env.render(mode='rgb_array') for env in envs])
             elif cmd == 'close':
                 remote.close()
                 break
             elif cmd == 'get_spaces':
-                remote.send((env.observation_space, env.action_space))
+                remote.send((envs[0].observation_space, envs[0].action_space))
             else:
                 raise NotImplementedError
         except EOFError:
@@ -34,43 +65,104 @@ def _worker(remote, parent_remote, env_fn_wrapper):
 
 
 class SubprocVecEnv(VecEnv):
-    def __init__(self, env_fns):
+    def __init__(self, env_fns, shared_memory=False, envs_per_worker=1, start_method=None, observation_space=None,
+                 action_space=None):
         """
         Creates a multiprocess vectorized wrapper for multiple environments
 
         :param env_fns: ([Gym Environment]) Environments to run in subprocesses
+        :param shared_memory: (bool) transport the observations through shared memory: every worker writes its
+            observations in its slot of a preallocated array (one per subspace of a Dict or Tuple observation
+            space), and only the rewards, dones and infos go through the pipes. The observation space is read from
+            an environment built in the main process.
+        :param envs_per_worker: (int) the number of environments run by each subprocess, which steps them in turn
+            and sends their results in one message. Every worker runs a contiguous group of environments, the last
+            one may run fewer.
+        :param start_method: (str) the method used to start the subprocesses: 'fork', 'forkserver' or 'spawn'
+            (default: the platform default). With 'forkserver' and 'spawn', the environment functions and their
+            closures must be importable in the subprocesses.
+        :param observation_space: (Gym Space) the observation space of the environments, e.g. cached from a
+            previous run, to skip building an environment in the main process with `shared_memory`
+        :param action_space: (Gym Space) the action space of the environments, cached along with the observation
+            space
         """
+        start = time.time()
+        context = multiprocessing.get_context(start_method)
         self.waiting = False
         self.closed = False
         n_envs = len(env_fns)
-        self.remotes, self.work_remotes = zip(*[Pipe() for _ in range(n_envs)])
-        self.processes = [Process(target=_worker, args=(work_remote, remote, CloudpickleWrapper(env_fn)))
-                          for (work_remote, remote, env_fn) in zip(self.work_remotes, self.remotes, env_fns)]
+        assert envs_per_worker >= 1
+        # the environments [first, stop) of each worker
+        self.worker_slices = [slice(first, min(first + envs_per_worker, n_envs))
+                              for first in range(0, n_envs, envs_per_worker)]
+        n_workers = len(self.worker_slices)
+        self.shared_obs = None
+        if shared_memory:
+            if observation_space is None or action_space is None:
+                dummy_env = env_fns[0]()
+                observation_space, action_space = dummy_env.observation_space, dummy_env.action_space
+                dummy_env.close()
+                del dummy_env
+            keys, shapes, dtypes = obs_space_info(observation_space)
+            self.shared_obs = {}
+            for key in keys:
+                n_bytes = n_envs * int(np.prod(shapes[key])) * np.dtype(dtypes[key]).itemsize
+                self.shared_obs[key] = (context.RawArray('b', n_bytes), shapes[key], np.dtype(dtypes[key]))
+            self.obs_views = _shared_obs_views(self.shared_obs, n_envs)
+        self.remotes, self.work_remotes = zip(*[context.Pipe() for _ in range(n_workers)])
+        self.processes = [context.Process(target=_worker,
+                                          args=(work_remote, remote, CloudpickleWrapper(env_fns[env_slice]),
+                                                self.shared_obs, n_envs, env_slice.start))
+                          for (work_remote, remote, env_slice)
+                          in zip(self.work_remotes, self.remotes, self.worker_slices)]
         for process in self.processes:
             process.daemon = True  # if the main process crashes, we should not cause things to hang
             process.start()
         for remote in self.work_remotes:
             remote.close()
+        start_time = time.time() - start
 
-        self.remotes[0].send(('get_spaces', None))
-        observation_space, action_space = self.remotes[0].recv()
+        # the workers build their environments concurrently
+        build_times = []
+        for remote in self.remotes:
+            worker_observation_space, worker_action_space, build_time = remote.recv()
+            build_times.append(build_time)
+        if observation_space is None or action_space is None:
+            observation_space, action_space = worker_observation_space, worker_action_space
         VecEnv.__init__(self, len(env_fns), observation_space, action_space)
+        self.keys, _, _ = obs_space_info(observation_space)
+        self.startup_time = time.time() - start
+        logger.log("{}: {} environments ready in {:.2f}s, {} workers started in {:.2f}s ({}), slowest worker built "
+                   "its environments in {:.2f}s".format(type(self).__name__, n_envs, self.startup_time, n_workers,
+                                                         start_time, context.get_start_method(), max(build_times)))
 
     def step_async(self, actions):
-        for remote, action in zip(self.remotes, actions):
-            remote.send(('step', action))
+        for remote, env_slice in zip(self.remotes, self.worker_slices):
+            remote.send(('step', actions[env_slice]))
         self.waiting = True
 
     def step_wait(self):
-        results = [remote.recv() for remote in self.remotes]
+        results = [result for remote in self.remotes for result in remote.recv()]
         self.waiting = False
         obs, rews, dones, infos = zip(*results)
-        return np.stack(obs), np.stack(rews), np.stack(dones), infos
+        return self._stack_obs(obs), np.stack(rews), np.stack(dones), infos
 
     def reset(self):
         for remote in self.remotes:
             remote.send(('reset', None))
-        return np.stack([remote.recv() for remote in self.remotes])
+        return self._stack_obs([obs for remote in self.remotes for obs in remote.recv()])
+
+    def _stack_obs(self, obs):
+        """
+        Stack the observations received from the workers, or copy them from shared memory once they are written
+
+        :param obs: ([numpy Any, dict or tuple]) the observations received, None for each observation written in
+            shared memory
+        :return: (numpy Any, dict or tuple) the stacked observations
+        """
+        if self.shared_obs is None:
+            return stack_obs(obs, self.keys)
+        return dict_to_obs({key: view.copy() for key, view in self.obs_views.items()})
 
     def close(self):
         if self.closed:
@@ -87,7 +179,7 @@ class SubprocVecEnv(VecEnv):
     def render(self, mode='human'):
         for pipe in self.remotes:
             pipe.send(('render', None))
-        imgs = [pipe.recv() for pipe in self.remotes]
+        imgs = [img for pipe in self.remotes for img in pipe.recv()]
         bigimg = tile_images(imgs)
         if mode == 'human':
             import cv2
@@ -0,0 +1,67 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from baselines.common.vec_env.dummy_vec_env import DummyVecEnv
+
+
+class ThreadVecEnv(DummyVecEnv):
+    def __init__(self, env_fns, n_threads=None):
+        """
+        Creates a vectorized wrapper stepping the environments on a pool of threads of the main process. The
+        environments write their results in the preallocated buffers of DummyVecEnv, without any serialization.
+
+        It runs the environments in parallel only as far as they release the GIL while simulating, as the emulators
+        of ALE or MuJoCo do. The steps of pure Python environments are serialized by the GIL.
+
+        :param env_fns: ([Gym Environment]) the list of environments to vectorize, built concurrently on the threads
+        :param n_threads: (int) the number of threads, each stepping a contiguous group of environments in turn
+            (default: the number of environments, up to the number of CPUs)
+        """
+        n_envs = len(env_fns)
+        if n_threads is None:
+            n_threads = min(n_envs, os.cpu_count() or 1)
+        n_threads = min(n_threads, n_envs)
+        assert n_threads >= 1
+        # the environments [start, stop) of each thread
+        self.thread_ranges = [range(n_envs * thread // n_threads, n_envs * (thread + 1) // n_threads)
+                              for thread in range(n_threads)]
+        self.pool = ThreadPoolExecutor(max_workers=n_threads)
+        self.closed = False
+        DummyVecEnv.__init__(self, env_fns)
+
+    def _make_envs(self, env_fns):
+        # the environments are built concurrently, each group on a thread of the pool
+        return [env for group in self.pool.map(lambda env_idxs: [env_fns[env_idx]() for env_idx in env_idxs],
+                                               self.thread_ranges)
+                for env in group]
+
+    def step_wait(self):
+        self._run_threads(self._step_env)
+        return (self._obs_from_buf(), np.copy(self.buf_rews), np.copy(self.buf_dones),
+                self.buf_infos.copy())
+
+    def reset(self):
+        self._run_threads(self._reset_env)
+        return self._obs_from_buf()
+
+    def _run_threads(self, func):
+        """
+        Call a function on every environment, each group of environments in its thread, and wait for them
+
+        :param func: (function (int)) the function, called with the index of an environment
+        """
+        def _run_group(env_idxs):
+            for env_idx in env_idxs:
+                func(env_idx)
+
+        # consuming the results raises the exceptions of the threads
+        for _ in self.pool.map(_run_group, self.thread_ranges):
+            pass
+
+    def close(self):
+        if self.closed:
+            return
+        self.pool.shutdown()
+        self.closed = True
@@ -0,0 +1,70 @@
+"""Helpers for the observations of vectorized environments, that may be arrays, dictionaries or tuples of arrays."""
+from collections import OrderedDict
+
+import numpy as np
+from gym import spaces
+
+
+def obs_space_info(obs_space):
+    """
+    Get the keys, shapes and dtypes of the arrays of an observation space: the subspaces of a Dict space, the ones
+    of a Tuple space under their index, or the space itself under the key None
+
+    :param obs_space: (Gym Space) the observation space
+    :return: ([str or int], {str or int: tuple}, {str or int: numpy dtype}) the keys, and the shape and dtype of
+        every key
+    """
+    if isinstance(obs_space, spaces.Dict):
+        assert isinstance(obs_space.spaces, OrderedDict)
+        subspaces = obs_space.spaces
+    elif isinstance(obs_space, spaces.Tuple):
+        subspaces = OrderedDict(enumerate(obs_space.spaces))
+    else:
+        subspaces = {None: obs_space}
+    keys, shapes, dtypes = [], {}, {}
+    for key, box in subspaces.items():
+        keys.append(key)
+        shapes[key] = box.shape
+        dtypes[key] = box.dtype
+    return keys, shapes, dtypes
+
+
+def obs_to_dict(obs):
+    """
+    Convert an observation to a dictionary of arrays, keyed as in `obs_space_info`
+
+    :param obs: (numpy Any, dict or tuple) the observation
+    :return: (dict) the arrays of the observation
+    """
+    if isinstance(obs, dict):
+        return obs
+    if isinstance(obs, tuple):
+        return OrderedDict(enumerate(obs))
+    return {None: obs}
+
+
+def dict_to_obs(obs_dict):
+    """
+    Convert a dictionary of arrays keyed as in `obs_space_info` back to an observation
+
+    :param obs_dict: (dict) the arrays of the observation
+    :return: (numpy Any, dict or tuple) the observation
+    """
+    if set(obs_dict.keys()) == {None}:
+        return obs_dict[None]
+    # the keys of a Tuple space are the indexes of its subspaces, the ones of a Dict space are strings
+    if all(isinstance(key, int) for key in obs_dict):
+        return tuple(obs_dict[idx] for idx in range(len(obs_dict)))
+    return obs_dict
+
+
+def stack_obs(obs, keys):
+    """
+    Stack the observations of environments, key by key
+
+    :param obs: ([numpy Any, dict or tuple]) the observation of every environment
+    :param keys: ([str or int]) the keys of the observations, as returned by `obs_space_info`
+    :return: (numpy Any, dict or tuple) the stacked observations
+    """
+    obs = [obs_to_dict(env_obs) for env_obs in obs]
+    return dict_to_obs(OrderedDict((key, np.stack([env_obs[key] for env_obs in obs])) for key in keys))
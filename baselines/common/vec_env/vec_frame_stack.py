@@ -4,11 +4,77 @@ from gym import spaces
 from baselines.common.vec_env import VecEnvWrapper
 
 
+class StackedFrames(object):
+    def __init__(self, n_envs, frame_shape, n_stack, dtype):
+        """
+        The last frames of vectorized environments, stacked along their last (channel) axis, oldest first.
+
+        The frames are kept in a circular buffer per environment, whose head is the slot of the newest frame: a new
+        frame is written once, and the stacked frames are copied from the buffer into a reused array, in order.
+
+        :param n_envs: (int) the number of environments
+        :param frame_shape: (tuple) the shape of a frame, channels last
+        :param n_stack: (int) the number of frames stacked
+        :param dtype: (numpy dtype) the dtype of the frames
+        """
+        self.n_stack = n_stack
+        self.dtype = np.dtype(dtype)
+        pixels_shape, n_channels = tuple(frame_shape[:-1]), frame_shape[-1]
+        self.frames = np.zeros((n_envs,) + pixels_shape + (n_stack, n_channels), dtype=self.dtype)
+        self.heads = np.zeros((n_envs,), dtype=np.int64)
+        self.stacked = np.zeros((n_envs,) + pixels_shape + (n_stack * n_channels,), dtype=self.dtype)
+        # the channels of a pixel are copied as one item, as numpy copies items along an axis of a few bytes several
+        # times slower (an unsigned integer when the size allows it, copied faster than raw bytes)
+        pixel_size = n_channels * self.dtype.itemsize
+        if pixel_size in (1, 2, 4, 8):
+            self._pixel_dtype = np.dtype('u{}'.format(pixel_size))
+        else:
+            self._pixel_dtype = np.dtype((np.void, pixel_size))
+        self._frame_pixels = self.frames.view(self._pixel_dtype)[..., 0]
+        self._stacked_pixels = self.stacked.view(self._pixel_dtype)
+
+    def reset(self, frames, env_slice=slice(None)):
+        """
+        Start the stacks of environments with their first frames, the older ones being zeros
+
+        :param frames: (numpy Any) the first frames of the environments of `env_slice`
+        :param env_slice: (slice) the environments reset
+        :return: (numpy Any) the stacked frames of all the environments, overwritten by the next calls
+        """
+        self.frames[env_slice] = 0
+        return self.push(frames, env_slice=env_slice)
+
+    def push(self, frames, dones=None, env_slice=slice(None)):
+        """
+        Add the newest frames of environments, the stacks of the environments done being emptied first
+
+        :param frames: (numpy Any) the new frames of the environments of `env_slice`
+        :param dones: ([bool]) whether the environments of `env_slice` are done
+        :param env_slice: (slice) the environments stepped
+        :return: (numpy Any) the stacked frames of all the environments, overwritten by the next calls
+        """
+        if dones is not None:
+            self.frames[env_slice][np.asarray(dones, dtype=np.bool_)] = 0
+        frames = np.ascontiguousarray(frames, dtype=self.dtype).view(self._pixel_dtype)[..., 0]
+        # views on the environments of the slice
+        buffer, stacked, heads = self._frame_pixels[env_slice], self._stacked_pixels[env_slice], self.heads[env_slice]
+        heads += 1
+        heads %= self.n_stack
+        # the environments stepped together share their head, otherwise they are handled in groups
+        unique_heads = np.unique(heads)
+        for head in unique_heads.tolist():
+            envs = slice(None) if len(unique_heads) == 1 else heads == head
+            buffer[envs, ..., head] = frames[envs]
+            for idx in range(self.n_stack):
+                stacked[envs, ..., idx] = buffer[envs, ..., (head + 1 + idx) % self.n_stack]
+        return self.stacked
+
+
 class VecFrameStack(VecEnvWrapper):
     def __init__(self, venv, n_stack):
         """
         Vectorized environment base class
-        
+
         :param venv: ([Gym Environment]) the list of environments to vectorize and normalize
         :param n_stack:
         """
@@ -17,27 +83,26 @@ class VecFrameStack(VecEnvWrapper):
         wrapped_obs_space = venv.observation_space
         low = np.repeat(wrapped_obs_space.low, self.n_stack, axis=-1)
         high = np.repeat(wrapped_obs_space.high, self.n_stack, axis=-1)
-        self.stackedobs = np.zeros((venv.num_envs,) + low.shape, low.dtype)
+        self.stacked_frames = StackedFrames(venv.num_envs, wrapped_obs_space.shape, n_stack, low.dtype)
         observation_space = spaces.Box(low=low, high=high, dtype=venv.observation_space.dtype)
         VecEnvWrapper.__init__(self, venv, observation_space=observation_space)
 
+    @property
+    def stackedobs(self):
+        """
+        The stacked observations, reused by every step: copy them to keep them
+        """
+        return self.stacked_frames.stacked
+
     def step_wait(self):
         observations, rewards, dones, infos = self.venv.step_wait()
-        self.stackedobs = np.roll(self.stackedobs, shift=-observations.shape[-1], axis=-1)
-        for i, done in enumerate(dones):
-            if done:
-                self.stackedobs[i] = 0
-        self.stackedobs[..., -observations.shape[-1]:] = observations
-        return self.stackedobs, rewards, dones, infos
+        return self.stacked_frames.push(observations, dones), rewards, dones, infos
 
     def reset(self):
         """
         Reset all environments
         """
-        obs = self.venv.reset()
-        self.stackedobs[...] = 0
-        self.stackedobs[..., -obs.shape[-1]:] = obs
-        return self.stackedobs
+        return self.stacked_frames.reset(self.venv.reset())
 
     def close(self):
         self.venv.close()
@@ -0,0 +1,83 @@
+import csv
+import json
+import time
+
+import numpy as np
+
+from baselines.bench.monitor import monitor_file_name
+from baselines.common.vec_env import VecEnvWrapper
+
+
+class VecMonitor(VecEnvWrapper):
+    def __init__(self, venv, filename=None, info_keywords=(), env_id=None, flush_interval=10.):
+        """
+        A monitor wrapper for vectorized environments, the counterpart of bench.Monitor for all the environments at
+        once: the episode returns and lengths are tracked in arrays, and the episodes of every environment are
+        written in a single monitor file, readable by bench.load_results.
+
+        The rows are buffered and written to the file every `flush_interval` seconds, and when closing the wrapper.
+
+        :param venv: (VecEnv) the vectorized environment
+        :param filename: (str) the location to save a log file, can be None for no log
+        :param info_keywords: (tuple) extra information to log, from the information return of environment.step
+        :param env_id: (str) the environment ID, written in the header of the log file
+        :param flush_interval: (float) the time in seconds between writes of the log file
+        """
+        VecEnvWrapper.__init__(self, venv)
+        self.t_start = time.time()
+        self.info_keywords = info_keywords
+        self.flush_interval = flush_interval
+        self.episode_returns = np.zeros((self.num_envs,), dtype=np.float64)
+        self.episode_lengths = np.zeros((self.num_envs,), dtype=np.int64)
+        self.episode_count = 0
+        self.total_steps = 0
+        if filename is None:
+            self.file_handler = None
+            self.logger = None
+        else:
+            self.file_handler = open(monitor_file_name(filename), "wt")
+            self.file_handler.write('#%s\n' % json.dumps({"t_start": self.t_start, 'env_id': env_id}))
+            self.logger = csv.DictWriter(self.file_handler, fieldnames=('r', 'l', 't') + info_keywords)
+            self.logger.writeheader()
+            self.file_handler.flush()
+        self._last_flush = self.t_start
+
+    def reset(self):
+        self.episode_returns[:] = 0
+        self.episode_lengths[:] = 0
+        return self.venv.reset()
+
+    def step_wait(self):
+        obs, rewards, dones, infos = self.venv.step_wait()
+        self.episode_returns += rewards
+        self.episode_lengths += 1
+        self.total_steps += self.num_envs
+        done_envs = np.flatnonzero(dones)
+        if len(done_envs) > 0:
+            now = time.time()
+            episode_time = round(now - self.t_start, 6)
+            # the information dicts are replaced, not updated: they can be shared between the environments
+            infos = list(infos)
+            for env_idx, episode_return, episode_length in zip(done_envs.tolist(),
+                                                               self.episode_returns[done_envs].tolist(),
+                                                               self.episode_lengths[done_envs].tolist()):
+                ep_info = {"r": round(episode_return, 6), "l": episode_length, "t": episode_time}
+                for key in self.info_keywords:
+                    ep_info[key] = infos[env_idx][key]
+                infos[env_idx] = dict(infos[env_idx], episode=ep_info)
+                if self.logger:
+                    self.logger.writerow(ep_info)
+            self.episode_count += len(done_envs)
+            self.episode_returns[done_envs] = 0
+            self.episode_lengths[done_envs] = 0
+            if self.file_handler is not None and now - self._last_flush >= self.flush_interval:
+                self.file_handler.flush()
+                self._last_flush = now
+        return obs, rewards, dones, infos
+
+    def close(self):
+        if self.file_handler is not None:
+            self.file_handler.close()
+            self.file_handler = None
+            self.logger = None
+        return self.venv.close()
@@ -1,3 +1,6 @@
+import os
+import pickle
+
 import numpy as np
 
 from baselines.common.vec_env import VecEnvWrapper
@@ -6,10 +9,13 @@ from baselines.common.running_mean_std import RunningMeanStd
 
 class VecNormalize(VecEnvWrapper):
     def __init__(self, venv, norm_obs=True, norm_reward=True,
-                 clip_obs=10., clip_reward=10., gamma=0.99, epsilon=1e-8):
+                 clip_obs=10., clip_reward=10., gamma=0.99, epsilon=1e-8, training=True, comm=None):
         """
         A rolling average, normalizing, vectorized wrapepr for environment base class
-        
+
+        The observations are normalized in float32, into an array reused by every step: copy them to keep them.
+        Every step must return the results of all the environments, which excludes AsyncSubprocVecEnv.
+
         :param venv: ([Gym Environment]) the list of environments to vectorize and normalize
         :param norm_obs: (bool) normalize observation
         :param norm_reward: (bool) normalize reward with discounting (r = sum(r_old) * gamma + r_new)
@@ -17,6 +23,10 @@ class VecNormalize(VecEnvWrapper):
         :param clip_reward: (float) clipping value for nomalizing reward
         :param gamma: (float) discount factor
         :param epsilon: (float) epsilon value to avoid arithmetic issues
+        :param training: (bool) update the running averages with every step, they are left as they are (e.g. loaded
+            with `load_running_average`) otherwise
+        :param comm: (MPI Communicators) the communicator of the ranks to average the observations and returns over,
+            each rank with its own VecNormalize, None for no MPI. Every step and reset is then a collective call.
         """
         VecEnvWrapper.__init__(self, venv)
         self.ob_rms = RunningMeanStd(shape=self.observation_space.shape) if norm_obs else None
@@ -26,25 +36,66 @@ class VecNormalize(VecEnvWrapper):
         self.ret = np.zeros(self.num_envs)
         self.gamma = gamma
         self.epsilon = epsilon
+        self.training = training
+        self.comm = comm
+        self._obs_buffer = np.zeros((self.num_envs,) + self.observation_space.shape, dtype=np.float32)
+        # the float32 mean and inverse std of the observations, and the inverse std of the returns, computed from the
+        # running averages when first needed after they are updated
+        self._ob_scale = None
+        self._ret_scale = None
 
     def step_wait(self):
         obs, rewards, dones, infos = self.venv.step_wait()
+        assert len(rewards) == self.num_envs, "VecNormalize needs the results of all the environments at every step"
         self.ret = self.ret * self.gamma + rewards
         obs = self._obfilt(obs)
         if self.ret_rms:
-            self.ret_rms.update(self.ret)
-            rewards = np.clip(rewards / np.sqrt(self.ret_rms.var + self.epsilon), -self.clip_reward, self.clip_reward)
+            if self.training:
+                self.ret_rms.update(self.ret, comm=self.comm)
+                self._ret_scale = None
+            if self._ret_scale is None:
+                self._ret_scale = 1. / np.sqrt(self.ret_rms.var + self.epsilon)
+            rewards = np.clip(rewards * self._ret_scale, -self.clip_reward, self.clip_reward)
         return obs, rewards, dones, infos
 
     def _obfilt(self, obs):
         if self.ob_rms:
-            self.ob_rms.update(obs)
-            obs = np.clip((obs - self.ob_rms.mean) / np.sqrt(self.ob_rms.var + self.epsilon),
-                          -self.clip_obs, self.clip_obs)
-            return obs
+            if self.training:
+                self.ob_rms.update(obs, comm=self.comm)
+                self._ob_scale = None
+            if self._ob_scale is None:
+                self._ob_scale = (self.ob_rms.mean.astype(np.float32),
+                                  (1. / np.sqrt(self.ob_rms.var + self.epsilon)).astype(np.float32))
+            mean, inv_std = self._ob_scale
+            np.subtract(obs, mean, out=self._obs_buffer)
+            np.multiply(self._obs_buffer, inv_std, out=self._obs_buffer)
+            np.clip(self._obs_buffer, -self.clip_obs, self.clip_obs, out=self._obs_buffer)
+            return self._obs_buffer
         else:
             return obs
 
     def reset(self):
         obs = self.venv.reset()
         return self._obfilt(obs)
+
+    def save_running_average(self, path):
+        """
+        Save the running averages of the observations and returns, to normalize the same way in another process
+
+        :param path: (str) the folder to save them in, as ob_rms.pkl and ret_rms.pkl
+        """
+        for rms, name in zip([self.ob_rms, self.ret_rms], ['ob_rms', 'ret_rms']):
+            with open(os.path.join(path, '{}.pkl'.format(name)), 'wb') as file_handler:
+                pickle.dump(rms, file_handler)
+
+    def load_running_average(self, path):
+        """
+        Load the running averages saved by `save_running_average`
+
+        :param path: (str) the folder they are saved in
+        """
+        for name in ['ob_rms', 'ret_rms']:
+            with open(os.path.join(path, '{}.pkl'.format(name)), 'rb') as file_handler:
+                setattr(self, name, pickle.load(file_handler))
+        self._ob_scale = None
+        self._ret_scale = None
@@ -8,6 +8,7 @@ from mpi4py import MPI
 
 from baselines import logger
 from baselines.common.mpi_adam import MpiAdam
+from baselines.common.prefetch import BatchPrefetcher
 import baselines.common.tf_util as tf_util
 from baselines.common.mpi_running_mean_std import RunningMeanStd
 
@@ -115,7 +116,7 @@ class DDPG(object):
     def __init__(self, actor, critic, memory, observation_shape, action_shape, param_noise=None, action_noise=None,
                  gamma=0.99, tau=0.001, normalize_returns=False, enable_popart=False, normalize_observations=True,
                  batch_size=128, observation_range=(-5., 5.), action_range=(-1., 1.), return_range=(-np.inf, np.inf),
-                 critic_l2_reg=0., actor_lr=1e-4, critic_lr=1e-3, clip_norm=None, reward_scale=1.):
+                 critic_l2_reg=0., actor_lr=1e-4, critic_lr=1e-3, clip_norm=None, reward_scale=1., prefetch=False):
         """
         Deep Deterministic Policy Gradien (DDPG) model
 
@@ -143,6 +144,8 @@ class DDPG(object):
         :param critic_lr: (float) the critic learning rate
         :param clip_norm: (float) clip the gradients (disabled if None)
         :param reward_scale: (float) the value the reward should be scaled by
+        :param prefetch: (bool) sample the training batches in a background thread (see `BatchPrefetcher`), so that
+            sampling overlaps with the updates of the model
         """
         # Inputs.
         self.obs0 = tf.placeholder(tf.float32, shape=(None,) + observation_shape, name='obs0')
@@ -180,6 +183,10 @@ class DDPG(object):
         self.critic_grads = None
         self.critic_optimizer = None
         self.sess = None
+        self.prefetcher = None
+        if prefetch:
+            self.prefetcher = BatchPrefetcher(lambda: self.memory.sample(batch_size=self.batch_size),
+                                              self._prepare_batch)
 
         # Observation normalization.
         if self.normalize_observations:
@@ -402,24 +409,53 @@ class DDPG(object):
         :param terminal1: (bool) is the episode done
         """
         reward *= self.reward_scale
-        self.memory.append(obs0, action, reward, obs1, terminal1)
+        if self.prefetcher is not None:
+            with self.prefetcher.lock:
+                self.memory.append(obs0, action, reward, obs1, terminal1)
+        else:
+            self.memory.append(obs0, action, reward, obs1, terminal1)
         if self.normalize_observations:
             self.obs_rms.update(np.array([obs0]))
 
+    def _sample_batch(self):
+        """
+        sample a batch from the replay buffer, holding the lock of the prefetcher if any
+
+        :return: (dict) the sampled batch
+        """
+        if self.prefetcher is None:
+            return self.memory.sample(batch_size=self.batch_size)
+        with self.prefetcher.lock:
+            return self.memory.sample(batch_size=self.batch_size)
+
+    @staticmethod
+    def _prepare_batch(batch):
+        """
+        convert a sampled batch to the types fed to the model
+
+        :param batch: (dict) the sampled batch
+        :return: (dict) the batch to train on
+        """
+        batch['terminals1'] = batch['terminals1'].astype('float32')
+        return batch
+
     def train(self):
         """
         run a step of training from batch
         :return: (float, float) critic loss, actor loss
         """
         # Get a batch.
-        batch = self.memory.sample(batch_size=self.batch_size)
+        if self.prefetcher is not None:
+            batch = self.prefetcher.get()
+        else:
+            batch = self._prepare_batch(self.memory.sample(batch_size=self.batch_size))
 
         if self.normalize_returns and self.enable_popart:
             old_mean, old_std, target_q = self.sess.run([self.ret_rms.mean, self.ret_rms.std, self.target_q],
                                                         feed_dict={
                                                             self.obs1: batch['obs1'],
                                                             self.rewards: batch['rewards'],
-                                                            self.terminals1: batch['terminals1'].astype('float32'),
+                                                            self.terminals1: batch['terminals1'],
                                                         })
             self.ret_rms.update(target_q.flatten())
             self.sess.run(self.renormalize_q_outputs_op, feed_dict={
@@ -431,7 +467,7 @@ class DDPG(object):
             target_q = self.sess.run(self.target_q, feed_dict={
                 self.obs1: batch['obs1'],
                 self.rewards: batch['rewards'],
-                self.terminals1: batch['terminals1'].astype('float32'),
+                self.terminals1: batch['terminals1'],
             })
 
         # Get all gradients and perform a synced update.
@@ -473,7 +509,7 @@ class DDPG(object):
         if self.stats_sample is None:
             # Get a sample and keep that fixed for all further computations.
             # This allows us to estimate the change in value for the same set of inputs.
-            self.stats_sample = self.memory.sample(batch_size=self.batch_size)
+            self.stats_sample = self._sample_batch()
         values = self.sess.run(self.stats_ops, feed_dict={
             self.obs0: self.stats_sample['obs0'],
             self.actions: self.stats_sample['actions'],
@@ -498,7 +534,7 @@ class DDPG(object):
             return 0.
 
         # Perturb a separate copy of the policy to adjust the scale for the next "real" perturbation.
-        batch = self.memory.sample(batch_size=self.batch_size)
+        batch = self._sample_batch()
         self.sess.run(self.perturb_adaptive_policy_ops, feed_dict={
             self.param_noise_stddev: self.param_noise.current_stddev,
         })
@@ -521,3 +557,10 @@ class DDPG(object):
             self.sess.run(self.perturb_policy_ops, feed_dict={
                 self.param_noise_stddev: self.param_noise.current_stddev,
             })
+
+    def close(self):
+        """
+        Stop the background sampling of the training batches, if any
+        """
+        if self.prefetcher is not None:
+            self.prefetcher.close()
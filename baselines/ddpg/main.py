@@ -11,11 +11,12 @@ from baselines import logger, bench
 from baselines.common.misc_util import set_global_seeds, boolean_flag
 import baselines.ddpg.training as training
 from baselines.ddpg.models import Actor, Critic
-from baselines.ddpg.memory import Memory
+from baselines.ddpg.memory import Memory, CompactMemory
 from baselines.ddpg.noise import AdaptiveParamNoiseSpec, OrnsteinUhlenbeckActionNoise, NormalActionNoise
 
 
-def run(env_id, seed, noise_type, layer_norm, evaluation, **kwargs):
+def run(env_id, seed, noise_type, layer_norm, evaluation, memory_dir=None, compact_memory=False,
+        memory_observation_dtype='float32', **kwargs):
     """
     run the training of DDPG
 
@@ -25,6 +26,10 @@ def run(env_id, seed, noise_type, layer_norm, evaluation, **kwargs):
         seperating them with commas
     :param layer_norm: (bool) use layer normalization
     :param evaluation: (bool) enable evaluation of DDPG training
+    :param memory_dir: (str) if not None, keep the replay buffer of each MPI worker in memory-mapped files under this
+        directory, reopening the ones already there
+    :param compact_memory: (bool) use a `CompactMemory`, that stores each observation once
+    :param memory_observation_dtype: (str) the type the replay buffer stores the observations in
     :param kwargs: (dict) extra keywords for the training.train function
     """
 
@@ -66,7 +71,11 @@ def run(env_id, seed, noise_type, layer_norm, evaluation, **kwargs):
             raise RuntimeError('unknown noise type "{}"'.format(current_noise_type))
 
     # Configure components.
-    memory = Memory(limit=int(1e6), action_shape=env.action_space.shape, observation_shape=env.observation_space.shape)
+    memory_class = CompactMemory if compact_memory else Memory
+    memory = memory_class(limit=int(1e6), action_shape=env.action_space.shape,
+                          observation_shape=env.observation_space.shape,
+                          path=memory_dir and os.path.join(memory_dir, str(rank)),
+                          observation_dtype=memory_observation_dtype)
     critic = Critic(layer_norm=layer_norm)
     actor = Actor(nb_actions, layer_norm=layer_norm)
 
@@ -123,6 +132,10 @@ def parse_args():
     parser.add_argument('--noise-type', type=str, default='adaptive-param_0.2')
     parser.add_argument('--num-timesteps', type=int, default=None)
     boolean_flag(parser, 'evaluation', default=False)
+    parser.add_argument('--memory-dir', type=str, default=None)  # keep the replay buffer in memory-mapped files
+    boolean_flag(parser, 'compact-memory', default=False)  # store each observation once in the replay buffer
+    parser.add_argument('--memory-observation-dtype', type=str, default='float32', choices=['float32', 'float16'])
+    boolean_flag(parser, 'prefetch', default=False)  # sample the training batches in a background thread
     args = parser.parse_args()
     # we don't directly specify timesteps for this script, so make sure that if we do specify them
     # they agree with the other parameters
@@ -1,19 +1,37 @@
+import os
+
 import numpy as np
 
+from baselines.common.memmap_util import open_memmap, save_metadata, load_metadata
+
 
 class RingBuffer(object):
-    def __init__(self, maxlen, shape, dtype='float32'):
+    def __init__(self, maxlen, shape, dtype='float32', path=None):
         """
         A buffer object, when full restarts at the initial position
 
         :param maxlen: (int) the max number of numpy objects to store
         :param shape: (tuple) the shape of the numpy objects you want to store
         :param dtype: (str) the name of the type of the numpy object you want to store
+        :param path: (str) if not None, the data is kept in a memory-mapped `.npy` file at this path, which is reopened
+            if it already exists
         """
         self.maxlen = maxlen
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.path = path
         self.start = 0
         self.length = 0
-        self.data = np.zeros((maxlen,) + shape).astype(dtype)
+        # the data is allocated by the first append, directly in its type
+        self.data = None
+        if path is not None and os.path.exists(path):
+            self._allocate()
+
+    def _allocate(self):
+        if self.path is None:
+            self.data = np.zeros((self.maxlen,) + self.shape, dtype=self.dtype)
+        else:
+            self.data = open_memmap(self.path, (self.maxlen,) + self.shape, self.dtype)
 
     def __len__(self):
         return self.length
@@ -47,8 +65,34 @@ class RingBuffer(object):
         else:
             # This should never happen.
             raise RuntimeError()
+        if self.data is None:
+            self._allocate()
         self.data[(self.start + self.length - 1) % self.maxlen] = var
 
+    def append_batch(self, var):
+        """
+        Append a batch of objects to the buffer, with at most two slice assignments
+
+        :param var: (numpy Any) the objects you wish to add, stacked along the first axis
+        """
+        var = np.asarray(var).reshape((-1,) + self.shape)
+        if self.data is None:
+            self._allocate()
+        if len(var) >= self.maxlen:
+            # only the last ones are kept
+            self.data[:] = var[-self.maxlen:]
+            self.start, self.length = 0, self.maxlen
+            return
+        n_items = len(var)
+        end = (self.start + self.length) % self.maxlen
+        n_before_wrap = min(n_items, self.maxlen - end)
+        self.data[end:end + n_before_wrap] = var[:n_before_wrap]
+        self.data[:n_items - n_before_wrap] = var[n_before_wrap:]
+        overflow = self.length + n_items - self.maxlen
+        if overflow > 0:
+            self.start = (self.start + overflow) % self.maxlen
+        self.length = min(self.length + n_items, self.maxlen)
+
 
 def array_min2d(arr):
     """
@@ -64,21 +108,43 @@ def array_min2d(arr):
 
 
 class Memory(object):
-    def __init__(self, limit, action_shape, observation_shape):
+    _buffer_names = ('observations0', 'actions', 'rewards', 'terminals1', 'observations1')
+
+    def __init__(self, limit, action_shape, observation_shape, path=None, sync_freq=1000, observation_dtype='float32'):
         """
         The replay buffer object
 
         :param limit: (int) the max number of transitions to store
         :param action_shape: (tuple) the action shape
         :param observation_shape: (tuple) the observation shape
+        :param path: (str) if not None, the buffers are kept in memory-mapped files under this directory, so that the
+            memory can outgrow the RAM; their positions are kept in a metadata sidecar, and a memory created on a
+            directory that already holds one reopens it
+        :param sync_freq: (int) with a `path`, write the metadata every `sync_freq` transitions, None to only write
+            it on `flush()`
+        :param observation_dtype: (str) the type the observations are stored in, 'float16' halves their memory
         """
         self.limit = limit
+        self.path = path
+        self.sync_freq = sync_freq
+        self._n_unsynced = 0
 
-        self.observations0 = RingBuffer(limit, shape=observation_shape)
-        self.actions = RingBuffer(limit, shape=action_shape)
-        self.rewards = RingBuffer(limit, shape=(1,))
-        self.terminals1 = RingBuffer(limit, shape=(1,))
-        self.observations1 = RingBuffer(limit, shape=observation_shape)
+        def buffer_path(name):
+            return None if path is None else os.path.join(path, name + '.npy')
+
+        self.observations0 = RingBuffer(limit, shape=observation_shape, dtype=observation_dtype,
+                                        path=buffer_path('observations0'))
+        self.actions = RingBuffer(limit, shape=action_shape, path=buffer_path('actions'))
+        self.rewards = RingBuffer(limit, shape=(1,), path=buffer_path('rewards'))
+        self.terminals1 = RingBuffer(limit, shape=(1,), path=buffer_path('terminals1'))
+        self.observations1 = RingBuffer(limit, shape=observation_shape, dtype=observation_dtype,
+                                        path=buffer_path('observations1'))
+
+        if path is not None:
+            metadata, _ = load_metadata(path)
+            if metadata is not None:
+                for name in self._buffer_names:
+                    getattr(self, name).start, getattr(self, name).length = metadata[name]
 
     def sample(self, batch_size):
         """
@@ -124,7 +190,189 @@ class Memory(object):
         self.rewards.append(reward)
         self.observations1.append(obs1)
         self.terminals1.append(terminal1)
+        self._count_unsynced(1)
+
+    def append_batch(self, obs0, action, reward, obs1, terminal1, training=True):
+        """
+        Append a batch of transitions to the buffer, e.g. one per environment of a vectorized environment
+
+        :param obs0: ([[float]] or [[int]]) the last observations
+        :param action: ([[float]]) the actions
+        :param reward: ([float]) the rewards
+        :param obs1: ([[float]] or [[int]]) the current observations
+        :param terminal1: ([bool]) are the episodes done
+        :param training: (bool) is the RL model training or not
+        """
+        if not training:
+            return
+
+        self.observations0.append_batch(obs0)
+        self.actions.append_batch(action)
+        self.rewards.append_batch(reward)
+        self.observations1.append_batch(obs1)
+        self.terminals1.append_batch(terminal1)
+        self._count_unsynced(len(reward))
+
+    def _count_unsynced(self, n_transitions):
+        if self.path is not None:
+            self._n_unsynced += n_transitions
+            if self.sync_freq is not None and self._n_unsynced >= self.sync_freq:
+                self.flush()
+
+    def flush(self):
+        """
+        Write a file-backed memory to disk, with the metadata needed to reopen it
+        """
+        assert self.path is not None, "only a file-backed memory can be flushed"
+        metadata = {'limit': self.limit}
+        for name in self._buffer_names:
+            buffer = getattr(self, name)
+            if buffer.data is not None:
+                buffer.data.flush()
+            metadata[name] = [buffer.start, buffer.length]
+        save_metadata(self.path, metadata)
+        self._n_unsynced = 0
 
     @property
     def nb_entries(self):
         return len(self.observations0)
+
+
+class CompactMemory(object):
+    _array_names = ('observations', 'actions', 'rewards', 'terminals1', 'valid')
+
+    def __init__(self, limit, action_shape, observation_shape, path=None, sync_freq=1000, observation_dtype='float32'):
+        """
+        A replay buffer with the interface of `Memory`, that stores each observation once.
+
+        The observations are written in the order they are experienced, so the next observation of a transition is
+        the one in the following slot. The transition data (action, reward, terminal) is kept in the slot of its first
+        observation, and `valid` marks the slots that start a transition: the last observation of an episode (or of a
+        sequence of transitions that do not follow each other) takes a slot of its own, that is not sampled. A memory
+        of `limit` slots then holds `limit` minus the number of stored episodes transitions, with half the
+        observation memory of `Memory`.
+
+        :param limit: (int) the number of observation slots
+        :param action_shape: (tuple) the action shape
+        :param observation_shape: (tuple) the observation shape
+        :param path: (str) if not None, the arrays are kept in memory-mapped files under this directory, see
+            `Memory.__init__`
+        :param sync_freq: (int) with a `path`, write the metadata every `sync_freq` transitions, None to only write
+            it on `flush()`
+        :param observation_dtype: (str) the type the observations are stored in, 'float16' halves their memory
+        """
+        assert limit >= 2, "the memory needs room for at least one transition"
+        self.limit = limit
+        self.path = path
+        self.sync_freq = sync_freq
+        self._n_unsynced = 0
+
+        def allocate(name, shape, dtype='float32'):
+            if path is None:
+                return np.zeros((limit,) + tuple(shape), dtype=dtype)
+            return open_memmap(os.path.join(path, name + '.npy'), (limit,) + tuple(shape), dtype)
+
+        self.observations = allocate('observations', observation_shape, dtype=observation_dtype)
+        self.actions = allocate('actions', action_shape)
+        self.rewards = allocate('rewards', (1,))
+        self.terminals1 = allocate('terminals1', (1,))
+        self.valid = allocate('valid', (), dtype=np.bool_)
+        # the slot of the next observation to write, the number of slots written, the number of valid transitions
+        # and the slot of the last next observation, which the next transition continues from (None after a terminal)
+        self.next_idx = 0
+        self.n_slots = 0
+        self._nb_entries = 0
+        self.pending = None
+
+        if path is not None:
+            metadata, _ = load_metadata(path)
+            if metadata is not None:
+                self.next_idx, self.n_slots, self._nb_entries, self.pending = \
+                    metadata['next_idx'], metadata['n_slots'], metadata['nb_entries'], metadata['pending']
+
+    def _write_observation(self, obs):
+        """
+        Write an observation in the next slot, dropping the transition that started there
+
+        :param obs: ([float] or [int]) the observation
+        :return: (int) the slot of the observation
+        """
+        idx = self.next_idx
+        if self.valid[idx]:
+            self.valid[idx] = False
+            self._nb_entries -= 1
+        self.observations[idx] = obs
+        self.next_idx = (idx + 1) % self.limit
+        self.n_slots = min(self.n_slots + 1, self.limit)
+        return idx
+
+    def sample(self, batch_size):
+        """
+        sample a random batch from the buffer
+
+        :param batch_size: (int) the number of element to sample for the batch
+        :return: (dict) the sampled batch, with the same keys and shapes as `Memory.sample`
+        """
+        assert self._nb_entries > 0, "cannot sample from an empty memory"
+        batch_idxs = np.random.randint(self.n_slots, size=batch_size)
+        # at most one slot per stored transition is not valid, so this rarely takes more than a few draws
+        invalid = ~self.valid[batch_idxs]
+        while np.any(invalid):
+            batch_idxs[invalid] = np.random.randint(self.n_slots, size=np.count_nonzero(invalid))
+            invalid = ~self.valid[batch_idxs]
+
+        result = {
+            'obs0': array_min2d(self.observations[batch_idxs]),
+            'obs1': array_min2d(self.observations[(batch_idxs + 1) % self.limit]),
+            'rewards': array_min2d(self.rewards[batch_idxs]),
+            'actions': array_min2d(self.actions[batch_idxs]),
+            'terminals1': array_min2d(self.terminals1[batch_idxs]),
+        }
+        return result
+
+    def append(self, obs0, action, reward, obs1, terminal1, training=True):
+        """
+        Append a transition to the buffer
+
+        :param obs0: ([float] or [int]) the last observation
+        :param action: ([float]) the action
+        :param reward: (float] the reward
+        :param obs1: ([float] or [int]) the current observation
+        :param terminal1: (bool) is the episode done
+        :param training: (bool) is the RL model training or not
+        """
+        if not training:
+            return
+
+        if self.pending is None or not np.array_equal(self.observations[self.pending],
+                                                      np.asarray(obs0, dtype=self.observations.dtype)):
+            # the transition does not follow the previous one: it starts a new sequence of observations
+            self.pending = self._write_observation(obs0)
+        idx = self.pending
+        self.actions[idx] = action
+        self.rewards[idx] = reward
+        self.terminals1[idx] = terminal1
+        next_idx = self._write_observation(obs1)
+        self.valid[idx] = True
+        self._nb_entries += 1
+        self.pending = None if terminal1 else next_idx
+
+        if self.path is not None:
+            self._n_unsynced += 1
+            if self.sync_freq is not None and self._n_unsynced >= self.sync_freq:
+                self.flush()
+
+    def flush(self):
+        """
+        Write a file-backed memory to disk, with the metadata needed to reopen it
+        """
+        assert self.path is not None, "only a file-backed memory can be flushed"
+        for name in self._array_names:
+            getattr(self, name).flush()
+        save_metadata(self.path, {'limit': self.limit, 'next_idx': self.next_idx, 'n_slots': self.n_slots,
+                                  'nb_entries': self._nb_entries, 'pending': self.pending})
+        self._n_unsynced = 0
+
+    @property
+    def nb_entries(self):
+        return self._nb_entries
@@ -15,7 +15,7 @@ from baselines import logger
 def train(env, nb_epochs, nb_epoch_cycles, render_eval, reward_scale, render, param_noise, actor, critic,
           normalize_returns, normalize_observations, critic_l2_reg, actor_lr, critic_lr, action_noise,
           popart, gamma, clip_norm, nb_train_steps, nb_rollout_steps, nb_eval_steps, batch_size, memory,
-          tau=0.01, eval_env=None, param_noise_adaption_interval=50):
+          tau=0.01, eval_env=None, param_noise_adaption_interval=50, prefetch=False):
     """
     Runs the training of the Deep Deterministic Policy Gradien (DDPG) model
 
@@ -48,6 +48,7 @@ def train(env, nb_epochs, nb_epoch_cycles, render_eval, reward_scale, render, pa
     :param tau: (float) the soft update coefficient (keep old values, between 0 and 1)
     :param eval_env: (Gym Environment) the evaluation environment (can be None)
     :param param_noise_adaption_interval: (int) apply param noise every N steps
+    :param prefetch: (bool) sample the training batches in a background thread, see DDPG.__init__
     """
     rank = MPI.COMM_WORLD.Get_rank()
 
@@ -58,7 +59,7 @@ def train(env, nb_epochs, nb_epoch_cycles, render_eval, reward_scale, render, pa
                  action_noise=action_noise, gamma=gamma, tau=tau, normalize_returns=normalize_returns,
                  enable_popart=popart, normalize_observations=normalize_observations, batch_size=batch_size,
                  critic_l2_reg=critic_l2_reg, actor_lr=actor_lr, critic_lr=critic_lr, clip_norm=clip_norm,
-                 reward_scale=reward_scale)
+                 reward_scale=reward_scale, prefetch=prefetch)
     logger.info('Using agent with the following configuration:')
     logger.info(str(agent.__dict__.items()))
 
@@ -222,3 +223,5 @@ def train(env, nb_epochs, nb_epoch_cycles, render_eval, reward_scale, render, pa
                 if eval_env and hasattr(eval_env, 'get_state'):
                     with open(os.path.join(logdir, 'eval_env_state.pkl'), 'wb') as file_handler:
                         pickle.dump(eval_env.get_state(), file_handler)
+
+        agent.close()
@@ -20,6 +20,8 @@ def main():
     parser.add_argument('--num-timesteps', type=int, default=int(10e6))
     parser.add_argument('--checkpoint-freq', type=int, default=10000)
     parser.add_argument('--checkpoint-path', type=str, default=None)
+    parser.add_argument('--frame-stack-replay', type=int, default=0,
+                        help='store each frame once in the replay buffer, instead of whole frame stacks')
 
     args = parser.parse_args()
     logger.configure()
@@ -50,6 +52,9 @@ def main():
             prioritized_replay_alpha=args.prioritized_replay_alpha,
             checkpoint_freq=args.checkpoint_freq,
             checkpoint_path=args.checkpoint_path,
+            buffer_storage='frame_stack' if args.frame_stack_replay else 'list',
+            # wrap_atari_dqn scales the frames to [0, 1], store them back as uint8
+            buffer_storage_kwargs={'frame_scale': 255.} if args.frame_stack_replay else None,
         )
 
     env.close()
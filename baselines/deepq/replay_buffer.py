@@ -1,21 +1,38 @@
-import random
+import threading
 
 import numpy as np
 
+from baselines.common.io_util import save_arrays, load_arrays
 from baselines.common.segment_tree import SumSegmentTree, MinSegmentTree
+from baselines.deepq.replay_storage import MemmapStorage, make_storage
 
 
 class ReplayBuffer(object):
-    def __init__(self, size):
+    def __init__(self, size, storage='list', storage_kwargs=None, n_step=1, gamma=1.0):
         """
         Create Replay buffer.
 
         :param size: (int)  Max number of transitions to store in the buffer. When the buffer overflows the old
             memories are dropped.
+        :param storage: (str) how the transitions are stored: 'list' keeps a list of transition tuples, 'array'
+            preallocates one typed numpy array per field on the first `add` and samples with vectorized indexing,
+            'memmap' does the same with files that can be reopened (see `MemmapStorage`), 'frame_stack' stores each
+            frame of stacked-frame observations once (see `FrameStackStorage`)
+        :param storage_kwargs: (dict) extra parameters of the storage
+        :param n_step: (int) sample n-step transitions: the rewards are the discounted returns over up to `n_step`
+            transitions, truncated at the end of the episode, the next observations are the ones to bootstrap from,
+            and `sample` also returns the discounts to apply to the bootstrap values. Requires a columnar storage
+            ('array', 'memmap' or 'frame_stack') and transitions added in the order they were experienced.
+        :param gamma: (float) the discount factor of the n-step returns
         """
-        self._storage = []
+        if storage_kwargs is None:
+            storage_kwargs = {}
+        if n_step > 1 and storage == 'list':
+            raise ValueError("n-step sampling requires a columnar storage ('array', 'memmap' or 'frame_stack')")
+        self._storage = make_storage(storage, size, **storage_kwargs)
         self._maxsize = size
-        self._next_idx = 0
+        self._n_step = n_step
+        self._gamma = gamma
 
     def __len__(self):
         return len(self._storage)
@@ -30,25 +47,63 @@ class ReplayBuffer(object):
         :param obs_tp1: (Any) the current observation
         :param done: (bool) is the episode done
         """
-        data = (obs_t, action, reward, obs_tp1, done)
-
-        if self._next_idx >= len(self._storage):
-            self._storage.append(data)
-        else:
-            self._storage[self._next_idx] = data
-        self._next_idx = (self._next_idx + 1) % self._maxsize
+        self._storage.add((obs_t, action, reward, obs_tp1, done))
 
     def _encode_sample(self, idxes):
-        obses_t, actions, rewards, obses_tp1, dones = [], [], [], [], []
-        for i in idxes:
-            data = self._storage[i]
-            obs_t, action, reward, obs_tp1, done = data
-            obses_t.append(np.array(obs_t, copy=False))
-            actions.append(np.array(action, copy=False))
-            rewards.append(reward)
-            obses_tp1.append(np.array(obs_tp1, copy=False))
-            dones.append(done)
-        return np.array(obses_t), np.array(actions), np.array(rewards), np.array(obses_tp1), np.array(dones)
+        if self._n_step > 1:
+            return self._storage.encode_n_step(idxes, self._n_step, self._gamma)
+        return self._storage.encode(idxes)
+
+    def flush(self):
+        """
+        Write a file-backed buffer (storage='memmap') to disk, with the metadata needed to reopen it
+        """
+        self._check_file_backed()
+        self._storage.flush()
+
+    def _check_file_backed(self):
+        if not isinstance(self._storage, MemmapStorage):
+            raise ValueError("Only a file-backed buffer (storage='memmap') can be flushed, not one with a {}"
+                             .format(type(self._storage).__name__))
+
+    def _get_state(self):
+        metadata, arrays = self._storage.get_state()
+        metadata['storage'] = type(self._storage).__name__
+        return metadata, arrays
+
+    def _set_state(self, metadata, arrays):
+        if metadata['storage'] != type(self._storage).__name__:
+            raise ValueError("Cannot restore a {} into a {}".format(metadata['storage'], type(self._storage).__name__))
+        self._storage.set_state(metadata, arrays)
+
+    def save(self, path, compress=False, background=False):
+        """
+        Save the transitions and the write cursor of the buffer to a chunked binary file (see `io_util.save_arrays`)
+
+        :param path: (str) the path of the file
+        :param compress: (bool or int) compress the chunks with zlib, an int sets the compression level
+        :param background: (bool) write the file in a background thread. The buffer is copied first, so it can keep
+            being used while the file is written.
+        :return: (threading.Thread) the thread writing the file if `background`, else None
+        """
+        metadata, arrays = self._get_state()
+        if not background:
+            save_arrays(path, metadata, arrays, compress=compress)
+            return None
+        arrays = {name: np.array(array) for name, array in arrays.items()}
+        thread = threading.Thread(target=save_arrays, args=(path, metadata, arrays), kwargs={'compress': compress})
+        thread.start()
+        return thread
+
+    def load(self, path):
+        """
+        Restore a buffer saved with `save`, replacing its current content. The buffer must have the same size and
+        storage as the saved one.
+
+        :param path: (str) the path of the file
+        """
+        metadata, arrays = load_arrays(path)
+        self._set_state(metadata, arrays)
 
     def sample(self, batch_size, **_kwargs):
         """
@@ -62,13 +117,15 @@ class ReplayBuffer(object):
             - next_obs_batch: (numpy Any) next set of observations seen after executing act_batch
             - done_mask: (numpy bool) done_mask[i] = 1 if executing act_batch[i] resulted in the end of an episode
                 and 0 otherwise.
+            - discounts: (numpy float) only with n_step > 1, the discount to apply to the value of next_obs_batch
+                (gamma ** number of steps of the return)
         """
-        idxes = [random.randint(0, len(self._storage) - 1) for _ in range(batch_size)]
+        idxes = self._storage.sample_idxes(batch_size)
         return self._encode_sample(idxes)
 
 
 class PrioritizedReplayBuffer(ReplayBuffer):
-    def __init__(self, size, alpha):
+    def __init__(self, size, alpha, storage='list', storage_kwargs=None, n_step=1, gamma=1.0):
         """
         Create Prioritized Replay buffer.
 
@@ -77,8 +134,13 @@ class PrioritizedReplayBuffer(ReplayBuffer):
         :param size: (int) Max number of transitions to store in the buffer. When the buffer overflows the old memories
             are dropped.
         :param alpha: (float) how much prioritization is used (0 - no prioritization, 1 - full prioritization)
+        :param storage: (str) how the transitions are stored, see ReplayBuffer.__init__
+        :param storage_kwargs: (dict) extra parameters of the storage
+        :param n_step: (int) sample n-step transitions, see ReplayBuffer.__init__
+        :param gamma: (float) the discount factor of the n-step returns
         """
-        super(PrioritizedReplayBuffer, self).__init__(size)
+        super(PrioritizedReplayBuffer, self).__init__(size, storage=storage, storage_kwargs=storage_kwargs,
+                                                      n_step=n_step, gamma=gamma)
         assert alpha >= 0
         self._alpha = alpha
 
@@ -86,9 +148,50 @@ class PrioritizedReplayBuffer(ReplayBuffer):
         while it_capacity < size:
             it_capacity *= 2
 
+        self._it_capacity = it_capacity
         self._it_sum = SumSegmentTree(it_capacity)
         self._it_min = MinSegmentTree(it_capacity)
         self._max_priority = 1.0
+        if len(self._storage) > 0:
+            # the storage was reopened from disk
+            self._restore_priorities(self._storage.saved_arrays)
+
+    def _restore_priorities(self, arrays):
+        """
+        Restore the priorities saved with the transitions, the transitions saved without one get the max priority
+
+        :param arrays: ({str: numpy Any}) the saved 'priorities' (tree leaves) and 'max_priority', if any
+        """
+        self._max_priority = float(arrays.get('max_priority', self._max_priority))
+        stored = self._storage.stored_idxes()
+        priorities = arrays.get('priorities', np.zeros(self._maxsize))[stored]
+        priorities = np.where(priorities > 0, priorities, self._max_priority ** self._alpha)
+        self._it_sum[stored] = priorities
+        self._it_min[stored] = priorities
+
+    def flush(self):
+        """
+        Write a file-backed buffer (storage='memmap') to disk, with the priorities and the metadata needed to reopen it
+        """
+        self._check_file_backed()
+        self._storage.flush(arrays={
+            'priorities': self._it_sum[np.arange(self._maxsize)],
+            'max_priority': np.array(self._max_priority),
+        })
+
+    def _get_state(self):
+        metadata, arrays = super(PrioritizedReplayBuffer, self)._get_state()
+        arrays['priorities'] = self._it_sum[np.arange(self._maxsize)]
+        arrays['max_priority'] = np.array(self._max_priority)
+        return metadata, arrays
+
+    def _set_state(self, metadata, arrays):
+        arrays = dict(arrays)
+        priorities = {'priorities': arrays.pop('priorities'), 'max_priority': arrays.pop('max_priority')}
+        super(PrioritizedReplayBuffer, self)._set_state(metadata, arrays)
+        self._it_sum = SumSegmentTree(self._it_capacity)
+        self._it_min = MinSegmentTree(self._it_capacity)
+        self._restore_priorities(priorities)
 
     def add(self, obs_t, action, reward, obs_tp1, done):
         """
@@ -100,19 +203,20 @@ class PrioritizedReplayBuffer(ReplayBuffer):
         :param obs_tp1: (Any) the current observation
         :param done: (bool) is the episode done
         """
-        idx = self._next_idx
-        super().add(obs_t, action, reward, obs_tp1, done)
+        idx = self._storage.add((obs_t, action, reward, obs_tp1, done))
+        invalidated = self._storage.pop_invalidated()
+        if len(invalidated) > 0:
+            self._it_sum[invalidated] = 0.0
+            self._it_min[invalidated] = float('inf')
         self._it_sum[idx] = self._max_priority ** self._alpha
         self._it_min[idx] = self._max_priority ** self._alpha
 
     def _sample_proportional(self, batch_size):
-        res = []
-        for _ in range(batch_size):
-            # TODO(szymon): should we ensure no repeats?
-            mass = random.random() * self._it_sum.sum(0, len(self._storage) - 1)
-            idx = self._it_sum.find_prefixsum_idx(mass)
-            res.append(idx)
-        return res
+        # stratified sampling: split the total priority mass in `batch_size` equal segments, and draw one
+        # prefix sum uniformly in each of them
+        segment = self._it_sum.sum() / batch_size
+        mass = (np.arange(batch_size) + np.random.random(size=batch_size)) * segment
+        return self._it_sum.find_prefixsum_idx(mass)
 
     def sample(self, batch_size, beta=0):
         """
@@ -131,6 +235,7 @@ class PrioritizedReplayBuffer(ReplayBuffer):
             - next_obs_batch: (numpy Any) next set of observations seen after executing act_batch
             - done_mask: (numpy bool) done_mask[i] = 1 if executing act_batch[i] resulted in the end of an episode
                 and 0 otherwise.
+            - discounts: (numpy float) only with n_step > 1, the discount to apply to the value of next_obs_batch
             - weights: (numpy float) Array of shape (batch_size,) and dtype np.float32 denoting importance weight of
                 each sampled transition
             - idxes: (numpy int) Array of shape (batch_size,) and dtype np.int32 idexes in buffer of sampled experiences
@@ -139,15 +244,11 @@ class PrioritizedReplayBuffer(ReplayBuffer):
 
         idxes = self._sample_proportional(batch_size)
 
-        weights = []
-        p_min = self._it_min.min() / self._it_sum.sum()
+        total = self._it_sum.sum()
+        p_min = self._it_min.min() / total
         max_weight = (p_min * len(self._storage)) ** (-beta)
-
-        for idx in idxes:
-            p_sample = self._it_sum[idx] / self._it_sum.sum()
-            weight = (p_sample * len(self._storage)) ** (-beta)
-            weights.append(weight / max_weight)
-        weights = np.array(weights)
+        p_sample = self._it_sum[idxes] / total
+        weights = (p_sample * len(self._storage)) ** (-beta) / max_weight
         encoded_sample = self._encode_sample(idxes)
         return tuple(list(encoded_sample) + [weights, idxes])
 
@@ -162,11 +263,16 @@ class PrioritizedReplayBuffer(ReplayBuffer):
         :param priorities: ([float]) List of updated priorities corresponding to transitions at the sampled idxes
             denoted by variable `idxes`.
         """
+        idxes = np.asarray(idxes)
+        priorities = np.asarray(priorities)
         assert len(idxes) == len(priorities)
-        for idx, priority in zip(idxes, priorities):
-            assert priority > 0
-            assert 0 <= idx < len(self._storage)
-            self._it_sum[idx] = priority ** self._alpha
-            self._it_min[idx] = priority ** self._alpha
+        assert np.all(priorities > 0)
+        assert np.all((0 <= idxes) & (idxes < self._maxsize))
+        # the slots emptied since they were sampled (e.g. by a prefetched batch) must stay out of the sampling
+        sampleable = self._it_sum[idxes] > 0
+        idxes, priorities = idxes[sampleable], priorities[sampleable]
+        self._it_sum[idxes] = priorities ** self._alpha
+        self._it_min[idxes] = priorities ** self._alpha
 
-            self._max_priority = max(self._max_priority, priority)
+        if len(priorities) > 0:
+            self._max_priority = max(self._max_priority, np.max(priorities))
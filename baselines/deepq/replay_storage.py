@@ -0,0 +1,603 @@
+"""Storage backends for the deepq replay buffers.
+
+A storage owns the transitions and the write cursor of a replay buffer. Every backend exposes the same interface:
+
+    - `add(data)` stores a `(obs_t, action, reward, obs_tp1, done)` tuple and returns the slot it was written to
+    - `sample_idxes(batch_size)` draws slots uniformly at random
+    - `encode(idxes)` gathers the transitions at the given slots as a tuple of numpy arrays
+    - `pop_invalidated()` returns the slots that stopped holding a sampleable transition since the last call
+    - `stored_idxes()` returns the slots holding a sampleable transition
+    - `get_state()` / `set_state(metadata, arrays)` export and import the content as metadata and numpy arrays
+    - `len(storage)` is the number of transitions stored
+"""
+import os
+import random
+
+import numpy as np
+
+from baselines.common.memmap_util import open_memmap, save_metadata, load_metadata
+
+
+class ListStorage(object):
+    def __init__(self, size):
+        """
+        Keeps the transitions as a Python list of tuples.
+
+        :param size: (int) Max number of transitions to store. When the storage overflows the old memories are
+            overwritten.
+        """
+        self.maxsize = size
+        self.next_idx = 0
+        self._data = []
+
+    def __len__(self):
+        return len(self._data)
+
+    def add(self, data):
+        """
+        Store a transition at the write cursor
+
+        :param data: ((Any, [float], float, Any, bool)) the transition
+        :return: (int) the slot the transition was written to
+        """
+        idx = self.next_idx
+        if idx >= len(self._data):
+            self._data.append(data)
+        else:
+            self._data[idx] = data
+        self.next_idx = (idx + 1) % self.maxsize
+        return idx
+
+    def sample_idxes(self, batch_size):
+        """
+        Draw slots uniformly at random
+
+        :param batch_size: (int) the number of slots to draw
+        :return: ([int]) the slots
+        """
+        return [random.randint(0, len(self._data) - 1) for _ in range(batch_size)]
+
+    def pop_invalidated(self):
+        """
+        Slots are only ever overwritten by the transition being added, so none is left invalid
+
+        :return: ([int]) an empty list
+        """
+        return []
+
+    def stored_idxes(self):
+        """
+        The slots holding a transition
+
+        :return: (numpy int) the slots
+        """
+        return np.arange(len(self._data))
+
+    def get_state(self):
+        """
+        Export the content of the storage
+
+        :return: ((dict, {str: numpy Any})) the metadata and the arrays of the transition fields
+        """
+        metadata = {'maxsize': self.maxsize, 'next_idx': self.next_idx}
+        arrays = {}
+        if self._data:
+            for field_idx, field in enumerate(self.encode(range(len(self._data)))):
+                arrays['field_{}'.format(field_idx)] = field
+        return metadata, arrays
+
+    def set_state(self, metadata, arrays):
+        """
+        Import a content exported by `get_state`
+
+        :param metadata: (dict) the metadata
+        :param arrays: ({str: numpy Any}) the arrays
+        """
+        _check_maxsize(self, metadata)
+        self.next_idx = metadata['next_idx']
+        fields = [arrays['field_{}'.format(field_idx)] for field_idx in range(len(arrays))]
+        self._data = list(zip(*fields))
+
+    def encode(self, idxes):
+        """
+        Gather the transitions stored at the given slots
+
+        :param idxes: ([int]) the slots
+        :return: ((numpy Any, numpy float, numpy float, numpy Any, numpy bool)) the stacked transition fields
+        """
+        obses_t, actions, rewards, obses_tp1, dones = [], [], [], [], []
+        for i in idxes:
+            obs_t, action, reward, obs_tp1, done = self._data[i]
+            obses_t.append(np.array(obs_t, copy=False))
+            actions.append(np.array(action, copy=False))
+            rewards.append(reward)
+            obses_tp1.append(np.array(obs_tp1, copy=False))
+            dones.append(done)
+        return np.array(obses_t), np.array(actions), np.array(rewards), np.array(obses_tp1), np.array(dones)
+
+
+class ArrayStorage(object):
+    # fields that are scalars per transition (reward, done), stored with at least float precision
+    _scalar_fields = (2, 4)
+
+    def __init__(self, size):
+        """
+        Keeps the transitions column-wise, in one preallocated numpy array per field.
+
+        The arrays are allocated on the first `add`, using the shapes and dtypes of the first transition. Sampling
+        draws all the slots with one call to the random generator and gathers every field with fancy indexing.
+
+        :param size: (int) Max number of transitions to store. When the storage overflows the old memories are
+            overwritten.
+        """
+        self.maxsize = size
+        self.next_idx = 0
+        self._len = 0
+        self._fields = None
+
+    def __len__(self):
+        return self._len
+
+    def _field_dtype(self, field_idx, value):
+        if field_idx in self._scalar_fields:
+            return np.result_type(value, np.float32)
+        return value.dtype
+
+    def _allocate(self, field_idx, shape, dtype):
+        """
+        Allocate the array backing one field
+
+        :param field_idx: (int) the position of the field in the transition tuple
+        :param shape: (tuple) the shape of the array, the first dimension being the number of slots
+        :param dtype: (numpy dtype) the type of the array
+        :return: (numpy Any) the array
+        """
+        return np.empty(shape, dtype=dtype)
+
+    def add(self, data):
+        """
+        Store a transition at the write cursor
+
+        :param data: ((Any, [float], float, Any, bool)) the transition
+        :return: (int) the slot the transition was written to
+        """
+        values = [np.asarray(value) for value in data]
+        if self._fields is None:
+            self._fields = [self._allocate(field_idx, (self.maxsize,) + value.shape,
+                                           self._field_dtype(field_idx, value))
+                            for field_idx, value in enumerate(values)]
+        idx = self.next_idx
+        for field, value in zip(self._fields, values):
+            field[idx] = value
+        self.next_idx = (idx + 1) % self.maxsize
+        self._len = min(self._len + 1, self.maxsize)
+        return idx
+
+    def sample_idxes(self, batch_size):
+        """
+        Draw slots uniformly at random
+
+        :param batch_size: (int) the number of slots to draw
+        :return: (numpy int) the slots
+        """
+        return np.random.randint(0, self._len, size=batch_size)
+
+    def pop_invalidated(self):
+        """
+        Slots are only ever overwritten by the transition being added, so none is left invalid
+
+        :return: ([int]) an empty list
+        """
+        return []
+
+    def stored_idxes(self):
+        """
+        The slots holding a transition
+
+        :return: (numpy int) the slots
+        """
+        return np.arange(self._len)
+
+    def get_state(self):
+        """
+        Export the content of the storage
+
+        :return: ((dict, {str: numpy Any})) the metadata and the stored part of the field arrays
+        """
+        metadata = {'maxsize': self.maxsize, 'next_idx': self.next_idx, 'length': self._len}
+        arrays = {'field_{}'.format(field_idx): field[:self._len] for field_idx, field in enumerate(self._fields or [])}
+        return metadata, arrays
+
+    def set_state(self, metadata, arrays):
+        """
+        Import a content exported by `get_state`
+
+        :param metadata: (dict) the metadata
+        :param arrays: ({str: numpy Any}) the arrays
+        """
+        _check_maxsize(self, metadata)
+        self.next_idx = metadata['next_idx']
+        self._len = metadata['length']
+        self._fields = None
+        if arrays:
+            self._fields = []
+            for field_idx in range(len(arrays)):
+                stored = arrays['field_{}'.format(field_idx)]
+                field = self._allocate(field_idx, (self.maxsize,) + stored.shape[1:], stored.dtype)
+                field[:len(stored)] = stored
+                self._fields.append(field)
+
+    def encode(self, idxes):
+        """
+        Gather the transitions stored at the given slots
+
+        :param idxes: ([int] or numpy int) the slots
+        :return: ((numpy Any, numpy float, numpy float, numpy Any, numpy float)) the transition fields
+        """
+        idxes = np.asarray(idxes)
+        return tuple(field[idxes] for field in self._fields)
+
+    def encode_n_step(self, idxes, n_step, gamma):
+        """
+        Gather the n-step transitions starting at the given slots
+
+        :param idxes: ([int] or numpy int) the slots
+        :param n_step: (int) the maximum number of steps of the returns
+        :param gamma: (float) the discount factor
+        :return: ((numpy Any, numpy float, numpy float, numpy Any, numpy float, numpy float)) the observations, the
+            actions, the discounted n-step returns, the bootstrap observations, the done flags of the last steps and
+            the discounts to apply to the bootstrap values
+        """
+        idxes = np.asarray(idxes)
+        obses_t, actions, rewards, obses_tp1, dones = self._fields
+        n_newer = (self.next_idx - 1 - idxes) % self.maxsize
+        returns, last_idxes, discounts = _n_step_returns(
+            idxes, rewards, dones, n_step, gamma, self.maxsize, lambda step, _: step <= n_newer)
+        return (obses_t[idxes], actions[idxes], returns, obses_tp1[last_idxes], dones[last_idxes],
+                discounts)
+
+
+class MemmapStorage(ArrayStorage):
+    def __init__(self, size, path, sync_freq=1000):
+        """
+        Keeps the transitions column-wise like `ArrayStorage`, in `np.memmap` files under `path`.
+
+        The storage can thus be larger than the physical memory, the page cache holding its most used part. The write
+        cursor and the length are kept in a metadata sidecar, written every `sync_freq` transitions and on `flush()`;
+        creating a storage on a directory that already holds one reopens it.
+
+        :param size: (int) Max number of transitions to store. When the storage overflows the old memories are
+            overwritten.
+        :param path: (str) the directory of the files
+        :param sync_freq: (int) write the metadata every `sync_freq` transitions, None to only write it on `flush()`
+        """
+        super(MemmapStorage, self).__init__(size)
+        self.path = path
+        self.sync_freq = sync_freq
+        self.saved_arrays = {}
+        self._n_unsynced = 0
+        metadata, arrays = load_metadata(path)
+        if metadata is not None:
+            if metadata['maxsize'] != size:
+                raise ValueError("{} holds a storage of size {}, expected {}".format(path, metadata['maxsize'], size))
+            self.next_idx = metadata['next_idx']
+            self._len = metadata['length']
+            if metadata['n_fields'] > 0:
+                self._fields = [open_memmap(self._field_path(field_idx)) for field_idx in range(metadata['n_fields'])]
+            self.saved_arrays = arrays
+
+    def _field_path(self, field_idx):
+        return os.path.join(self.path, 'field_{}.npy'.format(field_idx))
+
+    def _allocate(self, field_idx, shape, dtype):
+        return open_memmap(self._field_path(field_idx), shape, dtype)
+
+    def add(self, data):
+        idx = super(MemmapStorage, self).add(data)
+        self._n_unsynced += 1
+        if self.sync_freq is not None and self._n_unsynced >= self.sync_freq:
+            self.flush()
+        return idx
+
+    def flush(self, arrays=None):
+        """
+        Write the pending changes and the metadata to disk
+
+        :param arrays: ({str: numpy Any}) small arrays to save in the sidecar, returned in `saved_arrays` on reopening
+        """
+        for field in self._fields or []:
+            field.flush()
+        metadata = {
+            'maxsize': self.maxsize,
+            'next_idx': self.next_idx,
+            'length': self._len,
+            'n_fields': len(self._fields or []),
+        }
+        save_metadata(self.path, metadata, arrays)
+        self._n_unsynced = 0
+
+    def set_state(self, metadata, arrays):
+        super(MemmapStorage, self).set_state(metadata, arrays)
+        self.flush()
+
+
+class FrameStackStorage(object):
+    _state_arrays = ('frames', 'actions', 'rewards', 'dones', 'episode_start', 'valid')
+
+    def __init__(self, size, n_frames=4, frame_scale=None, zero_pad=False):
+        """
+        Keeps stacked-frame observations (e.g. `LazyFrames` from `FrameStack`) one frame per environment step.
+
+        The frames live in a circular array of `size` slots: each slot holds the newest frame of an observation,
+        together with the action, reward and done flag of the transition taken from it. The `obs_t` and `obs_tp1`
+        stacks are rebuilt at sampling time from the slot indexes, so every frame is stored exactly once instead of
+        up to `2 * n_frames` times. An episode costs one extra slot for its terminal frame.
+
+        Transitions must be added in the order they were experienced, from a single environment, as `deepq.learn`
+        does.
+
+        :param size: (int) Number of frame slots. When the storage overflows the old memories are overwritten.
+        :param n_frames: (int) the number of frames stacked along the last axis of the observations
+        :param frame_scale: (float) if not None, the observations are float frames that were divided by this value
+            (e.g. 255. for `ScaledFloatFrame`); they are then stored as uint8 and scaled back when sampled
+        :param zero_pad: (bool) pad stacks that cross an episode start with zeros, instead of repeating the first
+            frame of the episode like `FrameStack.reset` does
+        """
+        assert size > n_frames, "the storage must be larger than the frame stack"
+        self.maxsize = size
+        self.next_idx = 0
+        self.n_frames = n_frames
+        self.frame_scale = frame_scale
+        self.zero_pad = zero_pad
+        self._len = 0
+        self._n_written = 0
+        self._episode_open = False
+        self._invalidated = []
+        self._frames = None
+        self._actions = None
+        self._rewards = np.zeros(size, dtype=np.float32)
+        self._dones = np.zeros(size, dtype=np.float32)
+        self._episode_start = np.zeros(size, dtype=np.bool_)
+        self._valid = np.zeros(size, dtype=np.bool_)
+
+    def __len__(self):
+        return self._len
+
+    def _newest_frame(self, obs):
+        obs = np.asarray(obs)
+        assert obs.shape[-1] % self.n_frames == 0, "the last axis must hold {} stacked frames".format(self.n_frames)
+        frame = obs[..., obs.shape[-1] - obs.shape[-1] // self.n_frames:]
+        if self.frame_scale is not None:
+            frame = np.rint(frame * self.frame_scale)
+        return frame
+
+    def _invalidate(self, idx):
+        if self._valid[idx]:
+            self._valid[idx] = False
+            self._len -= 1
+            self._invalidated.append(idx)
+
+    def _write_frame(self, frame, episode_start):
+        idx = self.next_idx
+        self._invalidate(idx)
+        self._frames[idx] = frame
+        self._episode_start[idx] = episode_start
+        # the next slots looked back through this one to rebuild their stacks, unless their episode started later
+        for offset in range(1, self.n_frames):
+            newer_idx = (idx + offset) % self.maxsize
+            if self._episode_start[newer_idx] or newer_idx == idx:
+                break
+            self._invalidate(newer_idx)
+        self.next_idx = (idx + 1) % self.maxsize
+        self._n_written = min(self._n_written + 1, self.maxsize)
+
+    def add(self, data):
+        """
+        Store a transition, writing the newest frame of `obs_tp1` (and of `obs_t` if it starts an episode)
+
+        :param data: ((Any, [float], float, Any, bool)) the transition
+        :return: (int) the slot of `obs_t`, which identifies the transition
+        """
+        obs_t, action, reward, obs_tp1, done = data
+        if self._frames is None:
+            frame = self._newest_frame(obs_t)
+            frame_dtype = np.uint8 if self.frame_scale is not None else frame.dtype
+            self._frames = np.zeros((self.maxsize,) + frame.shape, dtype=frame_dtype)
+            action = np.asarray(action)
+            self._actions = np.zeros((self.maxsize,) + action.shape, dtype=action.dtype)
+
+        if not self._episode_open:
+            self._write_frame(self._newest_frame(obs_t), episode_start=True)
+        idx = (self.next_idx - 1) % self.maxsize
+        self._write_frame(self._newest_frame(obs_tp1), episode_start=False)
+
+        self._actions[idx] = action
+        self._rewards[idx] = reward
+        self._dones[idx] = done
+        self._valid[idx] = True
+        self._len += 1
+        self._episode_open = not done
+        return idx
+
+    def sample_idxes(self, batch_size):
+        """
+        Draw slots uniformly at random among the ones holding a complete transition
+
+        :param batch_size: (int) the number of slots to draw
+        :return: (numpy int) the slots
+        """
+        assert self._len > 0, "cannot sample from an empty storage"
+        idxes = np.random.randint(0, self._n_written, size=batch_size)
+        invalid = ~self._valid[idxes]
+        while invalid.any():
+            idxes[invalid] = np.random.randint(0, self._n_written, size=invalid.sum())
+            invalid = ~self._valid[idxes]
+        return idxes
+
+    def pop_invalidated(self):
+        """
+        The slots that were overwritten, or whose frame stack can no longer be rebuilt, since the last call
+
+        :return: ([int]) the slots
+        """
+        invalidated, self._invalidated = self._invalidated, []
+        return invalidated
+
+    def stored_idxes(self):
+        """
+        The slots holding a complete transition
+
+        :return: (numpy int) the slots
+        """
+        return np.flatnonzero(self._valid)
+
+    def get_state(self):
+        """
+        Export the content of the storage
+
+        :return: ((dict, {str: numpy Any})) the metadata and the written part of the slot arrays
+        """
+        metadata = {
+            'maxsize': self.maxsize,
+            'next_idx': self.next_idx,
+            'length': self._len,
+            'n_written': self._n_written,
+            'episode_open': self._episode_open,
+        }
+        arrays = {}
+        if self._frames is not None:
+            for name in self._state_arrays:
+                arrays[name] = getattr(self, '_' + name)[:self._n_written]
+        return metadata, arrays
+
+    def set_state(self, metadata, arrays):
+        """
+        Import a content exported by `get_state`
+
+        :param metadata: (dict) the metadata
+        :param arrays: ({str: numpy Any}) the arrays
+        """
+        _check_maxsize(self, metadata)
+        self.next_idx = metadata['next_idx']
+        self._len = metadata['length']
+        self._n_written = metadata['n_written']
+        self._episode_open = metadata['episode_open']
+        self._invalidated = []
+        if arrays:
+            self._frames = np.zeros((self.maxsize,) + arrays['frames'].shape[1:], dtype=arrays['frames'].dtype)
+            self._actions = np.zeros((self.maxsize,) + arrays['actions'].shape[1:], dtype=arrays['actions'].dtype)
+            for name in self._state_arrays:
+                getattr(self, '_' + name)[:self._n_written] = arrays[name]
+
+    def _stack(self, idxes):
+        """
+        Rebuild the frame stacks whose newest frame is stored at the given slots
+
+        :param idxes: (numpy int) the slots of the newest frames
+        :return: (numpy Any) the stacked observations, frames concatenated along the last axis
+        """
+        frame_shape = self._frames.shape[1:]
+        out = np.empty((len(idxes),) + frame_shape[:-1] + (self.n_frames, frame_shape[-1]), dtype=self._frames.dtype)
+        slots = idxes
+        in_episode = np.ones(len(idxes), dtype=np.bool_)
+        out[..., -1, :] = self._frames[slots]
+        for frame_idx in range(self.n_frames - 2, -1, -1):
+            # stop walking back once the newer frame is the first one of its episode
+            in_episode &= ~self._episode_start[slots]
+            slots = np.where(in_episode, (slots - 1) % self.maxsize, slots)
+            out[..., frame_idx, :] = self._frames[slots]
+            if self.zero_pad:
+                out[~in_episode, ..., frame_idx, :] = 0
+        out = out.reshape(out.shape[:-2] + (-1,))
+        if self.frame_scale is not None:
+            out = out.astype(np.float32) / self.frame_scale
+        return out
+
+    def encode(self, idxes):
+        """
+        Gather the transitions stored at the given slots
+
+        :param idxes: ([int] or numpy int) the slots
+        :return: ((numpy Any, numpy Any, numpy float, numpy Any, numpy float)) the transition fields
+        """
+        idxes = np.asarray(idxes)
+        return (self._stack(idxes), self._actions[idxes], self._rewards[idxes],
+                self._stack((idxes + 1) % self.maxsize), self._dones[idxes])
+
+    def encode_n_step(self, idxes, n_step, gamma):
+        """
+        Gather the n-step transitions starting at the given slots
+
+        :param idxes: ([int] or numpy int) the slots
+        :param n_step: (int) the maximum number of steps of the returns
+        :param gamma: (float) the discount factor
+        :return: ((numpy Any, numpy Any, numpy float, numpy Any, numpy float, numpy float)) the observations, the
+            actions, the discounted n-step returns, the bootstrap observations, the done flags of the last steps and
+            the discounts to apply to the bootstrap values
+        """
+        idxes = np.asarray(idxes)
+        n_newer = (self.next_idx - 1 - idxes) % self.maxsize
+        returns, last_idxes, discounts = _n_step_returns(
+            idxes, self._rewards, self._dones, n_step, gamma, self.maxsize,
+            lambda step, slots: (step <= n_newer) & self._valid[slots])
+        return (self._stack(idxes), self._actions[idxes], returns, self._stack((last_idxes + 1) % self.maxsize),
+                self._dones[last_idxes], discounts)
+
+
+def _n_step_returns(idxes, rewards, dones, n_step, gamma, maxsize, available):
+    """
+    Compute the n-step returns of transitions stored consecutively in a circular storage, for a whole batch at once.
+    The returns stop after `n_step` transitions, at the end of an episode, or at the newest transition.
+
+    :param idxes: (numpy int) the slots of the first transitions
+    :param rewards: (numpy float) the rewards of every slot
+    :param dones: (numpy float) the done flags of every slot
+    :param n_step: (int) the maximum number of steps of the returns
+    :param gamma: (float) the discount factor
+    :param maxsize: (int) the number of slots
+    :param available: (function (int, numpy int): numpy bool) whether the `step`-th transition after each first
+        transition, stored at the given slots, exists
+    :return: ((numpy float, numpy int, numpy float)) the returns, the slots of the last transitions and the discounts
+        of the bootstrap values
+    """
+    returns = np.zeros(idxes.shape, dtype=rewards.dtype)
+    discounts = np.ones(idxes.shape, dtype=rewards.dtype)
+    last_idxes = idxes.copy()
+    active = np.ones(idxes.shape, dtype=np.bool_)
+    for step in range(n_step):
+        slots = (idxes + step) % maxsize
+        if step > 0:
+            active &= available(step, slots)
+        returns += np.where(active, discounts * rewards[slots], 0)
+        discounts = np.where(active, discounts * gamma, discounts)
+        last_idxes = np.where(active, slots, last_idxes)
+        active &= dones[slots] == 0
+    return returns, last_idxes, discounts
+
+
+def _check_maxsize(storage, metadata):
+    if metadata['maxsize'] != storage.maxsize:
+        raise ValueError("Cannot restore a storage of size {} into a storage of size {}".format(
+            metadata['maxsize'], storage.maxsize))
+
+
+STORAGES = {
+    'list': ListStorage,
+    'array': ArrayStorage,
+    'memmap': MemmapStorage,
+    'frame_stack': FrameStackStorage,
+}
+
+
+def make_storage(storage, size, **kwargs):
+    """
+    Create the storage backend of a replay buffer
+
+    :param storage: (str) the name of the backend, one of `STORAGES`
+    :param size: (int) Max number of transitions to store
+    :param kwargs: (dict) extra parameters of the backend
+    :return: (ListStorage or ArrayStorage or MemmapStorage or FrameStackStorage) the storage
+    """
+    if storage not in STORAGES:
+        raise ValueError("Unknown replay storage '{}', expected one of {}".format(storage, sorted(STORAGES)))
+    return STORAGES[storage](size, **kwargs)
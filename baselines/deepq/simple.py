@@ -10,6 +10,7 @@ from baselines import logger, deepq
 from baselines.common import tf_util
 from baselines.common.tf_util import load_state, save_state
 from baselines.common.schedules import LinearSchedule
+from baselines.common.prefetch import BatchPrefetcher
 from baselines.deepq.replay_buffer import ReplayBuffer, PrioritizedReplayBuffer
 from baselines.deepq.utils import ObservationInput
 
@@ -95,7 +96,8 @@ def learn(env, q_func, learning_rate=5e-4, max_timesteps=100000, buffer_size=500
           exploration_final_eps=0.02, train_freq=1, batch_size=32, print_freq=100, checkpoint_freq=10000,
           checkpoint_path=None, learning_starts=1000, gamma=1.0, target_network_update_freq=500,
           prioritized_replay=False, prioritized_replay_alpha=0.6, prioritized_replay_beta0=0.4,
-          prioritized_replay_beta_iters=None, prioritized_replay_eps=1e-6, param_noise=False, callback=None):
+          prioritized_replay_beta_iters=None, prioritized_replay_eps=1e-6, param_noise=False, callback=None,
+          buffer_storage='list', buffer_storage_kwargs=None, n_step=1, prefetch=False):
     """
     Train a deepq model.
 
@@ -119,6 +121,7 @@ def learn(env, q_func, learning_rate=5e-4, max_timesteps=100000, buffer_size=500
         of the training. If you do not wish to restore the best version at the end of the training set this variable
         to None.
     :param checkpoint_path: (str) replacement path used if you need to log to somewhere else than a temporary directory.
+        When set, the replay buffer is saved there too, next to the model, and both are restored on the next run.
     :param learning_starts: (int) how many steps of the model to collect transitions for before learning starts
     :param gamma: (float) discount factor
     :param target_network_update_freq: (int) update the target network every `target_network_update_freq` steps.
@@ -131,6 +134,14 @@ def learn(env, q_func, learning_rate=5e-4, max_timesteps=100000, buffer_size=500
     :param param_noise: (bool) Whether or not to apply noise to the parameters of the policy.
     :param callback: (function (dict, dict)) function called at every steps with state of the algorithm.
         If callback returns true training stops. It takes the local and global variables.
+    :param buffer_storage: (str) how the replay buffer stores transitions ('list', 'array' or 'frame_stack'),
+        see ReplayBuffer.__init__
+    :param buffer_storage_kwargs: (dict) extra parameters of the replay buffer storage
+    :param n_step: (int) train on n-step returns, computed by the replay buffer (which then needs a columnar
+        `buffer_storage`, e.g. 'array')
+    :param prefetch: (bool) sample and prepare the training batches in a background thread (see `BatchPrefetcher`),
+        so that sampling overlaps with the updates of the model. The batches are then sampled from the replay buffer
+        as it was one or two updates earlier.
     :return: (ActWrapper) Wrapper over act function. Adds ability to save it and load it. See header of
         baselines/deepq/categorical.py for details on the act function.
     """
@@ -154,7 +165,8 @@ def learn(env, q_func, learning_rate=5e-4, max_timesteps=100000, buffer_size=500
         q_func=q_func,
         num_actions=env.action_space.n,
         optimizer=tf.train.AdamOptimizer(learning_rate=learning_rate),
-        gamma=gamma,
+        # with n-step returns, the per-sample discount is folded into the done mask (see below)
+        gamma=gamma if n_step == 1 else 1.0,
         grad_norm_clipping=10,
         param_noise=param_noise
     )
@@ -169,15 +181,47 @@ def learn(env, q_func, learning_rate=5e-4, max_timesteps=100000, buffer_size=500
 
     # Create the replay buffer
     if prioritized_replay:
-        replay_buffer = PrioritizedReplayBuffer(buffer_size, alpha=prioritized_replay_alpha)
+        replay_buffer = PrioritizedReplayBuffer(buffer_size, alpha=prioritized_replay_alpha, storage=buffer_storage,
+                                                storage_kwargs=buffer_storage_kwargs, n_step=n_step, gamma=gamma)
         if prioritized_replay_beta_iters is None:
             prioritized_replay_beta_iters = max_timesteps
         beta_schedule = LinearSchedule(prioritized_replay_beta_iters,
                                        initial_p=prioritized_replay_beta0,
                                        final_p=1.0)
     else:
-        replay_buffer = ReplayBuffer(buffer_size)
+        replay_buffer = ReplayBuffer(buffer_size, storage=buffer_storage, storage_kwargs=buffer_storage_kwargs,
+                                     n_step=n_step, gamma=gamma)
         beta_schedule = None
+
+    def sample_experience():
+        if prioritized_replay:
+            return replay_buffer.sample(batch_size, beta=beta_schedule.value(step))
+        return replay_buffer.sample(batch_size)
+
+    def prepare_batch(experience):
+        if prioritized_replay:
+            *experience, weights, batch_idxes = experience
+        else:
+            weights, batch_idxes = np.ones_like(experience[2]), None
+        if n_step == 1:
+            obses_t, actions, rewards, obses_tp1, dones = experience
+        else:
+            obses_t, actions, rewards, obses_tp1, dones, discounts = experience
+            # the graph computes rewards + 1.0 * (1 - dones) * max Q(obses_tp1)
+            dones = 1.0 - discounts * (1.0 - dones)
+        return obses_t, actions, rewards, obses_tp1, dones, weights, batch_idxes
+
+    add_transition = replay_buffer.add
+    update_priorities = getattr(replay_buffer, 'update_priorities', None)
+    save_buffer = replay_buffer.save
+    prefetcher = None
+    if prefetch:
+        # the worker samples while the buffer is written to: every write goes through the lock of the prefetcher
+        prefetcher = BatchPrefetcher(sample_experience, prepare_batch)
+        add_transition = prefetcher.locked(replay_buffer.add)
+        save_buffer = prefetcher.locked(replay_buffer.save)
+        if prioritized_replay:
+            update_priorities = prefetcher.locked(replay_buffer.update_priorities)
     # Create the schedule for exploration starting from 1.
     exploration = LinearSchedule(schedule_timesteps=int(exploration_fraction * max_timesteps),
                                  initial_p=1.0,
@@ -202,6 +246,14 @@ def learn(env, q_func, learning_rate=5e-4, max_timesteps=100000, buffer_size=500
             logger.log('Loaded model from {}'.format(model_file))
             model_saved = True
 
+        buffer_file = os.path.join(temp_dir, "replay_buffer")
+        buffer_saving = None
+        if checkpoint_path is not None and os.path.exists(buffer_file):
+            replay_buffer.load(buffer_file)
+            logger.log('Loaded replay buffer of {} transitions from {}'.format(len(replay_buffer), buffer_file))
+            # the restored transitions count towards the ones collected before learning starts
+            learning_starts = max(0, learning_starts - len(replay_buffer))
+
         for step in range(max_timesteps):
             if callback is not None:
                 if callback(locals(), globals()):
@@ -227,7 +279,7 @@ def learn(env, q_func, learning_rate=5e-4, max_timesteps=100000, buffer_size=500
             reset = False
             new_obs, rew, done, _ = env.step(env_action)
             # Store transition in the replay buffer.
-            replay_buffer.add(obs, action, rew, new_obs, float(done))
+            add_transition(obs, action, rew, new_obs, float(done))
             obs = new_obs
 
             episode_rewards[-1] += rew
@@ -238,16 +290,15 @@ def learn(env, q_func, learning_rate=5e-4, max_timesteps=100000, buffer_size=500
 
             if step > learning_starts and step % train_freq == 0:
                 # Minimize the error in Bellman's equation on a batch sampled from replay buffer.
-                if prioritized_replay:
-                    experience = replay_buffer.sample(batch_size, beta=beta_schedule.value(step))
-                    (obses_t, actions, rewards, obses_tp1, dones, weights, batch_idxes) = experience
+                if prefetcher is not None:
+                    batch = prefetcher.get()
                 else:
-                    obses_t, actions, rewards, obses_tp1, dones = replay_buffer.sample(batch_size)
-                    weights, batch_idxes = np.ones_like(rewards), None
+                    batch = prepare_batch(sample_experience())
+                obses_t, actions, rewards, obses_tp1, dones, weights, batch_idxes = batch
                 td_errors = train(obses_t, actions, rewards, obses_tp1, dones, weights, sess=act.sess)
                 if prioritized_replay:
                     new_priorities = np.abs(td_errors) + prioritized_replay_eps
-                    replay_buffer.update_priorities(batch_idxes, new_priorities)
+                    update_priorities(batch_idxes, new_priorities)
 
             if step > learning_starts and step % target_network_update_freq == 0:
                 # Update target network periodically.
@@ -274,7 +325,15 @@ def learn(env, q_func, learning_rate=5e-4, max_timesteps=100000, buffer_size=500
                                    saved_mean_reward, mean_100ep_reward))
                     save_state(model_file, act.sess)
                     model_saved = True
+                    if checkpoint_path is not None:
+                        if buffer_saving is not None:
+                            buffer_saving.join()
+                        buffer_saving = save_buffer(buffer_file, background=True)
                     saved_mean_reward = mean_100ep_reward
+        if prefetcher is not None:
+            prefetcher.close()
+        if buffer_saving is not None:
+            buffer_saving.join()
         if model_saved:
             if print_freq is not None:
                 logger.log("Restored model with mean reward: {}".format(saved_mean_reward))
@@ -8,7 +8,9 @@ from baselines import logger
 from baselines.her.util import import_function, flatten_grads, transitions_in_episode_batch
 from baselines.her.normalizer import Normalizer
 from baselines.her.replay_buffer import ReplayBuffer
+from baselines.her.shared_replay_buffer import SharedReplayBuffer
 from baselines.common.mpi_adam import MpiAdam
+from baselines.common.prefetch import BatchPrefetcher
 
 
 def dims_to_shapes(input_dims):
@@ -19,7 +21,7 @@ class DDPG(object):
     def __init__(self, input_dims, buffer_size, hidden, layers, network_class, polyak, batch_size,
                  q_lr, pi_lr, norm_eps, norm_clip, max_u, action_l2, clip_obs, scope, time_horizon,
                  rollout_batch_size, subtract_goals, relative_goals, clip_pos_returns, clip_return,
-                 sample_transitions, gamma, reuse=False):
+                 sample_transitions, gamma, reuse=False, prefetch=False, shared_buffer=False):
         """
         Implementation of DDPG that is used in combination with Hindsight Experience Replay (HER).
 
@@ -48,6 +50,10 @@ class DDPG(object):
         :param sample_transitions: (function (dict, int): dict) function that samples from the replay buffer
         :param gamma: (float) gamma used for Q learning updates
         :param reuse: (boolean) whether or not the networks should be reused
+        :param prefetch: (boolean) sample and preprocess the training batches in a background thread (see
+            `BatchPrefetcher`), so that sampling overlaps with the updates of the networks
+        :param shared_buffer: (boolean) share one replay buffer of `buffer_size` transitions between the MPI ranks of
+            each node, in shared memory (see `SharedReplayBuffer`)
         """
         # Updated in experiments/config.py
         self.input_dims = input_dims
@@ -114,7 +120,15 @@ class DDPG(object):
         buffer_shapes['ag'] = (self.time_horizon + 1, self.dim_goal)
 
         buffer_size = (self.buffer_size // self.rollout_batch_size) * self.rollout_batch_size
-        self.buffer = ReplayBuffer(buffer_shapes, buffer_size, self.time_horizon, self.sample_transitions)
+        if shared_buffer:
+            self.buffer = SharedReplayBuffer(buffer_shapes, buffer_size, self.time_horizon, self.sample_transitions)
+        else:
+            self.buffer = ReplayBuffer(buffer_shapes, buffer_size, self.time_horizon, self.sample_transitions)
+
+        # the replay buffer locks its own storage, so the lock of the prefetcher only guards the sampling
+        self.prefetcher = None
+        if prefetch:
+            self.prefetcher = BatchPrefetcher(lambda: self.buffer.sample(self.batch_size), self._prepare_prefetched)
 
     def _random_action(self, num):
         return np.random.uniform(low=-self.max_u, high=self.max_u, size=(num, self.dim_action))
@@ -188,8 +202,6 @@ class DDPG(object):
 
         if update_stats:
             # add transitions to normalizer
-            episode_batch['o_2'] = episode_batch['o'][:, 1:, :]
-            episode_batch['ag_2'] = episode_batch['ag'][:, 1:, :]
             num_normalizing_transitions = transitions_in_episode_batch(episode_batch)
             transitions = self.sample_transitions(episode_batch, num_normalizing_transitions)
 
@@ -235,7 +247,15 @@ class DDPG(object):
 
         :return: (dict) the batch
         """
-        transitions = self.buffer.sample(self.batch_size)
+        return self._prepare_batch(self.buffer.sample(self.batch_size))
+
+    def _prepare_batch(self, transitions):
+        """
+        preprocess sampled transitions into the inputs of the staging area
+
+        :param transitions: (dict) the sampled transitions
+        :return: ([numpy Any]) the batch, in the order of the staging area
+        """
         obs, obs_2, goal = transitions['o'], transitions['o_2'], transitions['g']
         achieved_goal, achieved_goal_2 = transitions['ag'], transitions['ag_2']
         transitions['o'], transitions['g'] = self._preprocess_obs_goal(obs, achieved_goal, goal)
@@ -244,6 +264,18 @@ class DDPG(object):
         transitions_batch = [transitions[key] for key in self.stage_shapes.keys()]
         return transitions_batch
 
+    def _prepare_prefetched(self, transitions):
+        """
+        preprocess transitions sampled ahead of time, see `_prepare_batch`
+
+        :param transitions: (dict) the sampled transitions
+        :return: ([numpy Any]) the batch, in the order of the staging area
+        """
+        transitions_batch = self._prepare_batch(transitions)
+        # the sampled arrays are reused by the next sample, only the preprocessed observations and goals are new
+        return [value if key in ('o', 'g', 'o_2', 'g_2') else value.copy()
+                for key, value in zip(self.stage_shapes.keys(), transitions_batch)]
+
     def stage_batch(self, batch=None):
         """
         apply a batch to staging
@@ -263,7 +295,7 @@ class DDPG(object):
         :return: (float, float) critic loss, actor loss
         """
         if stage:
-            self.stage_batch()
+            self.stage_batch(self.prefetcher.get() if self.prefetcher is not None else None)
         critic_loss, actor_loss, q_grad, pi_grad = self._grads()
         self._update(q_grad, pi_grad)
         return critic_loss, actor_loss
@@ -283,6 +315,13 @@ class DDPG(object):
         """
         self.buffer.clear_buffer()
 
+    def close(self):
+        """
+        stops the background sampling of the training batches, if any
+        """
+        if self.prefetcher is not None:
+            self.prefetcher.close()
+
     def _vars(self, scope):
         res = tf.get_collection(tf.GraphKeys.TRAINABLE_VARIABLES, scope=self.scope + '/' + scope)
         assert len(res) > 0
@@ -393,7 +432,7 @@ class DDPG(object):
         """
         excluded_subnames = ['_tf', '_op', '_vars', '_adam', 'buffer', 'sess', '_stats',
                              'main', 'target', 'lock', 'env', 'sample_transitions',
-                             'stage_shapes', 'create_actor_critic']
+                             'stage_shapes', 'create_actor_critic', 'prefetch']
 
         state = {k: v for k, v in self.__dict__.items() if all([subname not in k for subname in excluded_subnames])}
         state['buffer_size'] = self.buffer_size
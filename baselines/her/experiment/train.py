@@ -100,6 +100,8 @@ def train(policy, rollout_worker, evaluator, n_epochs, n_test_rollouts, n_cycles
         if rank != 0:
             assert local_uniform[0] != root_uniform[0]
 
+    policy.close()
+
 
 def launch(env, logdir, n_epochs, num_cpu, seed, replay_strategy, policy_save_interval, clip_return,
            override_params=None, save_policies=True):
@@ -1,3 +1,5 @@
+import threading
+
 import numpy as np
 
 
@@ -16,8 +18,32 @@ def make_sample_her_transitions(replay_strategy, replay_k, reward_fun):
     else:  # 'replay_strategy' == 'none'
         future_p = 0
 
+    # the outputs are reused across calls, one set per thread so that a sampling thread and the main thread can both
+    # sample (see `BatchPrefetcher`)
+    outputs = threading.local()
+
+    def _output(key, shape, dtype):
+        cache = outputs.__dict__.setdefault('arrays', {})
+        if key not in cache or cache[key].shape != shape or cache[key].dtype != dtype:
+            cache[key] = np.empty(shape, dtype=dtype)
+        return cache[key]
+
+    def _gather(key, flat_array, flat_idxs):
+        out = _output(key, (len(flat_idxs),) + flat_array.shape[1:], flat_array.dtype)
+        return np.take(flat_array, flat_idxs, axis=0, out=out)
+
     def _sample_her_transitions(episode_batch, batch_size_in_transitions):
-        """episode_batch is {key: array(buffer_size x T x dim_key)}
+        """
+        Sample transitions from episodes, substituting future achieved goals for the goals of a `future_p` fraction
+        of them, and recompute their rewards.
+
+        Each field is gathered once, with flat indexes into the episodes, into arrays that are reused by the next
+        call: copy the returned arrays that must outlive it.
+
+        :param episode_batch: ({str: numpy Any}) {key: array(n_episodes x T or T+1 x dim_key)}, 'o' and 'ag' hold
+            T+1 steps. 'o_2' and 'ag_2', if present, are ignored: they are gathered from 'o' and 'ag'.
+        :param batch_size_in_transitions: (int) the number of transitions to sample
+        :return: ({str: numpy Any}) {key: array(batch_size x dim_key)}, with 'o_2', 'ag_2' and the rewards 'r'
         """
         time_horizon = episode_batch['u'].shape[1]
         rollout_batch_size = episode_batch['u'].shape[0]
@@ -26,21 +52,33 @@ def make_sample_her_transitions(replay_strategy, replay_k, reward_fun):
         # Select which episodes and time steps to use.
         episode_idxs = np.random.randint(0, rollout_batch_size, batch_size)
         t_samples = np.random.randint(time_horizon, size=batch_size)
-        transitions = {key: episode_batch[key][episode_idxs, t_samples].copy()
-                       for key in episode_batch.keys()}
+        # flat indexes of the steps in the fields of T steps, and of T+1 steps ('o' and 'ag')
+        step_idxs = episode_idxs * time_horizon + t_samples
+        obs_idxs = episode_idxs * (time_horizon + 1) + t_samples
+
+        transitions = {}
+        for key, value in episode_batch.items():
+            if key in ('o_2', 'ag_2'):
+                continue
+            flat_value = value.reshape((-1,) + value.shape[2:])
+            if value.shape[1] == time_horizon + 1:
+                transitions[key] = _gather(key, flat_value, obs_idxs)
+                if key in ('o', 'ag'):
+                    transitions[key + '_2'] = _gather(key + '_2', flat_value, obs_idxs + 1)
+            else:
+                transitions[key] = _gather(key, flat_value, step_idxs)
 
         # Select future time indexes proportional with probability future_p. These
         # will be used for HER replay by substituting in future goals.
-        her_indexes = np.where(np.random.uniform(size=batch_size) < future_p)
-        future_offset = np.random.uniform(size=batch_size) * (time_horizon - t_samples)
-        future_offset = future_offset.astype(int)
-        future_t = (t_samples + 1 + future_offset)[her_indexes]
+        her_indexes = np.where(np.random.uniform(size=batch_size) < future_p)[0]
+        future_offset = np.random.uniform(size=len(her_indexes)) * (time_horizon - t_samples[her_indexes])
+        future_t = t_samples[her_indexes] + 1 + future_offset.astype(int)
 
         # Replace goal with achieved goal but only for the previously-selected
         # HER transitions (as defined by her_indexes). For the other transitions,
         # keep the original goal.
-        future_ag = episode_batch['ag'][episode_idxs[her_indexes], future_t]
-        transitions['g'][her_indexes] = future_ag
+        flat_ag = episode_batch['ag'].reshape((-1,) + episode_batch['ag'].shape[2:])
+        transitions['g'][her_indexes] = flat_ag[episode_idxs[her_indexes] * (time_horizon + 1) + future_t]
 
         # Reconstruct info dictionary for reward  computation.
         info = {}
@@ -49,12 +87,7 @@ def make_sample_her_transitions(replay_strategy, replay_k, reward_fun):
                 info[key.replace('info_', '')] = value
 
         # Re-compute reward since we may have substituted the goal.
-        reward_params = {k: transitions[k] for k in ['ag_2', 'g']}
-        reward_params['info'] = info
-        transitions['r'] = reward_fun(**reward_params)
-
-        transitions = {k: transitions[k].reshape(batch_size, *transitions[k].shape[1:])
-                       for k in transitions.keys()}
+        transitions['r'] = reward_fun(ag_2=transitions['ag_2'], g=transitions['g'], info=info)
 
         assert transitions['u'].shape[0] == batch_size_in_transitions
 
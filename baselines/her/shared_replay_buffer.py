@@ -0,0 +1,130 @@
+import threading
+
+import numpy as np
+from mpi4py import MPI
+
+from baselines.her.replay_buffer import ReplayBuffer
+
+_ALIGNMENT = 64
+
+
+class _WindowLock(object):
+    def __init__(self, win, lock_type, local_lock):
+        """
+        A lock on the memory of an MPI shared-memory window, usable as a context manager.
+
+        MPI locks exclude other processes, `local_lock` excludes the other threads of this process, which may not
+        hold two lock epochs on the same window at once.
+
+        :param win: (MPI.Win) the window
+        :param lock_type: (int) MPI.LOCK_EXCLUSIVE to write, MPI.LOCK_SHARED to read alongside the other readers
+        :param local_lock: (threading.Lock) the lock shared by the threads of this process
+        """
+        self.win = win
+        self.lock_type = lock_type
+        self.local_lock = local_lock
+
+    def __enter__(self):
+        self.local_lock.acquire()
+        self.win.Lock(0, self.lock_type)
+        # make the writes of the previous holders visible
+        self.win.Sync()
+        return self
+
+    def __exit__(self, *_args):
+        self.win.Sync()
+        self.win.Unlock(0)
+        self.local_lock.release()
+
+
+class SharedReplayBuffer(ReplayBuffer):
+    def __init__(self, buffer_shapes, size_in_transitions, time_horizon, sample_transitions, comm=None):
+        """
+        A replay buffer shared by the MPI ranks of a node: its arrays are placed in shared memory allocated by the
+        first rank of the node, and every rank of the node stores its episodes in it and samples from all of them.
+
+        The episodes are stored under an exclusive lock and sampled under a shared one, that excludes the writers
+        but not the other samplers.
+
+        :param buffer_shapes: ({str: int}) the shape for all buffers that are used in the replay buffer
+        :param size_in_transitions: (int) the size of the buffer shared by the ranks of the node, measured in
+            transitions
+        :param time_horizon: (int) the time horizon for episodes
+        :param sample_transitions: (function) a function that samples from the replay buffer
+        :param comm: (MPI.Comm) the communicator of the ranks to share the buffer with, split by node (default
+            MPI.COMM_WORLD). This is a collective call on it.
+        """
+        self.buffer_shapes = buffer_shapes
+        self.size = size_in_transitions // time_horizon
+        self.time_horizon = time_horizon
+        self.sample_transitions = sample_transitions
+
+        comm = MPI.COMM_WORLD if comm is None else comm
+        self.node_comm = comm.Split_type(MPI.COMM_TYPE_SHARED)
+        is_owner = self.node_comm.Get_rank() == 0
+
+        # the counters (current size and number of transitions stored) come first, then one array per key
+        layout = [('_counters', (2,), np.int64)]
+        layout += [(key, (self.size,) + tuple(shape), np.float64) for key, shape in buffer_shapes.items()]
+        offsets, n_bytes = [], 0
+        for _, shape, dtype in layout:
+            offsets.append(n_bytes)
+            n_bytes += -(-int(np.prod(shape)) * np.dtype(dtype).itemsize // _ALIGNMENT) * _ALIGNMENT
+
+        self.win = MPI.Win.Allocate_shared(n_bytes if is_owner else 0, 1, comm=self.node_comm)
+        memory, _ = self.win.Shared_query(0)
+        memory = np.ndarray(buffer=memory, dtype=np.uint8, shape=(n_bytes,))
+        arrays = {key: np.ndarray(buffer=memory, dtype=dtype, shape=shape, offset=offset)
+                  for (key, shape, dtype), offset in zip(layout, offsets)}
+        self._counters = arrays.pop('_counters')
+        self.buffers = arrays
+
+        local_lock = threading.Lock()
+        self.lock = _WindowLock(self.win, MPI.LOCK_EXCLUSIVE, local_lock)
+        self.shared_lock = _WindowLock(self.win, MPI.LOCK_SHARED, local_lock)
+        if is_owner:
+            with self.lock:
+                self._counters[:] = 0
+        self.node_comm.Barrier()
+
+    @property
+    def current_size(self):
+        return int(self._counters[0])
+
+    @current_size.setter
+    def current_size(self, value):
+        self._counters[0] = value
+
+    @property
+    def n_transitions_stored(self):
+        return int(self._counters[1])
+
+    @n_transitions_stored.setter
+    def n_transitions_stored(self, value):
+        self._counters[1] = value
+
+    def sample(self, batch_size):
+        """
+        sample random transitions from the episodes stored by all the ranks of the node
+
+        :param batch_size: (int) How many transitions to sample.
+        :return: (dict) {key: array(batch_size x shapes[key])}
+        """
+        # the transitions are gathered under the lock, so that no episode is overwritten while it is read
+        with self.shared_lock:
+            assert self.current_size > 0
+            buffers = {key: value[:self.current_size] for key, value in self.buffers.items()}
+            transitions = self.sample_transitions(buffers, batch_size)
+
+        for key in (['r', 'o_2', 'ag_2'] + list(self.buffers.keys())):
+            assert key in transitions, "key %s missing from transitions" % key
+
+        return transitions
+
+    def close(self):
+        """
+        Free the shared memory, a collective call on the ranks of the node
+        """
+        self.buffers = None
+        self._counters = None
+        self.win.Free()
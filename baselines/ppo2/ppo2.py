@@ -140,17 +140,18 @@ class Model(object):
 
 
 class Runner(AbstractEnvRunner):
-    def __init__(self, *, env, model, n_steps, gamma, lam):
+    def __init__(self, *, env, model, n_steps, gamma, lam, pipelined=False):
         """
         A runner to learn the policy of an environment for a model
 
-        :param env: (Gym environment) The environment to learn from
+        :param env: (VecEnv or BatchedEnv) The environment to learn from
         :param model: (Model) The model to learn
         :param n_steps: (int) The number of steps to run for each environment
         :param gamma: (float) Discount factor
         :param lam: (float) Factor for trade-off of bias vs variance for Generalized Advantage Estimator
+        :param pipelined: (bool) step the parts of the environment in turn, see AbstractEnvRunner.__init__
         """
-        super().__init__(env=env, model=model, n_steps=n_steps)
+        super().__init__(env=env, model=model, n_steps=n_steps, pipelined=pipelined)
         self.lam = lam
         self.gamma = gamma
 
@@ -168,31 +169,44 @@ class Runner(AbstractEnvRunner):
             - states: (numpy Number) the internal states of the recurrent policies
             - infos: (dict) the extra information of the model
         """
-        # mb stands for minibatch
-        mb_obs, mb_rewards, mb_actions, mb_values, mb_dones, mb_neglogpacs = [], [], [], [], [], []
+        # mb stands for minibatch, with one list per part of the environment
+        mb_obs, mb_rewards, mb_actions, mb_values, mb_dones, mb_neglogpacs = ([[] for _ in self.venvs]
+                                                                              for _ in range(6))
         mb_states = self.states
         ep_infos = []
-        for _ in range(self.n_steps):
-            actions, values, self.states, neglogpacs = self.model.step(self.obs, self.states, self.dones)
-            mb_obs.append(self.obs.copy())
-            mb_actions.append(actions)
-            mb_values.append(values)
-            mb_neglogpacs.append(neglogpacs)
-            mb_dones.append(self.dones)
-            self.obs[:], rewards, self.dones, infos = self.env.step(actions)
+
+        def _act(part):
+            env_slice = self.env_slices[part]
+            actions, values, self.part_states[part], neglogpacs = self.model.step(self.obs[env_slice],
+                                                                                  self.part_states[part],
+                                                                                  self.dones[env_slice])
+            mb_obs[part].append(self.obs[env_slice].copy())
+            mb_actions[part].append(actions)
+            mb_values[part].append(values)
+            mb_neglogpacs[part].append(neglogpacs)
+            mb_dones[part].append(self.dones[env_slice].copy())
+            return actions
+
+        def _observe(part, obs, rewards, dones, infos):
+            env_slice = self.env_slices[part]
+            self.obs[env_slice] = obs
+            self.dones[env_slice] = dones
             for info in infos:
                 maybeep_info = info.get('episode')
                 if maybeep_info:
                     ep_infos.append(maybeep_info)
-            mb_rewards.append(rewards)
+            mb_rewards[part].append(rewards)
+
+        self._rollout(_act, _observe)
         # batch of steps to batch of rollouts
-        mb_obs = np.asarray(mb_obs, dtype=self.obs.dtype)
-        mb_rewards = np.asarray(mb_rewards, dtype=np.float32)
-        mb_actions = np.asarray(mb_actions)
-        mb_values = np.asarray(mb_values, dtype=np.float32)
-        mb_neglogpacs = np.asarray(mb_neglogpacs, dtype=np.float32)
-        mb_dones = np.asarray(mb_dones, dtype=np.bool)
-        last_values = self.model.value(self.obs, self.states, self.dones)
+        mb_obs = self._stack_parts(mb_obs, dtype=self.obs.dtype)
+        mb_rewards = self._stack_parts(mb_rewards, dtype=np.float32)
+        mb_actions = self._stack_parts(mb_actions)
+        mb_values = self._stack_parts(mb_values, dtype=np.float32)
+        mb_neglogpacs = self._stack_parts(mb_neglogpacs, dtype=np.float32)
+        mb_dones = self._stack_parts(mb_dones, dtype=np.bool_)
+        last_values = np.concatenate([self.model.value(self.obs[env_slice], states, self.dones[env_slice])
+                                      for env_slice, states in zip(self.env_slices, self.part_states)])
         # discount/bootstrap off value fn
         mb_advs = np.zeros_like(mb_rewards)
         last_gae_lam = 0
@@ -240,12 +254,12 @@ def constfn(val):
 def learn(*, policy, env, n_steps, total_timesteps, ent_coef, learning_rate,
           vf_coef=0.5, max_grad_norm=0.5, gamma=0.99, lam=0.95,
           log_interval=10, nminibatches=4, noptepochs=4,
-          cliprange=0.2, save_interval=0, load_path=None):
+          cliprange=0.2, save_interval=0, load_path=None, pipelined=False):
     """
     Return a trained PPO2 model.
 
     :param policy: (A2CPolicy) The policy model to use (MLP, CNN, LSTM, ...)
-    :param env: (Gym environment) The environment to learn from
+    :param env: (VecEnv or BatchedEnv) The environment to learn from
     :param n_steps: (int) The number of steps to run for each environment
     :param total_timesteps: (int) The total number of samples
     :param ent_coef: (float) Entropy coefficient for the loss caculation
@@ -260,6 +274,8 @@ def learn(*, policy, env, n_steps, total_timesteps, ent_coef, learning_rate,
     :param log_interval: (int) The number of timesteps before logging.
     :param save_interval: (int) The number of timesteps before saving.
     :param load_path: (str) Path to a trained ppo2 model, set to None, it will learn from scratch
+    :param pipelined: (bool) step the two halves (or more parts) of a ConcatVecEnv in turn, running the policy on
+        the observations of a part while the others simulate
     :return: (Model) PPO2 model
     """
     if isinstance(learning_rate, float):
@@ -277,8 +293,10 @@ def learn(*, policy, env, n_steps, total_timesteps, ent_coef, learning_rate,
     ac_space = env.action_space
     n_batch = n_envs * n_steps
     n_batch_train = n_batch // nminibatches
+    # in the pipelined mode, the policy acts on one part of the environment at a time
+    n_batch_act = env.venvs[0].num_envs if pipelined else n_envs
 
-    make_model = lambda: Model(policy=policy, ob_space=ob_space, ac_space=ac_space, n_batch_act=n_envs,
+    make_model = lambda: Model(policy=policy, ob_space=ob_space, ac_space=ac_space, n_batch_act=n_batch_act,
                                n_batch_train=n_batch_train, n_steps=n_steps, ent_coef=ent_coef, vf_coef=vf_coef,
                                max_grad_norm=max_grad_norm)
     if save_interval and logger.get_dir():
@@ -288,7 +306,7 @@ def learn(*, policy, env, n_steps, total_timesteps, ent_coef, learning_rate,
     model = make_model()
     if load_path is not None:
         model.load(load_path)
-    runner = Runner(env=env, model=model, n_steps=n_steps, gamma=gamma, lam=lam)
+    runner = Runner(env=env, model=model, n_steps=n_steps, gamma=gamma, lam=lam, pipelined=pipelined)
 
     ep_info_buf = deque(maxlen=100)
     t_first_start = time.time()
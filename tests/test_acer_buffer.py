@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from baselines.acer.buffer import Buffer
+
+
+def _reference_decode(enc_obs, dones, n_stack):
+    """
+    stack the frames with a loop over the environments, steps and stacked frames
+    """
+    n_env, n_frames = enc_obs.shape[:2]
+    n_steps = n_frames - n_stack
+    obs = np.zeros((n_env, n_steps + 1) + enc_obs.shape[2:4] + (n_stack * enc_obs.shape[4],), dtype=enc_obs.dtype)
+    n_channels = enc_obs.shape[4]
+    for env in range(n_env):
+        for step in range(n_steps + 1):
+            frame = step + n_stack - 1
+            for age in range(n_stack):
+                # the frames before the last done are from an earlier episode
+                if any(dones[env, frame - n_stack - i] for i in range(age) if frame - n_stack - i >= 0):
+                    break
+                stack_idx = n_stack - 1 - age
+                obs[env, step, :, :, stack_idx * n_channels:(stack_idx + 1) * n_channels] = enc_obs[env, frame - age]
+    return obs
+
+
+def test_acer_buffer_get():
+    """
+    test the vectorized take and the stacked frames decoded from the buffer
+    """
+    n_env, n_steps, n_stack = 3, 5, 4
+    env = SimpleNamespace(num_envs=n_env, observation_space=SimpleNamespace(shape=(2, 2, 1)))
+    buffer = Buffer(env, n_steps, n_stack, size=4 * n_steps)
+    for i in range(6):
+        enc_obs = np.random.randint(1, 256, size=(n_env, n_steps + n_stack, 2, 2, 1)).astype(np.uint8)
+        actions = np.full((n_env, n_steps), i)
+        dones = np.random.random((n_env, n_steps)) < 0.3
+        buffer.put(enc_obs, actions, actions.astype(np.float32), np.zeros((n_env, n_steps, 2)), dones, dones)
+
+    obs, actions, rewards, mus, dones, masks = buffer.get()
+    assert obs.shape == (n_env, n_steps + 1, 2, 2, n_stack)
+    assert actions.shape == rewards.shape == dones.shape == (n_env, n_steps)
+    assert mus.shape == (n_env, n_steps, 2)
+    for env in range(n_env):
+        idx = [i for i in range(buffer.size) if buffer.actions[i, 0, 0] == actions[env, 0]][0]
+        assert np.array_equal(dones[env], buffer.dones[idx, env])
+        expected = _reference_decode(buffer.enc_obs[idx, env][None], buffer.dones[idx, env][None], n_stack)
+        assert np.array_equal(obs[env], expected[0])
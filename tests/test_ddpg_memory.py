@@ -0,0 +1,117 @@
+import numpy as np
+
+from baselines.ddpg.memory import Memory, CompactMemory
+
+
+def _fill(memory, n_transitions):
+    for i in range(n_transitions):
+        memory.append(np.full(3, i), np.full(2, -i), float(i), np.full(3, i + 1), i % 5 == 4)
+
+
+def test_memory_sample():
+    """
+    test that the sampled batches are consistent
+    """
+    memory = Memory(limit=16, action_shape=(2,), observation_shape=(3,))
+    _fill(memory, 20)
+    assert memory.nb_entries == 16
+
+    batch = memory.sample(batch_size=32)
+    assert batch['obs0'].shape == batch['obs1'].shape == (32, 3)
+    assert batch['actions'].shape == (32, 2)
+    assert batch['rewards'].shape == batch['terminals1'].shape == (32, 1)
+    steps = batch['rewards'][:, 0]
+    assert steps.min() >= 4
+    assert np.all(batch['obs0'][:, 0] == steps) and np.all(batch['obs1'][:, 0] == steps + 1)
+    assert np.all(batch['actions'][:, 0] == -steps)
+    assert np.all(batch['terminals1'][:, 0] == (steps % 5 == 4))
+
+
+def test_memmap_memory_reopen(tmpdir):
+    """
+    test that a file-backed memory can be reopened with its transitions
+    """
+    path = str(tmpdir.join('memory'))
+    memory = Memory(limit=16, action_shape=(2,), observation_shape=(3,), path=path, sync_freq=None)
+    _fill(memory, 20)
+    memory.flush()
+    expected = memory.observations1.get_batch(np.arange(16))
+    del memory
+
+    memory = Memory(limit=16, action_shape=(2,), observation_shape=(3,), path=path)
+    assert memory.nb_entries == 16
+    assert np.array_equal(memory.observations1.get_batch(np.arange(16)), expected)
+    assert memory.rewards[0] == 4
+
+
+def _episodes(memory, n_transitions, episode_len=5):
+    """
+    append episodes of consecutive transitions, with a jump in the observations every 7 transitions
+    """
+    obs = 0
+    for i in range(n_transitions):
+        if i % 7 == 6:
+            obs += 1000
+        memory.append(np.full(3, obs), np.full(2, -i), float(i), np.full(3, obs + 1), i % episode_len == 4)
+        obs = 0 if i % episode_len == 4 else obs + 1
+
+
+def test_compact_memory_sample():
+    """
+    test that the compact memory rebuilds the next observations across episode boundaries and wraparound
+    """
+    memory = CompactMemory(limit=16, action_shape=(2,), observation_shape=(3,))
+    reference = Memory(limit=100, action_shape=(2,), observation_shape=(3,))
+    _episodes(memory, 40)
+    _episodes(reference, 40)
+    assert 0 < memory.nb_entries < 16
+
+    batch = memory.sample(batch_size=256)
+    assert batch['obs0'].shape == batch['obs1'].shape == (256, 3)
+    assert batch['actions'].shape == (256, 2)
+    assert batch['rewards'].shape == batch['terminals1'].shape == (256, 1)
+    steps = batch['rewards'][:, 0].astype(int)
+    assert steps.min() >= 40 - 16
+    expected = {'obs0': reference.observations0, 'obs1': reference.observations1, 'rewards': reference.rewards,
+                'actions': reference.actions, 'terminals1': reference.terminals1}
+    for key, buffer in expected.items():
+        assert np.array_equal(batch[key], buffer.get_batch(steps))
+
+
+def test_compact_memory_reopen(tmpdir):
+    """
+    test that a file-backed compact memory can be reopened and keeps appending where it stopped
+    """
+    path = str(tmpdir.join('memory'))
+    memory = CompactMemory(limit=16, action_shape=(2,), observation_shape=(3,), path=path, sync_freq=None)
+    _episodes(memory, 20)
+    memory.flush()
+    del memory
+
+    memory = CompactMemory(limit=16, action_shape=(2,), observation_shape=(3,), path=path)
+    reference = CompactMemory(limit=16, action_shape=(2,), observation_shape=(3,))
+    _episodes(reference, 20)
+    assert memory.nb_entries == reference.nb_entries
+    for name in CompactMemory._array_names:
+        assert np.array_equal(getattr(memory, name), getattr(reference, name))
+
+
+def test_memory_append_batch():
+    """
+    test that appending batches, with wraparound, matches appending the transitions one by one
+    """
+    memory = Memory(limit=16, action_shape=(2,), observation_shape=(3,), observation_dtype='float16')
+    reference = Memory(limit=16, action_shape=(2,), observation_shape=(3,))
+    assert memory.observations0.data is None
+    step = 0
+    for n_envs in [5, 7, 3, 9, 20, 4]:
+        steps = np.arange(step, step + n_envs)
+        memory.append_batch(np.repeat(steps[:, None], 3, axis=1), -np.repeat(steps[:, None], 2, axis=1),
+                            steps.astype(float), np.repeat(steps[:, None] + 1, 3, axis=1), steps % 5 == 4)
+        step += n_envs
+    _fill(reference, step)
+    assert memory.observations0.data.dtype == np.float16
+    assert memory.nb_entries == reference.nb_entries == 16
+    for name in Memory._buffer_names:
+        buffer, expected = getattr(memory, name), getattr(reference, name)
+        assert np.array_equal(buffer.get_batch(np.arange(16)), expected.get_batch(np.arange(16)))
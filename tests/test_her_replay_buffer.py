@@ -0,0 +1,30 @@
+import numpy as np
+
+from baselines.her.her import make_sample_her_transitions
+from baselines.her.replay_buffer import ReplayBuffer
+from baselines.her.shared_replay_buffer import SharedReplayBuffer
+from tests.test_her_sampling import _episode_batch, _reward_fun
+
+
+def test_shared_replay_buffer():
+    """
+    test that the shared-memory buffer stores and samples like the process-local one
+    """
+    episode_batch = _episode_batch()
+    shapes = {key: value.shape[1:] for key, value in episode_batch.items()}
+    sample = make_sample_her_transitions('future', 4, _reward_fun)
+    shared = SharedReplayBuffer(shapes, 8 * 5, 5, sample)
+    local = ReplayBuffer(shapes, 8 * 5, 5, sample)
+    for buffer in (shared, local):
+        buffer.store_episode(episode_batch)
+        assert buffer.get_current_size() == 30 and buffer.get_transitions_stored() == 30
+        for key, value in episode_batch.items():
+            assert np.array_equal(buffer.buffers[key][:6], value)
+
+    transitions = shared.sample(256)
+    assert np.all(transitions['o_2'][:, 0] == transitions['u'][:, 0] + 1)
+    shared.store_episode(episode_batch)
+    assert shared.full and shared.get_transitions_stored() == 60
+    shared.clear_buffer()
+    assert shared.get_current_episode_size() == 0
+    shared.close()
@@ -0,0 +1,56 @@
+import numpy as np
+
+from baselines.her.her import make_sample_her_transitions
+
+
+def _episode_batch(n_episodes=6, time_horizon=5):
+    """
+    episodes whose fields encode the episode and the time step: 100 * episode + step
+    """
+    steps = 100 * np.arange(n_episodes)[:, None] + np.arange(time_horizon + 1)[None, :]
+    return {
+        'o': np.repeat(steps[:, :, None], 3, axis=2).astype(np.float64),
+        'ag': np.repeat(steps[:, :, None], 2, axis=2).astype(np.float64) + 0.5,
+        'g': -np.repeat(steps[:, :-1, None] + 1, 2, axis=2).astype(np.float64),
+        'u': np.repeat(steps[:, :-1, None], 4, axis=2).astype(np.float64),
+        'info_is_success': steps[:, :-1, None].astype(np.float64),
+    }
+
+
+def _reward_fun(ag_2, g, info):
+    assert np.array_equal(info['is_success'][:, 0], ag_2[:, 0] - 1.5)
+    return (ag_2[:, 0] == g[:, 0]).astype(np.float64)
+
+
+def test_her_sampling():
+    """
+    test that the fused gather returns consistent transitions and substitutes future achieved goals
+    """
+    sample = make_sample_her_transitions('future', 4, _reward_fun)
+    episode_batch = _episode_batch()
+    transitions = sample(episode_batch, 512)
+
+    for key, dim in [('o', 3), ('o_2', 3), ('ag', 2), ('ag_2', 2), ('g', 2), ('u', 4), ('info_is_success', 1)]:
+        assert transitions[key].shape == (512, dim)
+    steps = transitions['u'][:, 0]
+    assert np.all(transitions['o'][:, 0] == steps) and np.all(transitions['o_2'][:, 0] == steps + 1)
+    assert np.all(transitions['ag'][:, 0] == steps + 0.5) and np.all(transitions['ag_2'][:, 0] == steps + 1.5)
+    goals = transitions['g'][:, 0]
+    relabeled = goals > 0
+    # the relabeled goals are achieved goals of later steps of the same episode
+    assert 0.6 < np.mean(relabeled) < 0.95
+    assert np.all(goals[~relabeled] == -steps[~relabeled] - 1)
+    assert np.all((goals[relabeled] // 100 == steps[relabeled] // 100) & (goals[relabeled] > steps[relabeled] + 1))
+    assert np.array_equal(transitions['r'], (goals == steps + 1.5).astype(np.float64))
+
+
+def test_her_sampling_reuses_outputs():
+    """
+    test that the sampled arrays are reused across calls, and resized when the batch size changes
+    """
+    sample = make_sample_her_transitions('future', 4, _reward_fun)
+    episode_batch = _episode_batch()
+    first = sample(episode_batch, 64)
+    second = sample(episode_batch, 64)
+    assert first['o'] is second['o'] and first['u'] is second['u']
+    assert sample(episode_batch, 32)['o'].shape == (32, 3)
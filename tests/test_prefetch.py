@@ -0,0 +1,67 @@
+import threading
+
+import numpy as np
+import pytest
+
+from baselines.common.prefetch import BatchPrefetcher
+from baselines.deepq.replay_buffer import PrioritizedReplayBuffer
+
+
+def _add(buffer, step):
+    obs = np.full((3,), step, dtype=np.float32)
+    buffer.add(obs, step % 2, float(step), obs + 1, 0.0)
+
+
+def test_prefetcher_concurrent_adds():
+    """
+    test that prefetched batches stay consistent while the buffer is written to, and that the priority updates go
+    through
+    """
+    buffer = PrioritizedReplayBuffer(64, alpha=0.6, storage='array')
+    for step in range(64):
+        _add(buffer, step)
+    prefetcher = BatchPrefetcher(lambda: buffer.sample(32, beta=0.4), lambda batch: batch[:3] + batch[-2:],
+                                 n_batches=3)
+    add = prefetcher.locked(buffer.add)
+    update_priorities = prefetcher.locked(buffer.update_priorities)
+
+    def _writer():
+        for step in range(64, 2000):
+            add(np.full((3,), step, dtype=np.float32), step % 2, float(step), np.full((3,), step + 1), 0.0)
+
+    writer = threading.Thread(target=_writer)
+    writer.start()
+    for _ in range(100):
+        obses_t, actions, rewards, weights, idxes = prefetcher.get()
+        assert np.all(obses_t[:, 0] == rewards)
+        assert np.all(actions == rewards % 2)
+        update_priorities(idxes, np.full(len(idxes), 2.0))
+    writer.join()
+    prefetcher.close()
+    assert buffer._max_priority == 2.0
+
+
+def test_prefetcher_error():
+    """
+    test that an error raised while sampling is raised by `get`
+    """
+    def _sample():
+        raise ValueError("empty buffer")
+
+    prefetcher = BatchPrefetcher(_sample)
+    with pytest.raises(ValueError):
+        prefetcher.get()
+    prefetcher.close()
+
+
+def test_stale_priority_update():
+    """
+    test that updating the priority of a slot emptied since it was sampled does not make it sampleable again
+    """
+    buffer = PrioritizedReplayBuffer(8, alpha=0.6, storage='array')
+    for step in range(8):
+        _add(buffer, step)
+    buffer._it_sum[3] = 0.0
+    buffer.update_priorities([2, 3], [5.0, 5.0])
+    assert buffer._it_sum[3] == 0.0
+    assert np.isclose(buffer._it_sum[2], 5.0 ** 0.6)
@@ -0,0 +1,269 @@
+import numpy as np
+import pytest
+
+from baselines.deepq.replay_buffer import ReplayBuffer, PrioritizedReplayBuffer
+
+
+def _fill(buffer, n_transitions, obs_shape=(3,)):
+    for i in range(n_transitions):
+        obs_t = np.full(obs_shape, i, dtype=np.float32)
+        obs_tp1 = np.full(obs_shape, i + 1, dtype=np.float32)
+        buffer.add(obs_t, i % 2, float(i), obs_tp1, float(i % 5 == 4))
+
+
+@pytest.mark.parametrize("storage", ['list', 'array'])
+def test_replay_buffer_sample(storage):
+    """
+    test that every storage returns consistent transitions
+    """
+    buffer = ReplayBuffer(8, storage=storage)
+    _fill(buffer, 12)
+    assert len(buffer) == 8
+
+    obses_t, actions, rewards, obses_tp1, dones = buffer.sample(64)
+    assert obses_t.shape == (64, 3) and obses_tp1.shape == (64, 3)
+    assert actions.shape == rewards.shape == dones.shape == (64,)
+    # only the 8 most recent transitions are kept
+    assert rewards.min() >= 4
+    assert np.all(obses_t[:, 0] == rewards)
+    assert np.all(obses_tp1[:, 0] == rewards + 1)
+    assert np.all(actions == rewards % 2)
+    assert np.all(dones == (rewards % 5 == 4))
+
+
+def test_array_storage_dtypes():
+    """
+    test that the array storage keeps the observed dtypes and promotes scalar fields to float
+    """
+    buffer = ReplayBuffer(4, storage='array')
+    buffer.add(np.zeros((2, 2), dtype=np.uint8), 1, 1, np.ones((2, 2), dtype=np.uint8), False)
+    buffer.add(np.zeros((2, 2), dtype=np.uint8), 0, 0.5, np.ones((2, 2), dtype=np.uint8), True)
+
+    obses_t, actions, rewards, obses_tp1, dones = buffer.sample(16)
+    assert obses_t.dtype == obses_tp1.dtype == np.uint8
+    assert np.issubdtype(actions.dtype, np.integer)
+    assert set(rewards.tolist()) <= {1.0, 0.5}
+    assert set(dones.tolist()) <= {0.0, 1.0}
+
+
+def test_prioritized_replay_buffer_array_storage():
+    """
+    test that prioritized sampling works on top of the array storage
+    """
+    buffer = PrioritizedReplayBuffer(8, alpha=0.6, storage='array')
+    _fill(buffer, 8)
+    buffer.update_priorities(list(range(8)), [1e-6] * 7 + [100.0])
+
+    *transitions, weights, idxes = buffer.sample(32, beta=0.4)
+    assert weights.shape == (32,)
+    assert np.all(np.asarray(idxes) < 8)
+    assert np.all(transitions[2] == np.asarray(idxes, dtype=np.float64))
+
+
+def _frame_stack_episodes(buffer, n_steps, n_frames=4, episode_len=7, scale=None):
+    """
+    play fake episodes with `FrameStack` semantics and return the transitions added to the buffer
+    """
+    transitions = []
+    frames = None
+    for step in range(n_steps):
+        if frames is None:
+            frames = [np.full((2, 2, 1), (step + 50) % 256, dtype=np.uint8)] * n_frames
+        obs_t = np.concatenate(frames, axis=2)
+        frames = frames[1:] + [np.full((2, 2, 1), (step + 100) % 256, dtype=np.uint8)]
+        obs_tp1 = np.concatenate(frames, axis=2)
+        done = step % episode_len == episode_len - 1
+        if scale is not None:
+            obs_t, obs_tp1 = obs_t.astype(np.float32) / scale, obs_tp1.astype(np.float32) / scale
+        buffer.add(obs_t, step % 3, float(step), obs_tp1, float(done))
+        transitions.append((obs_t, obs_tp1))
+        if done:
+            frames = None
+    return transitions
+
+
+@pytest.mark.parametrize("scale", [None, 255.])
+def test_frame_stack_storage(scale):
+    """
+    test that the frame stacks are rebuilt exactly, across episode boundaries and wraparound
+    """
+    buffer = ReplayBuffer(50, storage='frame_stack', storage_kwargs={'frame_scale': scale})
+    transitions = _frame_stack_episodes(buffer, 200, scale=scale)
+    assert 0 < len(buffer) < 50
+
+    obses_t, actions, rewards, obses_tp1, dones = buffer.sample(256)
+    steps = rewards.astype(int)
+    assert steps.min() >= 200 - 50
+    for step, obs_t, obs_tp1, action, done in zip(steps, obses_t, obses_tp1, actions, dones):
+        assert np.array_equal(obs_t, transitions[step][0])
+        assert np.array_equal(obs_tp1, transitions[step][1])
+        assert obs_t.dtype == transitions[step][0].dtype
+        assert action == step % 3
+        assert done == float(step % 7 == 6)
+
+
+def test_frame_stack_storage_zero_pad():
+    """
+    test that zero padding replaces the frames from before the episode start
+    """
+    buffer = ReplayBuffer(50, storage='frame_stack', storage_kwargs={'zero_pad': True})
+    _frame_stack_episodes(buffer, 7)
+    obses_t, _, rewards, obses_tp1, _ = buffer._encode_sample(np.arange(2))
+    assert np.array_equal(rewards, [0, 1])
+    assert np.all(obses_t[0] == [0, 0, 0, 50])
+    assert np.all(obses_tp1[0] == [0, 0, 50, 100])
+    assert np.all(obses_t[1] == [0, 0, 50, 100])
+
+
+def test_prioritized_frame_stack_storage():
+    """
+    test that prioritized sampling never draws slots that do not hold a complete transition
+    """
+    buffer = PrioritizedReplayBuffer(50, alpha=0.6, storage='frame_stack')
+    transitions = _frame_stack_episodes(buffer, 200)
+    obses_t, _, rewards, obses_tp1, _, _, _ = buffer.sample(256, beta=0.4)
+    for step, obs_t, obs_tp1 in zip(rewards.astype(int), obses_t, obses_tp1):
+        assert step >= 200 - 50
+        assert np.array_equal(obs_t, transitions[step][0])
+        assert np.array_equal(obs_tp1, transitions[step][1])
+
+
+def test_prioritized_replay_buffer_weights():
+    """
+    test the batched importance weights and priority updates against their definition
+    """
+    buffer = PrioritizedReplayBuffer(16, alpha=0.5, storage='array')
+    _fill(buffer, 16)
+    priorities = np.arange(1, 17, dtype=np.float64)
+    buffer.update_priorities(np.arange(16), priorities)
+
+    *_, weights, idxes = buffer.sample(64, beta=0.4)
+    probs = priorities ** 0.5 / np.sum(priorities ** 0.5)
+    expected = (probs[idxes] * 16) ** -0.4 / (probs.min() * 16) ** -0.4
+    assert np.allclose(weights, expected)
+    # one draw per equal-mass segment: the samples come out sorted and cover the whole range
+    assert np.all(np.diff(idxes) >= 0)
+    assert idxes[0] < 4 and idxes[-1] == 15
+
+
+def test_memmap_storage_reopen(tmpdir):
+    """
+    test that a file-backed buffer can be reopened with its transitions and priorities
+    """
+    path = str(tmpdir.join('replay'))
+    buffer = PrioritizedReplayBuffer(8, alpha=0.5, storage='memmap', storage_kwargs={'path': path})
+    _fill(buffer, 11)
+    buffer.update_priorities([0, 1], [4.0, 9.0])
+    buffer.flush()
+    expected = buffer._encode_sample(np.arange(8))
+    del buffer
+
+    buffer = PrioritizedReplayBuffer(8, alpha=0.5, storage='memmap', storage_kwargs={'path': path})
+    assert len(buffer) == 8
+    for field, expected_field in zip(buffer._encode_sample(np.arange(8)), expected):
+        assert np.array_equal(field, expected_field)
+    assert np.allclose(buffer._it_sum[[0, 1, 2]], [2.0, 3.0, 1.0])
+    assert buffer._max_priority == 9.0
+
+    # the write cursor is restored: the next transition overwrites the oldest one
+    buffer.add(np.zeros(3), 0, -1.0, np.zeros(3), 0.0)
+    assert buffer._encode_sample([3])[2][0] == -1.0
+
+
+@pytest.mark.parametrize("storage", ['list', 'array'])
+def test_flush_in_memory(storage):
+    """
+    test that only a file-backed buffer can be flushed
+    """
+    for buffer in (ReplayBuffer(8, storage=storage), PrioritizedReplayBuffer(8, alpha=0.5, storage=storage)):
+        _fill(buffer, 4)
+        with pytest.raises(ValueError):
+            buffer.flush()
+
+
+@pytest.mark.parametrize("storage", ['list', 'array', 'frame_stack'])
+@pytest.mark.parametrize("compress", [False, True])
+def test_save_load(tmpdir, storage, compress):
+    """
+    test that a saved buffer is restored with its transitions, write cursor and priorities
+    """
+    path = str(tmpdir.join('buffer'))
+    buffer = PrioritizedReplayBuffer(50, alpha=0.6, storage=storage)
+    _frame_stack_episodes(buffer, 80)
+    buffer.update_priorities([10, 20], [3.0, 5.0])
+    buffer.save(path, compress=compress, background=True).join()
+
+    restored = PrioritizedReplayBuffer(50, alpha=0.6, storage=storage)
+    restored.load(path)
+    assert len(restored) == len(buffer)
+    assert restored._max_priority == buffer._max_priority
+    assert np.allclose(restored._it_sum[np.arange(50)], buffer._it_sum[np.arange(50)])
+    assert np.isclose(restored._it_min.min(), buffer._it_min.min())
+    idxes = buffer._storage.stored_idxes()
+    for field, expected in zip(restored._encode_sample(idxes), buffer._encode_sample(idxes)):
+        assert np.array_equal(field, expected)
+
+    # both buffers keep writing at the same place
+    for buf in (buffer, restored):
+        _frame_stack_episodes(buf, 10)
+    idxes = buffer._storage.stored_idxes()
+    assert np.array_equal(restored._storage.stored_idxes(), idxes)
+    for field, expected in zip(restored._encode_sample(idxes), buffer._encode_sample(idxes)):
+        assert np.array_equal(field, expected)
+
+
+def test_save_failure(tmpdir, monkeypatch):
+    """
+    test that a failed save leaves neither the file nor its temporary file behind
+    """
+    def _fail(*_args, **_kwargs):
+        raise IOError("disk full")
+
+    monkeypatch.setattr('zlib.compress', _fail)
+    path = str(tmpdir.join('buffer'))
+    buffer = ReplayBuffer(8, storage='array')
+    _fill(buffer, 4)
+    with pytest.raises(IOError):
+        buffer.save(path, compress=True)
+    assert tmpdir.listdir() == []
+
+
+def _n_step_reference(rewards, dones, start, n_step, gamma, newest):
+    ret, discount, last = 0.0, 1.0, start
+    for step in range(start, min(start + n_step, newest + 1)):
+        ret += discount * rewards[step]
+        discount *= gamma
+        last = step
+        if dones[step]:
+            break
+    return ret, discount, last
+
+
+@pytest.mark.parametrize("storage", ['array', 'frame_stack'])
+def test_n_step_sample(storage):
+    """
+    test the n-step returns, bootstrap observations and discounts against a per-transition loop
+    """
+    gamma, n_step = 0.9, 3
+    buffer = PrioritizedReplayBuffer(50, alpha=0.6, storage=storage, n_step=n_step, gamma=gamma)
+    transitions = _frame_stack_episodes(buffer, 80)
+    rewards = np.arange(80, dtype=np.float64)
+    dones = np.arange(80) % 7 == 6
+
+    obses_t, actions, returns, obses_tpn, done_mask, discounts, weights, idxes = buffer.sample(256, beta=0.4)
+    for obs_t, obs_tpn, ret, done, discount in zip(obses_t, obses_tpn, returns, done_mask, discounts):
+        # the observation identifies the step
+        step = next(i for i, transition in enumerate(transitions) if np.array_equal(transition[0], obs_t))
+        expected_ret, expected_discount, last = _n_step_reference(rewards, dones, step, n_step, gamma, 79)
+        assert np.isclose(ret, expected_ret)
+        assert np.isclose(discount, expected_discount)
+        assert done == dones[last]
+        assert np.array_equal(obs_tpn, transitions[last][1])
+
+
+def test_n_step_requires_columnar_storage():
+    """
+    test that n-step sampling is refused on the list storage
+    """
+    with pytest.raises(ValueError):
+        ReplayBuffer(10, n_step=3)
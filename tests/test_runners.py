@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from baselines.a2c.a2c import Runner as A2CRunner
+from baselines.acer.acer_simple import Runner as ACERRunner
+from baselines.common.vec_env.concat_vec_env import ConcatVecEnv
+from baselines.common.vec_env.dummy_vec_env import DummyVecEnv
+from baselines.common.vec_env.subproc_vec_env import SubprocVecEnv
+from baselines.ppo2.ppo2 import Runner as PPO2Runner
+from tests.test_vec_env import BatchedSimpleEnv, _make_env_fns
+
+N_ENVS = 6
+N_STEPS = 7
+
+
+class _FakeModel(object):
+    def __init__(self, n_batch_act, recurrent=False, n_act=4):
+        """
+        A model whose actions, values and states are deterministic functions of its inputs
+        """
+        self.n_batch_act = n_batch_act
+        self.n_act = n_act
+        self.initial_state = np.zeros((n_batch_act, 2), dtype=np.float32) if recurrent else None
+
+    def step(self, obs, state, mask):
+        assert len(obs) == self.n_batch_act
+        flat_obs = obs.reshape((len(obs), -1)).astype(np.float32)
+        actions = (flat_obs.sum(axis=1).astype(np.int64) + np.asarray(mask, dtype=np.int64)) % self.n_act
+        if state is not None:
+            actions = (actions + state[:, 0].astype(np.int64)) % self.n_act
+            state = state + actions[:, None]
+        return actions, self.value(obs, state, mask), state, flat_obs.mean(axis=1) / 10
+
+    def value(self, obs, state, mask):
+        return obs.reshape((len(obs), -1)).astype(np.float32).mean(axis=1) - np.asarray(mask, dtype=np.float32)
+
+
+class _FakeACERModel(_FakeModel):
+    def step(self, obs, state, mask):
+        actions, _, state, _ = _FakeModel.step(self, obs, state, mask)
+        mus = np.eye(self.n_act, dtype=np.float32)[actions]
+        return actions, mus, state
+
+
+def _make_runner(algo, env, n_batch_act, recurrent, pipelined):
+    if algo == 'ppo2':
+        return PPO2Runner(env=env, model=_FakeModel(n_batch_act, recurrent), n_steps=N_STEPS, gamma=0.99, lam=0.95,
+                          pipelined=pipelined)
+    elif algo == 'a2c':
+        return A2CRunner(env, _FakeModel(n_batch_act, recurrent), n_steps=N_STEPS, gamma=0.99, pipelined=pipelined)
+    return ACERRunner(env, _FakeACERModel(n_batch_act, recurrent), n_steps=N_STEPS, n_stack=2, pipelined=pipelined)
+
+
+def _assert_same_rollouts(rollout, expected):
+    assert len(rollout) == len(expected)
+    for values, expected_values in zip(rollout, expected):
+        if expected_values is None:
+            assert values is None
+        elif isinstance(expected_values, list):
+            assert values == expected_values
+        else:
+            assert values.shape == expected_values.shape
+            assert values.dtype == expected_values.dtype
+            assert np.array_equal(values, expected_values)
+
+
+@pytest.mark.parametrize("algo", ['ppo2', 'a2c', 'acer'])
+@pytest.mark.parametrize("recurrent", [False, True])
+@pytest.mark.parametrize("vec_env_class", [DummyVecEnv, SubprocVecEnv])
+def test_pipelined_runner(algo, recurrent, vec_env_class):
+    """
+    test that the pipelined runners, stepping the two halves of the environment in turn, return the same rollouts as
+    the sequential ones
+
+    :param algo: (str) the algorithm of the runner
+    :param recurrent: (bool) whether the model has internal states
+    :param vec_env_class: (type) the class of the halves of the environment
+    """
+    kwargs = {'shape': (2, 3, 1), 'dtype': np.uint8}
+    env_fns = _make_env_fns(N_ENVS, **kwargs)
+    runner = _make_runner(algo, DummyVecEnv(env_fns), N_ENVS, recurrent, pipelined=False)
+    halves = ConcatVecEnv([vec_env_class(env_fns[:N_ENVS // 2]), vec_env_class(env_fns[N_ENVS // 2:])])
+    pipelined_runner = _make_runner(algo, halves, N_ENVS // 2, recurrent, pipelined=True)
+    try:
+        for _ in range(3):
+            _assert_same_rollouts(pipelined_runner.run(), runner.run())
+    finally:
+        halves.close()
+
+
+@pytest.mark.parametrize("algo", ['ppo2', 'a2c', 'acer'])
+def test_batched_env_runner(algo):
+    """
+    test that the runners take a batched simulator as it is, and return the same rollouts as with its environments
+    stepped one by one
+    """
+    kwargs = {'shape': (2, 3, 1), 'dtype': np.uint8}
+    runner = _make_runner(algo, DummyVecEnv(_make_env_fns(N_ENVS, **kwargs)), N_ENVS, False, pipelined=False)
+    batched_runner = _make_runner(algo, BatchedSimpleEnv(N_ENVS, **kwargs), N_ENVS, False, pipelined=False)
+    for _ in range(3):
+        _assert_same_rollouts(batched_runner.run(), runner.run())
@@ -110,9 +110,52 @@ def test_max_interval_tree():
     assert np.isclose(tree.min(3, 4), 3.0)
 
 
+def test_batch_set_get():
+    """
+    test setting, getting and searching several items of a Segment Tree at once
+    """
+    tree = SumSegmentTree(8)
+    min_tree = MinSegmentTree(8)
+
+    tree[np.array([0, 3, 5, 3])] = np.array([0.5, 1.0, 2.0, 1.5])
+    min_tree[[1, 6]] = 0.25
+
+    assert np.isclose(tree.sum(), 4.0)
+    assert np.isclose(tree.sum(0, 4), 2.0)
+    assert np.allclose(tree[[0, 3, 5, 7]], [0.5, 1.5, 2.0, 0.0])
+    assert np.isclose(min_tree.min(), 0.25)
+    assert np.isclose(min_tree.min(2, 6), float('inf'))
+    assert np.array_equal(tree.find_prefixsum_idx(np.array([0.0, 0.49, 0.51, 1.99, 2.01, 3.99])),
+                          [0, 0, 3, 3, 5, 5])
+
+
+def test_against_brute_force():
+    """
+    test the reductions and the prefix sum search of a Segment Tree against numpy
+    """
+    rng = np.random.RandomState(0)
+    values = rng.uniform(size=16)
+    tree = SumSegmentTree(16)
+    min_tree = MinSegmentTree(16)
+    tree[np.arange(16)] = values
+    min_tree[np.arange(16)] = values
+
+    for start in range(16):
+        for end in range(start + 1, 17):
+            assert np.isclose(tree.sum(start, end), values[start:end].sum())
+            assert np.isclose(min_tree.min(start, end), values[start:end].min())
+
+    prefixsums = rng.uniform(high=values.sum(), size=100)
+    expected = np.searchsorted(np.cumsum(values), prefixsums, side='right')
+    assert np.array_equal(tree.find_prefixsum_idx(prefixsums), expected)
+    assert all(tree.find_prefixsum_idx(mass) == idx for mass, idx in zip(prefixsums, expected))
+
+
 if __name__ == '__main__':
     test_tree_set()
     test_tree_set_overlap()
     test_prefixsum_idx()
     test_prefixsum_idx2()
     test_max_interval_tree()
+    test_batch_set_get()
+    test_against_brute_force()
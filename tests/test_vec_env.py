@@ -0,0 +1,314 @@
+import time
+from collections import OrderedDict
+
+import gym
+import numpy as np
+import pytest
+from gym import spaces
+
+from baselines.common.vec_env.batched_vec_env import BatchedEnv, BatchedVecEnv
+from baselines.common.vec_env.classic_control_vec_env import CLASSIC_CONTROL_VEC_ENVS, make_classic_control_vec_env
+from baselines.common.vec_env.dummy_vec_env import DummyVecEnv
+from baselines.common.vec_env.subproc_vec_env import SubprocVecEnv
+from baselines.common.vec_env.async_subproc_vec_env import AsyncSubprocVecEnv
+from baselines.common.vec_env.thread_vec_env import ThreadVecEnv
+from baselines.common.vec_env.vec_frame_stack import StackedFrames, VecFrameStack
+
+
+class SimpleEnv(gym.Env):
+    def __init__(self, seed, shape=(2, 3), dtype=np.float32, dict_obs=False, tuple_obs=False, episode_len=5,
+                 step_time=0.):
+        """
+        An environment whose observations are filled with a value depending on the seed, the step and the action
+        """
+        self._seed = seed
+        self._step = 0
+        self._episode_len = episode_len
+        self._dtype = dtype
+        self._shape = shape
+        self._step_time = step_time
+        box = spaces.Box(low=0, high=255, shape=shape, dtype=dtype)
+        self.observation_space = box
+        if dict_obs:
+            self.observation_space = spaces.Dict(OrderedDict([
+                ('image', box), ('vector', spaces.Box(low=-1, high=1, shape=(4,), dtype=np.float64))]))
+        elif tuple_obs:
+            self.observation_space = spaces.Tuple((box, spaces.Box(low=-1, high=1, shape=(4,), dtype=np.float64)))
+        self.action_space = spaces.Discrete(4)
+
+    def _obs(self, action=0):
+        value = (self._seed * 17 + self._step * 3 + action) % 251
+        obs = np.full(self._shape, value, dtype=self._dtype)
+        if isinstance(self.observation_space, spaces.Dict):
+            return OrderedDict([('image', obs), ('vector', np.full(4, value / 251.))])
+        if isinstance(self.observation_space, spaces.Tuple):
+            return obs, np.full(4, value / 251.)
+        return obs
+
+    def reset(self):
+        self._step = 0
+        return self._obs()
+
+    def step(self, action):
+        time.sleep(self._step_time)
+        self._step += 1
+        done = self._step >= self._episode_len + self._seed % 3
+        return self._obs(action), float(self._step), done, {'step': self._step}
+
+    def render(self, mode='human'):
+        pass
+
+
+class BatchedSimpleEnv(BatchedEnv):
+    def __init__(self, n_envs, shape=(2, 3), dtype=np.float32, episode_len=5):
+        """
+        The environments SimpleEnv(0), ..., SimpleEnv(n_envs - 1), stepped in one call
+        """
+        BatchedEnv.__init__(self, n_envs, spaces.Box(low=0, high=255, shape=shape, dtype=dtype), spaces.Discrete(4))
+        self._seeds = np.arange(n_envs)
+        self._steps = np.zeros(n_envs, dtype=np.int64)
+        self._episode_lens = episode_len + self._seeds % 3
+        self._obs = np.zeros((n_envs,) + shape, dtype=dtype)
+
+    def _fill_obs(self, actions):
+        values = (self._seeds * 17 + self._steps * 3 + actions) % 251
+        self._obs[:] = values.reshape((-1,) + (1,) * (self._obs.ndim - 1))
+        return self._obs.copy()
+
+    def reset_batch(self):
+        self._steps[:] = 0
+        return self._fill_obs(0)
+
+    def step_batch(self, actions):
+        self._steps += 1
+        rewards = self._steps.astype(np.float64)
+        dones = self._steps >= self._episode_lens
+        infos = [{'step': step} for step in self._steps.tolist()]
+        actions = np.where(dones, 0, actions)
+        self._steps[dones] = 0
+        return self._fill_obs(actions), rewards, dones, infos
+
+
+def _make_env_fns(n_envs, **kwargs):
+    return [lambda seed=seed: SimpleEnv(seed, **kwargs) for seed in range(n_envs)]
+
+
+def _assert_same_obs(obs, expected):
+    if isinstance(expected, dict):
+        assert set(obs) == set(expected)
+        for key in expected:
+            _assert_same_obs(obs[key], expected[key])
+    elif isinstance(expected, tuple):
+        assert isinstance(obs, tuple) and len(obs) == len(expected)
+        for obs_part, expected_part in zip(obs, expected):
+            _assert_same_obs(obs_part, expected_part)
+    else:
+        assert obs.dtype == expected.dtype
+        assert np.array_equal(obs, expected)
+
+
+def _assert_same_rollout(vec_env, reference, n_steps=20):
+    _assert_same_obs(vec_env.reset(), reference.reset())
+    for step in range(n_steps):
+        actions = np.arange(vec_env.num_envs) % 4 + step % 2
+        obs, rews, dones, infos = vec_env.step(actions)
+        expected_obs, expected_rews, expected_dones, expected_infos = reference.step(actions)
+        _assert_same_obs(obs, expected_obs)
+        assert np.array_equal(rews, expected_rews)
+        assert np.array_equal(dones, expected_dones)
+        assert list(infos) == list(expected_infos)
+
+
+@pytest.mark.parametrize("dtype", [np.uint8, np.float32])
+@pytest.mark.parametrize("shared_memory", [False, True])
+@pytest.mark.parametrize("dict_obs, tuple_obs", [(False, False), (True, False), (False, True)])
+def test_subproc_vec_env(dtype, shared_memory, dict_obs, tuple_obs):
+    """
+    test that the subprocesses, with the pipe or the shared-memory transport, return the same steps as the
+    environments run in the main process, for Box, Dict and Tuple observation spaces
+    """
+    env_fns = _make_env_fns(4, dtype=dtype, dict_obs=dict_obs, tuple_obs=tuple_obs)
+    vec_env = SubprocVecEnv(env_fns, shared_memory=shared_memory)
+    _assert_same_rollout(vec_env, DummyVecEnv(env_fns))
+    vec_env.close()
+
+
+@pytest.mark.parametrize("shared_memory", [False, True])
+@pytest.mark.parametrize("envs_per_worker", [2, 3])
+def test_subproc_envs_per_worker(shared_memory, envs_per_worker):
+    """
+    test that grouping several environments per subprocess, with a smaller last group, keeps the same steps
+    """
+    env_fns = _make_env_fns(7)
+    vec_env = SubprocVecEnv(env_fns, shared_memory=shared_memory, envs_per_worker=envs_per_worker)
+    assert len(vec_env.processes) == -(-7 // envs_per_worker)
+    _assert_same_rollout(vec_env, DummyVecEnv(env_fns))
+    vec_env.close()
+
+
+@pytest.mark.parametrize("start_method", ['fork', 'spawn'])
+def test_subproc_start_method(start_method):
+    """
+    test the start methods of the subprocesses, and the cached spaces
+    """
+    env_fns = _make_env_fns(4, dtype=np.uint8)
+    # a single worker, as the spawned ones import TensorFlow
+    vec_env = SubprocVecEnv(env_fns, shared_memory=True, envs_per_worker=4, start_method=start_method,
+                            observation_space=spaces.Box(low=0, high=255, shape=(2, 3), dtype=np.uint8),
+                            action_space=spaces.Discrete(4))
+    assert vec_env.startup_time > 0
+    _assert_same_rollout(vec_env, DummyVecEnv(env_fns))
+    vec_env.close()
+
+
+@pytest.mark.parametrize("dict_obs", [False, True])
+@pytest.mark.parametrize("n_threads", [None, 3])
+def test_thread_vec_env(dict_obs, n_threads):
+    """
+    test that stepping the environments on threads returns the same steps as stepping them in turn, and that the
+    steps of environments sleeping (releasing the GIL) overlap
+    """
+    env_fns = _make_env_fns(7, dict_obs=dict_obs)
+    vec_env = ThreadVecEnv(env_fns, n_threads=n_threads)
+    _assert_same_rollout(vec_env, DummyVecEnv(env_fns))
+    vec_env.close()
+
+    vec_env = ThreadVecEnv(_make_env_fns(4, step_time=0.05), n_threads=4)
+    vec_env.reset()
+    start = time.time()
+    vec_env.step(np.zeros(4, dtype=int))
+    assert time.time() - start < 0.15
+    vec_env.close()
+
+
+@pytest.mark.parametrize("shared_memory", [False, True])
+@pytest.mark.parametrize("dict_obs", [False, True])
+def test_async_subproc_all_ready(shared_memory, dict_obs):
+    """
+    test that waiting for all the environments steps like the synchronous version
+    """
+    env_fns = _make_env_fns(4, dict_obs=dict_obs)
+    vec_env = AsyncSubprocVecEnv(env_fns, shared_memory=shared_memory, envs_per_worker=2)
+    _assert_same_rollout(vec_env, DummyVecEnv(env_fns))
+    vec_env.close()
+
+
+@pytest.mark.parametrize("shared_memory", [False, True])
+def test_async_subproc_first_ready(shared_memory):
+    """
+    test that a slow environment does not hold back the others
+    """
+    env_fns = [lambda seed=seed: SimpleEnv(seed, step_time=0.5 if seed == 3 else 0.) for seed in range(4)]
+    vec_env = AsyncSubprocVecEnv(env_fns, min_ready=2, shared_memory=shared_memory)
+    reference = [env_fn() for env_fn in env_fns]
+    obs = vec_env.reset()
+    assert np.array_equal(obs, np.stack([env.reset() for env in reference]))
+
+    n_steps = np.zeros(4, dtype=int)
+    vec_env.step_async(np.zeros(4, dtype=int))
+    for _ in range(20):
+        obs, rews, _, infos = vec_env.step_wait()
+        env_idxs = vec_env.ready_env_idxs
+        assert len(env_idxs) >= 1 and len(obs) == len(rews) == len(infos) == len(env_idxs)
+        for env_idx, env_obs, env_rew in zip(env_idxs, obs, rews):
+            n_steps[env_idx] += 1
+            expected_obs, expected_rew, done, _ = reference[env_idx].step(0)
+            if done:
+                expected_obs = reference[env_idx].reset()
+            assert np.array_equal(env_obs, expected_obs) and env_rew == expected_rew
+        vec_env.step_async(np.zeros(len(env_idxs), dtype=int))
+    # the slow environment did at most a couple of the 20 steps
+    assert n_steps[3] <= 2 and n_steps[:3].sum() >= 30
+    vec_env.close()
+
+
+def test_vec_frame_stack():
+    """
+    test that the stacked frames are the last observations of every episode, oldest first, with zeros before the
+    first one
+    """
+    env_fns = _make_env_fns(3, shape=(2, 2, 3), dtype=np.uint8)
+    vec_env = VecFrameStack(DummyVecEnv(env_fns), 4)
+    reference = DummyVecEnv(env_fns)
+    expected = np.zeros((3, 2, 2, 12), dtype=np.uint8)
+    expected[..., -3:] = reference.reset()
+    assert np.array_equal(vec_env.reset(), expected)
+    for step in range(20):
+        actions = np.arange(3) + step % 2
+        obs, _, dones, _ = vec_env.step(actions)
+        expected_obs, _, expected_dones, _ = reference.step(actions)
+        expected = np.roll(expected, shift=-3, axis=-1)
+        expected[expected_dones] = 0
+        expected[..., -3:] = expected_obs
+        assert np.array_equal(dones, expected_dones)
+        assert obs.shape == expected.shape and np.array_equal(obs, expected)
+
+
+def test_stacked_frames_slices():
+    """
+    test stacking the frames of groups of environments stepped at different times
+    """
+    rng = np.random.RandomState(0)
+    stacked_frames = StackedFrames(4, (2, 1), 3, np.float32)
+    expected = np.zeros((4, 2, 3), dtype=np.float32)
+    frames = rng.rand(4, 2, 1).astype(np.float32)
+    stacked_frames.reset(frames)
+    expected[..., -1:] = frames
+    for step in range(10):
+        env_slice = [slice(0, 1), slice(1, 4), slice(0, 4)][step % 3]
+        frames = rng.rand(4, 2, 1).astype(np.float32)[env_slice]
+        dones = rng.rand(len(frames)) < 0.2
+        stacked = stacked_frames.push(frames, dones, env_slice)
+        part = expected[env_slice]
+        part[:] = np.roll(part, shift=-1, axis=-1)
+        part[dones] = 0
+        part[..., -1:] = frames
+        assert np.array_equal(stacked, expected)
+
+
+@pytest.mark.parametrize("dtype", [np.uint8, np.float32])
+def test_batched_vec_env(dtype):
+    """
+    test that the environments of a batched simulator step like the same environments stepped one by one
+    """
+    vec_env = BatchedVecEnv(BatchedSimpleEnv(5, dtype=dtype))
+    _assert_same_rollout(vec_env, DummyVecEnv(_make_env_fns(5, dtype=dtype)))
+    vec_env.close()
+
+
+@pytest.mark.parametrize("env_id", sorted(CLASSIC_CONTROL_VEC_ENVS))
+def test_classic_control_vec_env(env_id):
+    """
+    test that the vectorized classic control tasks have the transitions, terminations and time limits of the gym
+    environments
+
+    :param env_id: (str) the gym id of the task
+    """
+    n_envs = 4
+    vec_env = make_classic_control_vec_env(env_id, n_envs, seed=0)
+    envs = [gym.make(env_id) for _ in range(n_envs)]
+    for env in envs:
+        env.reset()
+    # the actions are sampled with numpy's global random generator
+    np.random.seed(0)
+    vec_env.reset()
+    n_dones = 0
+    for _ in range(vec_env.max_episode_steps + 10):
+        actions = np.array([env.action_space.sample() for env in envs])
+        # the gym environments step from the same states, as their random initial states are drawn differently
+        states = np.copy(vec_env.state)
+        obs, rews, dones, _ = vec_env.step(actions)
+        assert obs.dtype == np.float32 and obs.shape == (n_envs,) + vec_env.observation_space.shape
+        for env_idx, env in enumerate(envs):
+            env.unwrapped.state = np.copy(states[env_idx])
+            expected_obs, expected_rew, expected_done, _ = env.step(actions[env_idx])
+            assert dones[env_idx] == expected_done
+            assert np.isclose(rews[env_idx], expected_rew, rtol=1e-5)
+            if expected_done:
+                n_dones += 1
+                env.reset()
+                assert vec_env.episode_steps[env_idx] == 0
+            else:
+                assert np.allclose(obs[env_idx], expected_obs, rtol=1e-5, atol=1e-6)
+    assert n_dones >= n_envs
+    vec_env.close()
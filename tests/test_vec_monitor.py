@@ -0,0 +1,83 @@
+import json
+import os
+
+import numpy as np
+from gym import spaces
+
+from baselines.bench.monitor import load_results
+from baselines.common.vec_env.batched_vec_env import BatchedEnv, BatchedVecEnv
+from baselines.common.vec_env.classic_control_vec_env import CartPoleVecEnv
+from baselines.common.vec_env.vec_monitor import VecMonitor
+
+
+def test_vec_monitor(tmpdir):
+    """
+    test that the vectorized monitor reports the episodes of all the environments in the information and in a single
+    monitor file
+    """
+    n_envs = 4
+    venv = CartPoleVecEnv(n_envs, seed=0)
+    env = VecMonitor(venv, str(tmpdir), env_id='CartPole-v1')
+    env.reset()
+    returns = np.zeros((n_envs,))
+    episodes = []
+    for step in range(500):
+        _, rewards, dones, infos = env.step(np.arange(n_envs) % 2 ^ (step // 3) % 2)
+        returns += rewards
+        for env_idx in range(n_envs):
+            if dones[env_idx]:
+                assert infos[env_idx]['episode']['r'] == returns[env_idx]
+                assert infos[env_idx]['episode']['l'] == returns[env_idx]
+                episodes.append(infos[env_idx]['episode'])
+                returns[env_idx] = 0
+            else:
+                assert 'episode' not in infos[env_idx]
+    env.close()
+    assert len(episodes) > n_envs and env.episode_count == len(episodes)
+
+    assert os.listdir(str(tmpdir)) == ['monitor.csv']
+    with open(os.path.join(str(tmpdir), 'monitor.csv'), 'rt') as file_handler:
+        assert json.loads(file_handler.readline()[1:])['env_id'] == 'CartPole-v1'
+    results = load_results(str(tmpdir))
+    assert len(results) == len(episodes)
+    assert list(results['r']) == [episode['r'] for episode in episodes]
+    assert list(results['l']) == [episode['l'] for episode in episodes]
+
+
+class SharedInfoBatchedEnv(BatchedEnv):
+    def __init__(self, n_envs, episode_len=3):
+        """
+        Environments all done every `episode_len` steps, reporting the same empty information dict
+        """
+        BatchedEnv.__init__(self, n_envs, spaces.Box(low=0, high=1, shape=(1,), dtype=np.float32),
+                            spaces.Discrete(2))
+        self._episode_len = episode_len
+        self._step = 0
+
+    def reset_batch(self):
+        self._step = 0
+        return np.zeros((self.num_envs, 1), dtype=np.float32)
+
+    def step_batch(self, actions):
+        self._step += 1
+        dones = np.full((self.num_envs,), self._step % self._episode_len == 0)
+        rewards = np.arange(self.num_envs, dtype=np.float64)
+        return np.zeros((self.num_envs, 1), dtype=np.float32), rewards, dones, [{}] * self.num_envs
+
+
+def test_vec_monitor_shared_infos():
+    """
+    test that the vectorized monitor reports each episode in the information of its own environment only, when the
+    environments share their information dict
+    """
+    n_envs = 3
+    env = VecMonitor(BatchedVecEnv(SharedInfoBatchedEnv(n_envs)))
+    env.reset()
+    for _ in range(2):
+        _, _, dones, infos = env.step(np.zeros((n_envs,), dtype=np.int64))
+        assert not dones.any() and all(info == {} for info in infos)
+    _, _, dones, infos = env.step(np.zeros((n_envs,), dtype=np.int64))
+    assert dones.all()
+    assert [info['episode']['r'] for info in infos] == [3. * env_idx for env_idx in range(n_envs)]
+    assert all(info['episode']['l'] == 3 for info in infos)
+    env.close()
@@ -56,3 +56,67 @@ def test_mpi_moments():
     """
     subprocess.check_call(['mpirun', '--allow-run-as-root', '-np', '3', 'python', '-c',
                            'from baselines.common.mpi_moments import _helper_runningmeanstd; _helper_runningmeanstd()'])
+
+
+def _make_normalized_env(**kwargs):
+    from tests.test_vec_env import _make_env_fns
+    return VecNormalize(DummyVecEnv(_make_env_fns(3, shape=(4,))), **kwargs)
+
+
+def test_vec_normalize_float32():
+    """
+    test that the observations and rewards are normalized in float32 as with the running averages in float64
+    """
+    env = _make_normalized_env()
+    env.reset()
+    for step in range(20):
+        ret = env.ret * env.gamma
+        obs, rewards, _, _ = env.step(np.arange(3) + step % 2)
+        raw_rewards = env.ret - ret
+        assert obs.dtype == np.float32
+        expected_obs = np.clip((env.venv.buf_obs[None] - env.ob_rms.mean) / np.sqrt(env.ob_rms.var + env.epsilon),
+                               -env.clip_obs, env.clip_obs)
+        assert np.allclose(obs, expected_obs, atol=1e-5)
+        expected_rewards = np.clip(raw_rewards / np.sqrt(env.ret_rms.var + env.epsilon), -10, 10)
+        assert np.allclose(rewards, expected_rewards)
+
+
+def test_vec_normalize_save_load(tmpdir):
+    """
+    test that an environment normalizes as another one after loading its running averages
+    """
+    env = _make_normalized_env()
+    env.reset()
+    for step in range(10):
+        env.step(np.arange(3) + step % 2)
+    env.save_running_average(str(tmpdir))
+
+    eval_env = _make_normalized_env(training=False)
+    eval_env.load_running_average(str(tmpdir))
+    env.training = False
+    assert np.array_equal(eval_env.reset(), env.reset())
+    for step in range(10):
+        obs, rewards, _, _ = env.step(np.arange(3) + step % 2)
+        eval_obs, eval_rewards, _, _ = eval_env.step(np.arange(3) + step % 2)
+        assert np.array_equal(eval_obs, obs) and np.array_equal(eval_rewards, rewards)
+    assert np.array_equal(eval_env.ob_rms.mean, env.ob_rms.mean)
+
+
+def _helper_mpi_vec_normalize():
+    from mpi4py import MPI
+    comm = MPI.COMM_WORLD
+    rng = np.random.RandomState(0)
+    data = [rng.randn(3 + rank, 2) for rank in range(comm.Get_size())]
+    rms = RunningMeanStd(epsilon=0.0, shape=(2,))
+    rms.update(data[comm.Get_rank()], comm=comm)
+    all_data = np.concatenate(data)
+    assert np.allclose(rms.mean, all_data.mean(axis=0)) and np.allclose(rms.var, all_data.var(axis=0))
+
+
+def test_mpi_vec_normalize():
+    """
+    test the running averages over the data of several ranks
+    """
+    subprocess.check_call(['mpirun', '--allow-run-as-root', '-np', '2', 'python', '-c',
+                           'from tests.test_vec_normalize import _helper_mpi_vec_normalize; '
+                           '_helper_mpi_vec_normalize()'])